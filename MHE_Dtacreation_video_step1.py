@@ -1,60 +1,103 @@
 import json
 import pandas as pd
 import os
+from metrics import span, timed
+from product_files import pack_entries, save_product_file
 
+def build_anki_url_index(anki_df: pd.DataFrame) -> dict:
+    """
+    Indexes the Anki sheet by 'BB Video Title'.
+    Each title maps to its (lowercased Exam Type, FA4 Launch URL) pairs in sheet order.
+    """
+    index = {}
+    titles = anki_df['BB Video Title'].tolist()
+    exam_types = [str(exam_type).lower() for exam_type in anki_df['Exam Type'].tolist()]
+    urls = anki_df['FA4 Launch URL'].tolist()
+    for title, exam_type, url in zip(titles, exam_types, urls):
+        if pd.isna(title):
+            continue
+        index.setdefault(title, []).append((exam_type, url))
+    return index
+
+def lookup_fa4_launch_url(anki_index: dict, video_title, product: str):
+    """
+    Returns the FA4 Launch URL of the first Anki row whose title matches and whose Exam Type is contained in the product.
+    """
+    product_lower = product.lower()
+    for exam_type, url in anki_index.get(video_title, ()):
+        if exam_type in product_lower:
+            return url
+    return None
+
+def build_result_item(transcript: dict, hierarchical_data: dict, anki_index: dict) -> dict:
+    """
+    Links one transcript to one of its hierarchical placements.
+    """
+    result_item = {
+        'categoryTitle': hierarchical_data['categoryTitle'],
+        'subcategoryTitle': hierarchical_data['subcategoryTitle'],
+        'videoID': hierarchical_data['videoID'],
+        'cadmoreAlternateID': transcript['Id'],
+        'videoTitle': hierarchical_data['videoTitle'],
+        'product': hierarchical_data['product'],
+        'videoUrl': hierarchical_data['videoUrl'],
+        'Transcript': transcript['Transcript'],
+        'FA4 Launch URL': None,
+    }
+    
+    # Match product with Exam Type in the Excel file
+    result_item['FA4 Launch URL'] = lookup_fa4_launch_url(
+        anki_index, result_item['videoTitle'], result_item['product']
+    )
+    return result_item
+
+def iter_linked_pairs(bb_transcripts: list, bb_hierarchical: list):
+    """
+    Yields (transcript, hierarchical record) pairs in transcript order.
+    """
+    cadmore_id_to_data = {}
+    for item in bb_hierarchical:
+        cadmore_id = item['cadmoreAlternateID']
+        cadmore_id_to_data.setdefault(cadmore_id, []).append(item)
+    for transcript in bb_transcripts:
+        for hierarchical_data in cadmore_id_to_data.get(transcript['Id'], []):
+            yield transcript, hierarchical_data
+
+def product_file_path(product: str, output_dir: str) -> str:
+    safe_product_name = ''.join(e for e in product if e.isalnum() or e in (' ', '_')).replace(' ', '_')
+    return os.path.join(output_dir, f"{safe_product_name}.json")
+
+def write_product_file(product: str, records: list, output_dir: str) -> str:
+    """
+    Writes one product's records with each transcript stored once and its placements referring to it by hash.
+    """
+    return save_product_file(product_file_path(product, output_dir), pack_entries(records))
+
+@timed("step1.process_data")
 def process_data(bb_transcripts_file: str, bb_hierarchical_file: str, anki_excel_file: str, output_dir: str = "product_files2"):
     """
     Processes the input JSON and Excel files, linking relevant data and saving structured JSON files.
     """
     try:
         # Load JSON files
-        with open(bb_transcripts_file, 'r') as f:
-            bb_transcripts = json.load(f)
-        with open(bb_hierarchical_file, 'r') as f:
-            bb_hierarchical = json.load(f)
+        with span("step1.load_json"):
+            with open(bb_transcripts_file, 'r') as f:
+                bb_transcripts = json.load(f)
+            with open(bb_hierarchical_file, 'r') as f:
+                bb_hierarchical = json.load(f)
         
         # Load Excel file
-        anki_df = pd.read_excel(anki_excel_file)
+        with span("step1.read_excel"):
+            anki_df = pd.read_excel(anki_excel_file)
         
         # Create mappings
-        id_to_transcript = {item['Id']: item for item in bb_transcripts}
-        cadmore_id_to_data = {}
-        for item in bb_hierarchical:
-            cadmore_id = item['cadmoreAlternateID']
-            cadmore_id_to_data.setdefault(cadmore_id, []).append(item)
+        anki_index = build_anki_url_index(anki_df)
         
         # Process and link data
-        result = []
-        for transcript in bb_transcripts:
-            title = transcript['Title']
-            cadmore_id = transcript['Id']
-            transcript_text = transcript['Transcript']
-            
-            hierarchical_data_list = cadmore_id_to_data.get(cadmore_id, [])
-            
-            for hierarchical_data in hierarchical_data_list:
-                result_item = {
-                    'categoryTitle': hierarchical_data['categoryTitle'],
-                    'subcategoryTitle': hierarchical_data['subcategoryTitle'],
-                    'videoID': hierarchical_data['videoID'],
-                    'cadmoreAlternateID': cadmore_id,
-                    'videoTitle': hierarchical_data['videoTitle'],
-                    'product': hierarchical_data['product'],
-                    'videoUrl': hierarchical_data['videoUrl'],
-                    'Transcript': transcript_text,
-                    'FA4 Launch URL': None,
-                }
-                
-                # Match product with Exam Type in the Excel file
-                for _, row in anki_df.iterrows():
-                    if (
-                        str(row['Exam Type']).lower() in result_item['product'].lower() and
-                        row['BB Video Title'] == result_item['videoTitle']
-                    ):
-                        result_item['FA4 Launch URL'] = row['FA4 Launch URL']
-                        break
-                
-                result.append(result_item)
+        result = [
+            build_result_item(transcript, hierarchical_data, anki_index)
+            for transcript, hierarchical_data in iter_linked_pairs(bb_transcripts, bb_hierarchical)
+        ]
         
         # Ensure the output directory exists
         os.makedirs(output_dir, exist_ok=True)
@@ -71,12 +114,8 @@ def process_data(bb_transcripts_file: str, bb_hierarchical_file: str, anki_excel
         
         # Write records to separate JSON files based on product
         for product, records in product_to_records.items():
-            safe_product_name = ''.join(e for e in product if e.isalnum() or e in (' ', '_')).replace(' ', '_')
-            file_path = os.path.join(output_dir, f"{safe_product_name}.json")
-            with open(file_path, 'w') as f:
-                json.dump(records, f, indent=4)
+            write_product_file(product, records, output_dir)
         
         return {"status": "success", "message": "JSON files created successfully", "output_directory": output_dir}
     except Exception as e:
         return {"status": "error", "message": str(e)}
-
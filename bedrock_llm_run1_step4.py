@@ -1,16 +1,35 @@
-import pandas as pd
 import tqdm
 import json
 import os
 import boto3
 import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from bedrock_rate_limiter import TokenBucketRateLimiter, call_with_backoff, is_retryable_error
+from llm_response_cache import LLMResponseCache
+from checkpoint_journal import CheckpointJournal
+from table_io import read_table
+from prompt_packing import MAX_OUTPUT_TOKENS, estimate_tokens, max_output_tokens, pack_flashcard_batches
+from metrics import REGISTRY, SECONDS_BUCKETS, TOKEN_BUCKETS, dump_summary, timed
+
+# Default Bedrock client used by LLM(); set by main()
+bedrock_runtime = None
+
+class ResponseTruncatedError(Exception):
+    """
+    The model stopped at maxTokens, so its answer is incomplete JSON; carries the partial text.
+    """
+
+    def __init__(self, response_text: str, max_tokens: int):
+        super().__init__(f"Classification response truncated at maxTokens={max_tokens}")
+        self.response_text = response_text
+        self.max_tokens = max_tokens
 
 def initialize_bedrock():
     session1 = boto3.Session(profile_name='bedrock-profile-1')
     return session1.client("bedrock-runtime")
 
 def load_data(file_path):
-    return pd.read_excel(file_path)
+    return read_table(file_path)
 
 def load_transcripts(transcript_path):
     with open(transcript_path, 'r', encoding='utf-8') as f:
@@ -21,7 +40,14 @@ def setup_output_directory(output_dir):
     os.makedirs(output_dir, exist_ok=True)
     
     
-def LLM(transcript_summary, flashcards_list):
+def LLM(transcript_summary, flashcards_list, client=None, response_cache=None, rate_limiter=None, max_retries=8, max_tokens=None):
+    """
+    Classifies a batch of flashcards against the transcript; maxTokens grows with the batch size unless max_tokens is given.
+    A response_cache hit is returned without calling Bedrock; otherwise the request waits on the
+    rate limiter and throttling is retried with jittered exponential backoff.
+    Raises ResponseTruncatedError when the answer was cut off at maxTokens; such answers and ones that
+    parse_classification_response cannot parse are not cached.
+    """
     flashcard_texts = ""
     for idx, flashcard in enumerate(flashcards_list, start=1):
         flashcard_texts += f"Flashcard_{idx}: {flashcard}\n"
@@ -80,25 +106,62 @@ Make sure the output is a valid JSON object and follows this structure exactly:
         }
     ]
    
-    response = bedrock_runtime.converse(
-        system = [
-            {
-                "text": system_prompt
-            }
-        ],
-        modelId = "anthropic.claude-3-5-sonnet-20240620-v1:0",
-        messages = messages,
-        inferenceConfig={
-            "maxTokens": 100,
-            "temperature": 0.0
-        }
-    )
+    model_id = "anthropic.claude-3-5-sonnet-20240620-v1:0"
+    inference_config = {
+        "maxTokens": max_tokens or max_output_tokens(len(flashcards_list)),
+        "temperature": 0.0
+    }
+
+    cache_key = None
+    if response_cache is not None:
+        cache_key = response_cache.make_key(model_id, system_prompt, user_prompt, inference_config)
+        cached_response = response_cache.get(cache_key)
+        # Unparseable answers cached by earlier versions are asked again
+        if cached_response is not None and parse_classification_response(cached_response) is not None:
+            REGISTRY.counter("llm_response_cache_hits_total", "Classification prompts answered from the response cache").inc()
+            return cached_response
+
+    def send_request():
+        if rate_limiter is not None:
+            rate_limiter.acquire(estimate_tokens(system_prompt + user_prompt) + inference_config["maxTokens"])
+        call_start = time.perf_counter()
+        outcome = "error"
+        try:
+            response = (client or bedrock_runtime).converse(
+                system = [
+                    {
+                        "text": system_prompt
+                    }
+                ],
+                modelId = model_id,
+                messages = messages,
+                inferenceConfig=inference_config
+            )
+            outcome = "ok"
+            return response
+        except Exception as e:
+            outcome = "throttled" if is_retryable_error(e) else "error"
+            raise
+        finally:
+            REGISTRY.histogram("bedrock_converse_seconds", "Bedrock converse round-trip time by outcome", SECONDS_BUCKETS).observe(time.perf_counter() - call_start, outcome=outcome)
+
+    response = call_with_backoff(send_request, max_retries=max_retries)
     response_text = response["output"]["message"]["content"][0]["text"]
+    usage = response.get("usage") or {}
+    if "inputTokens" in usage:
+        REGISTRY.histogram("bedrock_input_tokens", "Input tokens per classification request (converse usage)", TOKEN_BUCKETS).observe(usage["inputTokens"])
+    if "outputTokens" in usage:
+        REGISTRY.histogram("bedrock_output_tokens", "Output tokens per classification request (converse usage)", TOKEN_BUCKETS).observe(usage["outputTokens"])
+    REGISTRY.counter("bedrock_tokens_total", "Tokens billed by Bedrock").inc(usage.get("inputTokens", 0), direction="input")
+    REGISTRY.counter("bedrock_tokens_total", "Tokens billed by Bedrock").inc(usage.get("outputTokens", 0), direction="output")
+    if response.get("stopReason") == "max_tokens":
+        REGISTRY.counter("llm_truncated_responses_total", "Classification responses cut off at maxTokens").inc()
+        raise ResponseTruncatedError(response_text, inference_config["maxTokens"])
+    # Only answers that parse are cached, so a malformed one is asked again on the next run
+    if response_cache is not None and parse_classification_response(response_text) is not None:
+        response_cache.put(cache_key, model_id, response_text)
     return response_text
 
-if 'Flashcard Classification' not in data.columns:
-    data['Flashcard Classification'] = None
-
 def simplify_flashcard_classification(classification):
     try:
         classification_lower = classification.lower()
@@ -117,20 +180,85 @@ def simplify_flashcard_classification(classification):
 
 
 
-def process_bb_video_titles(data, transcript_mapping):
+def parse_classification_response(classification):
+    """
+    Parses the model's JSON answer, attempting a simple fix if it is malformed.
+    Returns None if it cannot be parsed.
+    """
+    try:
+        return json.loads(classification)
+    except json.JSONDecodeError:
+        # Attempt to fix JSON if malformed
+        try:
+            fixed_classification = classification.replace("'", '"')
+            if not fixed_classification.startswith('{'):
+                fixed_classification = '{' + fixed_classification
+            if not fixed_classification.endswith('}'):
+                fixed_classification = fixed_classification + '}'
+            return json.loads(fixed_classification)
+        except Exception as e2:
+            print(f"Error parsing JSON after fix attempt: {e2}")
+            return None
+
+@timed("step4.process_bb_video_titles")
+def process_bb_video_titles(data, transcript_mapping, output_dir="classified_flashcards_output", bedrock_client=None, max_in_flight=1, requests_per_minute=None, tokens_per_minute=None, max_retries=8, batch_size=None, max_cards_per_request=40, max_input_tokens=30_000, response_cache=None, journal_path=None, progress_callback=None):
+    """
+    Classifies the flashcards of every BB Video Title with the LLM and saves one CSV per video.
+    Up to max_in_flight requests run concurrently, limited to requests_per_minute / tokens_per_minute;
+    throttled requests are retried with jittered exponential backoff.
+    response_cache (an LLMResponseCache) answers repeated prompts without calling Bedrock.
+    Flashcards are packed per request to fit max_input_tokens (transcript included) and at most
+    max_cards_per_request cards; pass batch_size for fixed-size batches instead.
+    With journal_path, every finished batch is appended to a checkpoint journal, and rows recorded
+    there by an earlier run are restored and not sent again.
+    A response cut off at maxTokens is not marked No Class: its batch is split in two and sent again,
+    and a single card is retried with twice the output budget (up to MAX_OUTPUT_TOKENS).
+    progress_callback(done, total) is called after each finished batch.
+    """
     bb_video_titles_processed = 0
 
+    if 'Flashcard Classification' not in data.columns:
+        data['Flashcard Classification'] = None
+
+    # Replay the journal of an interrupted run
+    journal = None
+    replayed_rows = set()
+    if journal_path:
+        for row, classification in CheckpointJournal.replay(journal_path).items():
+            if row in data.index:
+                data.at[row, 'Flashcard Classification'] = classification
+                replayed_rows.add(row)
+        if replayed_rows:
+            print(f"Replayed {len(replayed_rows)} classified rows from {journal_path}")
+        journal = CheckpointJournal(journal_path)
+
+    rate_limiter = None
+    if requests_per_minute or tokens_per_minute:
+        rate_limiter = TokenBucketRateLimiter(requests_per_minute, tokens_per_minute)
+
     data_grouped = data.groupby('videoTitle')
 
-    for video_title, group in tqdm.tqdm(data_grouped, total=len(data_grouped), desc="Processing BB Video Titles"):
+    # Collect the batches of every video still to classify
+    batches = []
+    pending_batches = {}
+    video_rows = {}
+    for video_title, group in data_grouped:
         output_file_path = os.path.join(output_dir, f'classified_{video_title}.csv')
 
         if os.path.exists(output_file_path):
             print(f"Skipping already processed BB Video Title: {video_title}")
             continue
 
-        if group['Flashcard Classification'].notnull().all():
-            print(f"Skipping already classified BB Video Title: {video_title}")
+        resumed_rows = sorted(replayed_rows.intersection(group.index))
+        remaining = group[group['Flashcard Classification'].isnull()]
+        if remaining.empty:
+            if resumed_rows:
+                # Finished before the interruption but its CSV was never written
+                data.loc[resumed_rows].to_csv(output_file_path, index=False)
+                print(f"Saved classification for BB Video Title '{video_title}' to {output_file_path}")
+                bb_video_titles_processed += 1
+            else:
+                print(f"Skipping already classified BB Video Title: {video_title}")
             continue
 
         # Get the cadmoreAlternateID from the CSV. Assuming the column is named 'cadmoreAlternateID'.
@@ -139,48 +267,109 @@ def process_bb_video_titles(data, transcript_mapping):
         # Use cadmore_alternate_id to look up transcript by 'Id' in the JSON.
         transcript_text = transcript_mapping.get(cadmore_alternate_id, '')
 
-        modified_rows = []
-
-        group = group.reset_index()
-
-        # Process flashcards in batches of up to 5
-        for idx in tqdm.tqdm(range(0, len(group), 5), desc="Processing batches"):
-            batch = group.iloc[idx:idx+5]
-            flashcards_list = batch['Flashcard'].tolist()
-            indices = batch['index'].tolist()
+        group = remaining.reset_index()
 
-            try:
-                classification = LLM(transcript_text, flashcards_list)
-                print(classification)
-                classification_dict = json.loads(classification)
-            except json.JSONDecodeError as e:
-                # Attempt to fix JSON if malformed
+        # Pack as many flashcards per request as the token budget allows
+        if batch_size:
+            batch_slices = [(idx, idx + batch_size) for idx in range(0, len(group), batch_size)]
+        else:
+            batch_slices = pack_flashcard_batches(group['Flashcard'].tolist(), transcript_text, max_input_tokens, max_cards_per_request)
+        for start, end in batch_slices:
+            batch = group.iloc[start:end]
+            batches.append((video_title, transcript_text, batch['Flashcard'].tolist(), batch['index'].tolist()))
+        pending_batches[video_title] = len(batch_slices)
+        video_rows[video_title] = resumed_rows
+
+    executor = ThreadPoolExecutor(max_workers=max_in_flight)
+    try:
+        futures = {}
+
+        def submit(video_title, transcript_text, flashcards_list, indices, max_tokens=None):
+            future = executor.submit(LLM, transcript_text, flashcards_list, bedrock_client, response_cache, rate_limiter, max_retries, max_tokens)
+            futures[future] = (video_title, transcript_text, flashcards_list, indices, max_tokens)
+
+        for video_title, transcript_text, flashcards_list, indices in batches:
+            submit(video_title, transcript_text, flashcards_list, indices)
+        total_batches = len(futures)
+        progress = tqdm.tqdm(total=total_batches, desc="Processing batches")
+
+        # Results are applied on this thread only, so data is never written concurrently
+        first_error = None
+        batches_done = 0
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                video_title, transcript_text, flashcards_list, indices, max_tokens = futures.pop(future)
                 try:
-                    fixed_classification = classification.replace("'", '"')
-                    if not fixed_classification.startswith('{'):
-                        fixed_classification = '{' + fixed_classification
-                    if not fixed_classification.endswith('}'):
-                        fixed_classification = fixed_classification + '}'
-                    classification_dict = json.loads(fixed_classification)
-                except Exception as e2:
-                    print(f"Error parsing JSON after fix attempt: {e2}")
-                    for i in indices:
-                        data.at[i, 'Flashcard Classification'] = 'No Class'
+                    classification = future.result()
+                except ResponseTruncatedError as e:
+                    if first_error is not None:
+                        continue
+                    if len(indices) > 1:
+                        # Two half batches need less output each
+                        half = len(indices) // 2
+                        submit(video_title, transcript_text, flashcards_list[:half], indices[:half])
+                        submit(video_title, transcript_text, flashcards_list[half:], indices[half:])
+                        pending_batches[video_title] += 1
+                        total_batches += 1
+                        progress.total = total_batches
+                        progress.refresh()
+                        continue
+                    if e.max_tokens < MAX_OUTPUT_TOKENS:
+                        submit(video_title, transcript_text, flashcards_list, indices, min(2 * e.max_tokens, MAX_OUTPUT_TOKENS))
+                        continue
+                    # Still cut off at the largest budget: handled as an unparseable answer below
+                    classification = e.response_text
+                except Exception as e:
+                    # Stop sending new requests but keep the batches that already finished
+                    if first_error is None:
+                        first_error = e
+                        for pending_future in futures:
+                            pending_future.cancel()
                     continue
+                print(classification)
+                classification_dict = parse_classification_response(classification)
 
-            # Update the data with the classifications
-            for i, idx_val in enumerate(indices):
-                flashcard_key = f"Flashcard_{i+1}"
-                classification_result = classification_dict.get(flashcard_key, 'No Class')
-                simplified_classification = simplify_flashcard_classification(classification_result)
-                data.at[idx_val, 'Flashcard Classification'] = simplified_classification
-                modified_rows.append(idx_val)
-
-        if modified_rows:
-            data.loc[modified_rows].to_csv(output_file_path, index=False)
-            print(f"Saved classification for BB Video Title '{video_title}' to {output_file_path}")
-
-        bb_video_titles_processed += 1
+                if classification_dict is None:
+                    REGISTRY.counter("llm_unparseable_responses_total", "Classification responses that were not valid JSON").inc()
+                    for i in indices:
+                        data.at[i, 'Flashcard Classification'] = 'No Class'
+                    if journal is not None:
+                        journal.append_batch(indices, ['No Class'] * len(indices), classification)
+                else:
+                    # Update the data with the classifications
+                    for i, idx_val in enumerate(indices):
+                        flashcard_key = f"Flashcard_{i+1}"
+                        classification_result = classification_dict.get(flashcard_key, 'No Class')
+                        simplified_classification = simplify_flashcard_classification(classification_result)
+                        data.at[idx_val, 'Flashcard Classification'] = simplified_classification
+                        video_rows[video_title].append(idx_val)
+                    if journal is not None:
+                        journal.append_batch(indices, data.loc[indices, 'Flashcard Classification'].tolist(), classification)
+
+                batches_done += 1
+                progress.update(1)
+                if progress_callback is not None:
+                    progress_callback(batches_done, total_batches)
+
+                pending_batches[video_title] -= 1
+                if pending_batches[video_title] == 0:
+                    modified_rows = sorted(video_rows.pop(video_title))
+                    if modified_rows:
+                        output_file_path = os.path.join(output_dir, f'classified_{video_title}.csv')
+                        data.loc[modified_rows].to_csv(output_file_path, index=False)
+                        print(f"Saved classification for BB Video Title '{video_title}' to {output_file_path}")
+                    bb_video_titles_processed += 1
+        progress.close()
+
+        if first_error is not None:
+            raise first_error
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        if journal is not None:
+            journal.close()
+        if response_cache is not None:
+            print(f"LLM response cache: {response_cache.stats()}")
 
     return bb_video_titles_processed
 
@@ -189,8 +378,10 @@ def main():
     transcript_path = '/home/ubuntu/projects/ANKI_MHE_imp/delta_endocrniology_file_output.json'
     output_dir = 'v2NoClass12mardelta_v1complete_step1'
     final_output_file_path = 'v2NoClass12mardelta_v1complete_step1/endocrinology_delta_v3_12mar2025final.csv'
-    error_output_file_path = 'Final_complete_step1/12mar2025_progress_on_error.csv'
+    journal_path = os.path.join(output_dir, 'classification_journal.jsonl')
+    response_cache_path = 'llm_response_cache.sqlite'
 
+    global bedrock_runtime
     bedrock_runtime = initialize_bedrock()
     data = load_data(file_path)
     transcript_mapping = load_transcripts(transcript_path)
@@ -199,28 +390,26 @@ def main():
 
     setup_output_directory(output_dir)
 
-    retry_count = 0
-    max_retries = 10
-    delay_seconds = 600
-
-    while retry_count < max_retries:
-        try:
-            process_bb_video_titles(data, transcript_mapping)
-            break  # If processing completes without exceptions, exit the loop
-        except Exception as e:
-            print(f"An error occurred: {e}")
-            data.to_csv(error_output_file_path, index=False)
-            print(f"Saved progress due to error to {error_output_file_path}")
-            retry_count += 1
-            if retry_count < max_retries:
-                print(f"Retrying in {delay_seconds / 60} minutes... ({retry_count}/{max_retries})")
-                time.sleep(delay_seconds)
-            else:
-                print("Max retries reached. Exiting.")
-                break
+    # Throttling is retried per request with backoff; anything else stops the run
+    try:
+        process_bb_video_titles(
+            data,
+            transcript_mapping,
+            output_dir=output_dir,
+            max_in_flight=8,
+            requests_per_minute=250,
+            tokens_per_minute=2_000_000,
+            response_cache=LLMResponseCache(response_cache_path),
+            journal_path=journal_path,
+        )
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        print(f"Finished batches are in {journal_path}; re-run to resume.")
+        return
 
     data.to_csv(final_output_file_path, index=False)
     print(f"Saved final progress to {final_output_file_path} after processing all BB Video Titles.")
+    dump_summary(os.path.join(output_dir, 'step4_metrics.json'))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,88 @@
+import random
+import threading
+import time
+from metrics import COUNT_BUCKETS, REGISTRY
+
+RETRYABLE_ERROR_CODES = {
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceUnavailableException",
+    "ModelNotReadyException",
+    "InternalServerException",
+}
+
+class TokenBucketRateLimiter:
+    """
+    Thread-safe limiter for Bedrock requests-per-minute and tokens-per-minute quotas.
+    Each bucket refills continuously and holds at most one minute of quota; a None limit is unlimited.
+    """
+
+    def __init__(self, requests_per_minute: float = None, tokens_per_minute: float = None):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._request_allowance = requests_per_minute or 0
+        self._token_allowance = tokens_per_minute or 0
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed_minutes = (now - self._last_refill) / 60
+        self._last_refill = now
+        if self.requests_per_minute:
+            self._request_allowance = min(self.requests_per_minute, self._request_allowance + elapsed_minutes * self.requests_per_minute)
+        if self.tokens_per_minute:
+            self._token_allowance = min(self.tokens_per_minute, self._token_allowance + elapsed_minutes * self.tokens_per_minute)
+
+    def acquire(self, tokens: int = 0):
+        """
+        Blocks until one request and the given number of tokens fit in the quota.
+        Requests larger than the whole token quota are let through once the bucket is full.
+        """
+        while True:
+            with self._lock:
+                self._refill()
+                wait_seconds = 0.0
+                if self.requests_per_minute and self._request_allowance < 1:
+                    wait_seconds = max(wait_seconds, (1 - self._request_allowance) * 60 / self.requests_per_minute)
+                if self.tokens_per_minute:
+                    needed = min(tokens, self.tokens_per_minute)
+                    if self._token_allowance < needed:
+                        wait_seconds = max(wait_seconds, (needed - self._token_allowance) * 60 / self.tokens_per_minute)
+                if wait_seconds == 0:
+                    if self.requests_per_minute:
+                        self._request_allowance -= 1
+                    if self.tokens_per_minute:
+                        self._token_allowance -= tokens
+                    return
+            time.sleep(wait_seconds)
+
+def is_retryable_error(error: Exception) -> bool:
+    """
+    True for Bedrock throttling and transient service errors (botocore ClientError codes).
+    """
+    response = getattr(error, "response", None)
+    if not isinstance(response, dict):
+        return False
+    return response.get("Error", {}).get("Code") in RETRYABLE_ERROR_CODES
+
+def call_with_backoff(fn, *args, max_retries: int = 8, base_delay: float = 2.0, max_delay: float = 120.0, **kwargs):
+    """
+    Calls fn, retrying retryable errors with full-jitter exponential backoff.
+    Other errors, and the last retryable one, are raised.
+    """
+    attempt = 0
+    while True:
+        try:
+            result = fn(*args, **kwargs)
+            REGISTRY.histogram("bedrock_request_retries", "Retries needed per Bedrock request", COUNT_BUCKETS).observe(attempt)
+            return result
+        except Exception as e:
+            if not is_retryable_error(e) or attempt >= max_retries:
+                REGISTRY.counter("bedrock_request_failures_total", "Bedrock requests that failed after retries").inc(retryable=is_retryable_error(e))
+                raise
+            REGISTRY.counter("bedrock_retries_total", "Retried Bedrock calls by error code").inc(code=e.response["Error"].get("Code"))
+            delay = random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+            print(f"Retryable Bedrock error ({e}); retrying in {delay:.1f}s ({attempt + 1}/{max_retries})")
+            time.sleep(delay)
+            attempt += 1
@@ -0,0 +1,84 @@
+import argparse
+import json
+import time
+
+from text_chunker import chunk_text, split_sentences, tokenizer_token_counter, word_token_counter
+
+def legacy_split_text_into_paragraphs(text, max_paragraph_length=150):
+    """
+    The original NLTK Punkt chunker from step 2.
+    """
+    from nltk import sent_tokenize
+
+    sentences = sent_tokenize(text)
+    paragraphs = []
+    current_paragraph = []
+    current_length = 0
+
+    for sentence in sentences:
+        sentence_length = len(sentence.split())
+        if current_length + sentence_length > max_paragraph_length:
+            paragraphs.append(" ".join(current_paragraph))
+            current_paragraph = []
+            current_length = 0
+        current_paragraph.append(sentence)
+        current_length += sentence_length
+    if current_paragraph:
+        paragraphs.append(" ".join(current_paragraph))
+
+    return paragraphs
+
+def load_transcripts(path: str) -> list:
+    """
+    Reads the transcript texts of a transcript export (bb_transcripts.json) or a step 1 product file.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        # Step 1 product files store each distinct transcript once
+        texts = list(data.get('transcripts', {}).values())
+    else:
+        texts = [item.get('Transcript') or item.get('transcript') for item in data]
+    return [text for text in texts if isinstance(text, str) and text]
+
+def time_chunker(texts, chunker) -> tuple:
+    start = time.perf_counter()
+    chunks = [chunker(text) for text in texts]
+    return time.perf_counter() - start, chunks
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the step 2 sentence chunker against the NLTK Punkt path.")
+    parser.add_argument("transcripts", help="Transcript export JSON (e.g. bb_transcripts.json)")
+    parser.add_argument("--max-length", type=int, default=150, help="Maximum chunk length (words, or tokens with --tokenizer)")
+    parser.add_argument("--tokenizer", default=None, help="Hugging Face tokenizer to count tokens with, e.g. abhinand/MedEmbed-large-v0.1")
+    args = parser.parse_args()
+
+    texts = load_transcripts(args.transcripts)
+    print(f"Transcripts: {len(texts):,}  characters: {sum(len(text) for text in texts):,}")
+
+    try:
+        legacy_seconds, legacy_chunks = time_chunker(texts, lambda text: legacy_split_text_into_paragraphs(text, args.max_length))
+        print(f"NLTK Punkt:          {legacy_seconds:.3f}s  chunks: {sum(map(len, legacy_chunks)):,}")
+    except (ImportError, LookupError) as e:
+        legacy_seconds, legacy_chunks = None, None
+        print(f"NLTK Punkt path unavailable ({type(e).__name__}); skipping it")
+
+    token_counter = word_token_counter
+    if args.tokenizer:
+        from transformers import AutoTokenizer
+        token_counter = tokenizer_token_counter(AutoTokenizer.from_pretrained(args.tokenizer))
+
+    new_seconds, new_chunks = time_chunker(texts, lambda text: chunk_text(text, args.max_length, token_counter=token_counter))
+    print(f"Regex chunker:       {new_seconds:.3f}s  chunks: {sum(map(len, new_chunks)):,}")
+
+    if legacy_chunks is not None:
+        print(f"Speedup: ~{legacy_seconds / max(new_seconds, 1e-9):,.1f}x")
+        if not args.tokenizer:
+            same = sum(legacy == new for legacy, new in zip(legacy_chunks, new_chunks))
+            print(f"Transcripts chunked identically to NLTK: {same:,} / {len(texts):,}")
+
+    sentence_counts = [len(split_sentences(text)) for text in texts]
+    print(f"Sentences per transcript: mean {sum(sentence_counts) / max(len(texts), 1):.1f}, max {max(sentence_counts, default=0)}")
+
+if __name__ == "__main__":
+    main()
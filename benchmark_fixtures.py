@@ -0,0 +1,207 @@
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+import numpy as np
+import pandas as pd
+
+# Preset dataset sizes for the benchmark suite
+SCALES = {
+    "small": {"videos": 50, "placements_per_video": 2, "sentences_per_video": 40, "flashcards": 2_000, "anki_rows": 5_000},
+    "medium": {"videos": 500, "placements_per_video": 2, "sentences_per_video": 80, "flashcards": 20_000, "anki_rows": 50_000},
+    "large": {"videos": 5_000, "placements_per_video": 3, "sentences_per_video": 120, "flashcards": 100_000, "anki_rows": 100_000},
+}
+
+PRODUCTS = ["USMLE Step 1", "USMLE Step 2 CK", "COMLEX Level 1", "Shelf Exams"]
+EXAM_TYPES = ["Step 1", "Step 2", "COMLEX", "Shelf"]
+CATEGORIES = ["Endocrinology", "Cardiology", "Renal", "Pulmonology", "Hematology", "Neurology"]
+VOCABULARY = (
+    "insulin glucose thyroid cortisol aldosterone renin kidney nephron glomerulus heart ventricle atrium "
+    "lung alveolus surfactant liver bilirubin hemoglobin platelet neutrophil neuron synapse dopamine "
+    "receptor enzyme deficiency syndrome mutation inhibitor agonist antagonist clearance secretion "
+    "the a of and in is with causes leads to increased decreased patients presents treatment"
+).split()
+
+def make_sentence(rng: random.Random, min_words: int = 6, max_words: int = 22) -> str:
+    words = [rng.choice(VOCABULARY) for _ in range(rng.randint(min_words, max_words))]
+    return " ".join(words).capitalize() + "."
+
+def make_transcripts(n_videos: int, sentences_per_video: int, seed: int = 0) -> list:
+    """
+    bb_transcripts.json records: {"Id", "Transcript"}.
+    """
+    rng = random.Random(seed)
+    return [
+        {"Id": f"cad-{i:06d}", "Transcript": " ".join(make_sentence(rng) for _ in range(sentences_per_video))}
+        for i in range(n_videos)
+    ]
+
+def make_hierarchy(transcripts: list, placements_per_video: int, seed: int = 1) -> list:
+    """
+    bb_hierarchical.json records placing each transcript under placements_per_video products.
+    """
+    rng = random.Random(seed)
+    hierarchy = []
+    for i, transcript in enumerate(transcripts):
+        category = rng.choice(CATEGORIES)
+        for product in rng.sample(PRODUCTS, min(placements_per_video, len(PRODUCTS))):
+            hierarchy.append({
+                "categoryTitle": category,
+                "subcategoryTitle": f"{category} {rng.randint(1, 8)}",
+                "videoID": i,
+                "cadmoreAlternateID": transcript["Id"],
+                "videoTitle": f"Video {i}",
+                "product": product,
+                "videoUrl": f"https://example.org/videos/{i}",
+            })
+    return hierarchy
+
+def make_anki_sheets(n_rows: int, n_flashcards: int, n_videos: int, seed: int = 2) -> tuple:
+    """
+    The two Anki workbook sheets: the video/URL sheet read by step 1 and the flashcard sheet (with exam types and tags) read by step 3.
+    """
+    rng = random.Random(seed)
+    urls = pd.DataFrame({
+        "BB Video Title": [f"Video {rng.randrange(n_videos)}" for _ in range(n_rows)],
+        "Exam Type": [rng.choice(EXAM_TYPES) for _ in range(n_rows)],
+        "FA4 Launch URL": [f"https://example.org/fa4/{i}" for i in range(n_rows)],
+    })
+    flashcards = pd.DataFrame({
+        "id": list(range(n_flashcards)),
+        "text_and_extra": [" ".join(make_sentence(rng, 4, 12) for _ in range(2)) for _ in range(n_flashcards)],
+    })
+    # Exam type and subject tags for step 2's metadata pre-filter, from their own generator so the texts stay the same
+    tag_rng = random.Random(seed + 100)
+    exam_types = [tag_rng.choice(EXAM_TYPES) for _ in range(n_flashcards)]
+    flashcards["Exam Type"] = exam_types
+    flashcards["tags"] = [f"#AK_{exam_type.replace(' ', '')}::{tag_rng.choice(CATEGORIES)}" for exam_type in exam_types]
+    return urls, flashcards
+
+def write_synthetic_dataset(output_dir: str, scale: str = "small", seed: int = 0, **overrides) -> dict:
+    """
+    Writes bb_transcripts.json, bb_hierarchical.json and anki.xlsx for a scale preset (sizes can be overridden)
+    and returns their paths. The same scale and seed always give the same files.
+    """
+    sizes = dict(SCALES[scale], **overrides)
+    os.makedirs(output_dir, exist_ok=True)
+    transcripts = make_transcripts(sizes["videos"], sizes["sentences_per_video"], seed)
+    hierarchy = make_hierarchy(transcripts, sizes["placements_per_video"], seed + 1)
+    urls, flashcards = make_anki_sheets(sizes["anki_rows"], sizes["flashcards"], sizes["videos"], seed + 2)
+
+    paths = {
+        "bb_transcripts_file": os.path.join(output_dir, "bb_transcripts.json"),
+        "bb_hierarchical_file": os.path.join(output_dir, "bb_hierarchical.json"),
+        "anki_excel_file": os.path.join(output_dir, "anki.xlsx"),
+    }
+    with open(paths["bb_transcripts_file"], "w", encoding="utf-8") as f:
+        json.dump(transcripts, f)
+    with open(paths["bb_hierarchical_file"], "w", encoding="utf-8") as f:
+        json.dump(hierarchy, f)
+    with pd.ExcelWriter(paths["anki_excel_file"]) as writer:
+        urls.to_excel(writer, sheet_name="videos", index=False)
+        flashcards.to_excel(writer, sheet_name="flashcards", index=False)
+    return {"paths": paths, "sizes": sizes}
+
+class StubTokenizer:
+    """
+    Whitespace tokenizer with the call signature of a Hugging Face tokenizer.
+    """
+
+    def __call__(self, texts, add_special_tokens: bool = True):
+        return {"input_ids": [list(range(len(text.split()))) for text in texts]}
+
+class StubEncoder:
+    """
+    Deterministic stand-in for SentenceTransformer: hashed bag-of-words vectors, no model download.
+    Texts sharing words get similar vectors, so the matching steps produce realistic numbers of matches.
+    seconds_per_text adds a fixed cost per text to mimic encoder time.
+    """
+
+    def __init__(self, dimension: int = 256, seconds_per_text: float = 0.0):
+        self.dimension = dimension
+        self.seconds_per_text = seconds_per_text
+        self.tokenizer = StubTokenizer()
+        self.texts_encoded = 0
+
+    def _bucket(self, word: str) -> int:
+        return int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little") % self.dimension
+
+    def encode(self, texts, batch_size: int = 32, **kwargs):
+        if isinstance(texts, str):
+            texts = [texts]
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in re.findall(r"\w+", text.lower()):
+                vectors[row, self._bucket(word)] += 1.0
+        if self.seconds_per_text:
+            time.sleep(self.seconds_per_text * len(texts))
+        self.texts_encoded += len(texts)
+        return vectors
+
+class FakeBedrockError(Exception):
+    """
+    Carries a botocore-style response, so is_retryable_error treats it like a ClientError.
+    """
+
+    def __init__(self, code: str):
+        super().__init__(f"An error occurred ({code}) when calling the Converse operation")
+        self.response = {"Error": {"Code": code, "Message": code}}
+
+class FakeBedrockClient:
+    """
+    Local Bedrock runtime stand-in for converse(): sleeps a random latency (mean latency_ms, +-jitter_ms),
+    throws ThrottlingException with probability throttle_rate, and returns malformed JSON with probability
+    malformed_rate; otherwise classifies every Flashcard_N in the prompt. Answers longer than maxTokens are
+    cut off with stopReason "max_tokens". Call latencies are recorded.
+    """
+
+    def __init__(self, latency_ms: float = 800.0, jitter_ms: float = 400.0, throttle_rate: float = 0.02, malformed_rate: float = 0.01, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.throttle_rate = throttle_rate
+        self.malformed_rate = malformed_rate
+        self.calls = 0
+        self.throttled = 0
+        self.malformed = 0
+        self.latencies_ms = []
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def converse(self, modelId=None, messages=None, system=None, inferenceConfig=None, **kwargs):
+        with self._lock:
+            self.calls += 1
+            latency_ms = max(0.0, self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms))
+            throttle = self._rng.random() < self.throttle_rate
+            malformed = not throttle and self._rng.random() < self.malformed_rate
+            labels_seed = self._rng.random()
+        time.sleep(latency_ms / 1000)
+        with self._lock:
+            self.latencies_ms.append(latency_ms)
+            if throttle:
+                self.throttled += 1
+            if malformed:
+                self.malformed += 1
+        if throttle:
+            raise FakeBedrockError("ThrottlingException")
+
+        prompt = messages[0]["content"][0]["text"]
+        card_numbers = sorted({int(n) for n in re.findall(r"^Flashcard_(\d+):", prompt, re.M)})
+        labels_rng = random.Random(labels_seed)
+        classification = {f"Flashcard_{n}": labels_rng.choice(["Primary", "Secondary", "Non-Relevant"]) for n in card_numbers}
+        # Indented, as the system prompt asks; JSON runs at about 3 characters per token
+        text = json.dumps(classification, indent=4)
+        if malformed:
+            text = "Here are the classifications: " + text[:max(1, len(text) // 2)]
+        stop_reason = "end_turn"
+        max_tokens = (inferenceConfig or {}).get("maxTokens")
+        if max_tokens and len(text) // 3 > max_tokens:
+            text, stop_reason = text[:max_tokens * 3], "max_tokens"
+        return {
+            "output": {"message": {"role": "assistant", "content": [{"text": text}]}},
+            "stopReason": stop_reason,
+            "usage": {"inputTokens": len(prompt) // 4, "outputTokens": len(text) // 3, "totalTokens": len(prompt) // 4 + len(text) // 3},
+            "metrics": {"latencyMs": int(latency_ms)},
+        }
@@ -0,0 +1,71 @@
+import argparse
+import numpy as np
+
+from flashcard_embedding_store import load_flashcard_embeddings
+from flashcard_search import QUANTIZATION_DTYPES, ExactSearchIndex, build_store_search_index, normalize_embeddings, recall_report
+
+def sample_queries(embeddings, n_queries: int, noise: float, seed: int = 0) -> np.ndarray:
+    """
+    Stand-in transcript chunks: random flashcard vectors with Gaussian noise, so queries have near
+    and borderline matches around the threshold.
+    """
+    rng = np.random.default_rng(seed)
+    rows = np.sort(rng.choice(len(embeddings), min(n_queries, len(embeddings)), replace=False))
+    queries = normalize_embeddings(embeddings[rows])
+    queries += rng.normal(0, noise / np.sqrt(queries.shape[1]), queries.shape).astype(np.float32)
+    return normalize_embeddings(queries)
+
+def encode_transcript_queries(path: str, model_name: str, n_queries: int, max_paragraph_length: int = 150) -> np.ndarray:
+    """
+    Real queries: the first n_queries step 2 chunks of the transcripts in a step 1 product file or transcript export.
+    """
+    from benchmark_chunker import load_transcripts
+    from model_registry import get_embedding_model
+    from text_chunker import chunk_text
+
+    chunks = []
+    for text in load_transcripts(path):
+        chunks.extend(chunk_text(text, max_tokens=max_paragraph_length))
+        if len(chunks) >= n_queries:
+            break
+    return normalize_embeddings(get_embedding_model(model_name).encode(chunks[:n_queries], batch_size=64))
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall and memory report of the quantised flashcard search backends against float32 exact search.")
+    parser.add_argument("store", help="Flashcard embedding store directory")
+    parser.add_argument("--queries", default=None, help=".npy file of query embeddings")
+    parser.add_argument("--transcripts", default=None, help="Step 1 product file or transcript export to encode queries from (loads the embedding model)")
+    parser.add_argument("--model-name", default="abhinand/MedEmbed-large-v0.1")
+    parser.add_argument("--num-queries", type=int, default=500)
+    parser.add_argument("--noise", type=float, default=0.8, help="Noise added to sampled flashcard vectors when no queries are given")
+    parser.add_argument("--top-k", type=int, default=20)
+    parser.add_argument("--threshold", type=float, default=0.65)
+    args = parser.parse_args()
+
+    embeddings_data = load_flashcard_embeddings(args.store, mmap=True)
+    if args.queries:
+        queries = normalize_embeddings(np.load(args.queries))
+    elif args.transcripts:
+        queries = encode_transcript_queries(args.transcripts, args.model_name, args.num_queries)
+    else:
+        queries = sample_queries(embeddings_data['flashcard_embeddings'], args.num_queries, args.noise)
+    print(f"Flashcards: {len(embeddings_data['flashcards']):,}  queries: {len(queries):,}  top_k: {args.top_k}  threshold: {args.threshold}")
+
+    reference = ExactSearchIndex(embeddings_data['flashcard_embeddings'], assume_normalized=embeddings_data['header']['normalized'])
+    print(f"{'Backend':<16} {'Scan MB':>9} {'Memory':>7} {'ms/query':>9} {'Exact ms':>9} {'Recall':>8} {'Identical':>10} {'Max diff':>9}")
+    for dtype in QUANTIZATION_DTYPES:
+        search_index = build_store_search_index(embeddings_data, backend=dtype)
+        source = "store" if dtype in embeddings_data.get('quantized_embeddings', {}) else "quantised at load"
+        for rerank in (True, False):
+            search_index.rerank = rerank
+            report = recall_report(search_index, reference, queries, top_k=args.top_k, threshold=args.threshold)
+            name = f"{dtype}{' +rerank' if rerank else ''}"
+            print(
+                f"{name:<16} {report['scan_bytes'] / 1024 ** 2:>9.1f} {report['reference_scan_bytes'] / report['scan_bytes']:>6.1f}x "
+                f"{report['ms_per_query']:>9.2f} {report['reference_ms_per_query']:>9.2f} {report['recall']:>8.4f} "
+                f"{report['identical_queries']:>10.4f} {report['max_score_diff']:>9.4f}"
+            )
+        print(f"  ({dtype} matrix {source})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import argparse
+import random
+import time
+import pandas as pd
+
+from MHE_Dtacreation_video_step1 import build_anki_url_index, lookup_fa4_launch_url
+
+EXAM_TYPES = ["Step 1", "Step 2", "COMLEX", "Shelf", "NBDE"]
+PRODUCTS = ["USMLE Step 1", "USMLE Step 2 CK", "COMLEX Level 1", "Shelf Exams"]
+
+def make_synthetic_anki_sheet(n_rows: int = 100_000, n_videos: int = 5_000, seed: int = 0) -> pd.DataFrame:
+    """
+    Builds an Anki sheet with the columns step 1 reads.
+    """
+    rng = random.Random(seed)
+    return pd.DataFrame({
+        'BB Video Title': [f"Video {rng.randrange(n_videos)}" for _ in range(n_rows)],
+        'Exam Type': [rng.choice(EXAM_TYPES) for _ in range(n_rows)],
+        'FA4 Launch URL': [f"https://example.org/fa4/{i}" for i in range(n_rows)],
+    })
+
+def make_synthetic_placements(n_items: int, n_videos: int = 5_000, seed: int = 1) -> list:
+    rng = random.Random(seed)
+    return [
+        {'videoTitle': f"Video {rng.randrange(n_videos)}", 'product': rng.choice(PRODUCTS)}
+        for _ in range(n_items)
+    ]
+
+def legacy_lookup(anki_df: pd.DataFrame, video_title, product: str):
+    """
+    The original per-item iterrows scan from process_data.
+    """
+    for _, row in anki_df.iterrows():
+        if (
+            str(row['Exam Type']).lower() in product.lower() and
+            row['BB Video Title'] == video_title
+        ):
+            return row['FA4 Launch URL']
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the step 1 FA4 Launch URL join.")
+    parser.add_argument("--rows", type=int, default=100_000, help="Rows in the synthetic Anki sheet")
+    parser.add_argument("--items", type=int, default=20_000, help="(transcript x hierarchical record) pairs to link")
+    parser.add_argument("--legacy-items", type=int, default=20, help="Pairs to time with the legacy scan (extrapolated)")
+    args = parser.parse_args()
+
+    anki_df = make_synthetic_anki_sheet(args.rows)
+    items = make_synthetic_placements(args.items)
+
+    start = time.perf_counter()
+    anki_index = build_anki_url_index(anki_df)
+    indexed_urls = [lookup_fa4_launch_url(anki_index, item['videoTitle'], item['product']) for item in items]
+    indexed_seconds = time.perf_counter() - start
+
+    legacy_sample = items[:args.legacy_items]
+    start = time.perf_counter()
+    legacy_urls = [legacy_lookup(anki_df, item['videoTitle'], item['product']) for item in legacy_sample]
+    legacy_seconds_per_item = (time.perf_counter() - start) / max(len(legacy_sample), 1)
+
+    assert legacy_urls == indexed_urls[:len(legacy_sample)], "Indexed join disagrees with the legacy scan"
+
+    legacy_projected = legacy_seconds_per_item * len(items)
+    print(f"Anki rows: {args.rows:,}  linked items: {len(items):,}")
+    print(f"Indexed join: {indexed_seconds:.3f}s total")
+    print(f"Legacy scan:  {legacy_seconds_per_item * 1000:.1f}ms per item, ~{legacy_projected:,.0f}s projected")
+    print(f"Speedup: ~{legacy_projected / max(indexed_seconds, 1e-9):,.0f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+import argparse
+import glob
+import json
+import multiprocessing as mp
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from benchmark_fixtures import SCALES, write_synthetic_dataset
+from product_files import count_placements
+
+STUB_MODEL_NAME = "stub-encoder"
+STEP_NAMES = ("step1", "step3", "step2", "step4", "step5")
+
+def _work_paths(work_dir: str) -> dict:
+    return {
+        "product_dir": os.path.join(work_dir, "product_files"),
+        "store": os.path.join(work_dir, "flashcard_embeddings_store"),
+        "step2_dir": os.path.join(work_dir, "step2"),
+        "classified_dir": os.path.join(work_dir, "classified"),
+        "classified_file": os.path.join(work_dir, "classified_flashcards.csv"),
+        "step5_dir": os.path.join(work_dir, "step5"),
+    }
+
+def _register_stub_encoder(options: dict):
+    from benchmark_fixtures import StubEncoder
+    from model_registry import register_model
+
+    return register_model(StubEncoder(options["encoder_dimension"], options["encoder_seconds_per_text"]), STUB_MODEL_NAME)
+
+def bench_step1(dataset: dict, work: dict, options: dict) -> dict:
+    from MHE_Dtacreation_video_step1 import process_data
+
+    result = process_data(output_dir=work["product_dir"], **dataset["paths"])
+    if result["status"] != "success":
+        raise RuntimeError(result["message"])
+    records = sum(count_placements(path) for path in glob.glob(os.path.join(work["product_dir"], "*.json")))
+    return {"items": records, "unit": "records"}
+
+def bench_step3(dataset: dict, work: dict, options: dict) -> dict:
+    from flashcard_embedding_creation import create_flashcard_embeddings
+
+    _register_stub_encoder(options)
+    result = create_flashcard_embeddings(dataset["paths"]["anki_excel_file"], work["store"], model_name=STUB_MODEL_NAME, batch_size=256)
+    if result["status"] != "success":
+        raise RuntimeError(result["message"])
+    return {"items": result["encoded"] + result["reused"], "unit": "flashcards"}
+
+def bench_step2(dataset: dict, work: dict, options: dict) -> dict:
+    from transcript_flashcardmapping_step2 import process_step2
+
+    encoder = _register_stub_encoder(options)
+    os.makedirs(work["step2_dir"], exist_ok=True)
+    latencies_ms = []
+    rows = 0
+    for json_file_path in sorted(glob.glob(os.path.join(work["product_dir"], "*.json"))):
+        last = [time.perf_counter()]
+
+        def progress_callback(n):
+            now = time.perf_counter()
+            latencies_ms.extend([(now - last[0]) * 1000 / n] * n)
+            last[0] = now
+
+        output_path = os.path.join(work["step2_dir"], os.path.basename(json_file_path).replace(".json", ".parquet"))
+        result = process_step2(json_file_path, work["store"], output_path, model_name=STUB_MODEL_NAME, progress_callback=progress_callback, metadata_prefilter=options["metadata_prefilter"])
+        if result["status"] != "success":
+            raise RuntimeError(result["message"])
+        rows += result["rows"]
+    return {"items": len(latencies_ms), "unit": "entries", "latencies_ms": latencies_ms, "match_rows": rows, "texts_encoded": encoder.texts_encoded}
+
+def bench_step4(dataset: dict, work: dict, options: dict) -> dict:
+    from bedrock_llm_run1_step4 import load_transcripts, process_bb_video_titles
+    from benchmark_fixtures import FakeBedrockClient
+    from table_io import read_table
+
+    step2_outputs = sorted(glob.glob(os.path.join(work["step2_dir"], "*.parquet")))
+    data = read_table(step2_outputs[0]).head(options["step4_rows"]).copy()
+    # Plain strings, as step 4 reads them from the CSV/Excel outputs
+    data = data.astype({column: str for column in data.select_dtypes("category").columns})
+    transcript_mapping = load_transcripts(dataset["paths"]["bb_transcripts_file"])
+
+    shutil.rmtree(work["classified_dir"], ignore_errors=True)
+    os.makedirs(work["classified_dir"])
+    client = FakeBedrockClient(options["bedrock_latency_ms"], options["bedrock_jitter_ms"], options["throttle_rate"], options["malformed_rate"], options["seed"])
+    process_bb_video_titles(data, transcript_mapping, output_dir=work["classified_dir"], bedrock_client=client, max_in_flight=options["max_in_flight"])
+    data.to_csv(work["classified_file"], index=False)
+    return {
+        "items": len(data),
+        "unit": "flashcard rows",
+        "latencies_ms": client.latencies_ms,
+        "bedrock_calls": client.calls,
+        "throttled": client.throttled,
+        "malformed": client.malformed,
+        "no_class_rows": int((data["Flashcard Classification"] == "No Class").sum()),
+    }
+
+def bench_step5(dataset: dict, work: dict, options: dict) -> dict:
+    from cleaning_step5_merge import clean_and_merge_files
+
+    os.makedirs(work["step5_dir"], exist_ok=True)
+    result = clean_and_merge_files(
+        [work["classified_file"]],
+        merged_output=os.path.join(work["step5_dir"], "merged.parquet"),
+        no_class_output=os.path.join(work["step5_dir"], "no_class.parquet"),
+        with_class_output=os.path.join(work["step5_dir"], "with_class.parquet"),
+    )
+    if result["status"] != "success":
+        raise RuntimeError(result["message"])
+    return {"items": result["rows"], "unit": "rows", "duplicate_rows": result["duplicate_rows"]}
+
+STEP_BENCHMARKS = {
+    "step1": bench_step1,
+    "step3": bench_step3,
+    "step2": bench_step2,
+    "step4": bench_step4,
+    "step5": bench_step5,
+}
+
+def _run_step_in_child(step: str, dataset: dict, work: dict, options: dict) -> dict:
+    """
+    Runs one step benchmark; executed in a fresh process so peak RSS belongs to this step alone.
+    """
+    start = time.perf_counter()
+    metrics = STEP_BENCHMARKS[step](dataset, work, options)
+    metrics["seconds"] = time.perf_counter() - start
+    # ru_maxrss is in kilobytes on Linux
+    metrics["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return metrics
+
+def summarize(metrics: dict) -> dict:
+    """
+    Adds throughput and latency percentiles; raw latency lists are not kept in the results file.
+    """
+    summary = {key: value for key, value in metrics.items() if key != "latencies_ms"}
+    summary["items_per_second"] = metrics["items"] / max(metrics["seconds"], 1e-9)
+    latencies = np.asarray(metrics.get("latencies_ms") or [], dtype=np.float64)
+    if len(latencies):
+        for name, q in (("p50_ms", 50), ("p95_ms", 95), ("p99_ms", 99)):
+            summary[name] = float(np.percentile(latencies, q))
+    return summary
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(scale: str = "small", steps=STEP_NAMES, work_dir: str = None, results_path: str = "benchmark_results.jsonl", seed: int = 0, **options) -> dict:
+    """
+    Generates the synthetic dataset, runs the requested steps in pipeline order (each in its own process)
+    and appends one JSON line with per-step throughput, peak RSS and latency percentiles to results_path.
+    """
+    options = dict({
+        "encoder_dimension": 256,
+        "encoder_seconds_per_text": 0.0,
+        "bedrock_latency_ms": 800.0,
+        "bedrock_jitter_ms": 400.0,
+        "throttle_rate": 0.02,
+        "malformed_rate": 0.01,
+        "step4_rows": 2_000,
+        "max_in_flight": 8,
+        "metadata_prefilter": False,
+        "seed": seed,
+    }, **options)
+    work_dir = work_dir or tempfile.mkdtemp(prefix="pipeline_benchmark_")
+    dataset = write_synthetic_dataset(os.path.join(work_dir, "input"), scale, seed)
+    work = _work_paths(work_dir)
+
+    step_results = {}
+    for step in STEP_NAMES:
+        if step not in steps:
+            continue
+        with ProcessPoolExecutor(max_workers=1, mp_context=mp.get_context("spawn")) as executor:
+            metrics = executor.submit(_run_step_in_child, step, dataset, work, options).result()
+        step_results[step] = summarize(metrics)
+        print(f"{step}: {step_results[step]['items']} {step_results[step]['unit']} in {step_results[step]['seconds']:.2f}s")
+
+    record = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "scale": scale,
+        "sizes": dataset["sizes"],
+        "options": options,
+        "steps": step_results,
+    }
+    with open(results_path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+    print_results(record)
+    return record
+
+def print_results(record: dict):
+    print(f"{'Step':<8} {'Items':>10} {'Items/s':>12} {'Seconds':>9} {'Peak RSS':>10} {'p50 ms':>9} {'p99 ms':>9}")
+    for step, metrics in record["steps"].items():
+        p50 = f"{metrics['p50_ms']:.1f}" if "p50_ms" in metrics else "-"
+        p99 = f"{metrics['p99_ms']:.1f}" if "p99_ms" in metrics else "-"
+        print(f"{step:<8} {metrics['items']:>10,} {metrics['items_per_second']:>12,.1f} {metrics['seconds']:>9.2f} {metrics['peak_rss_mb']:>8.0f}MB {p50:>9} {p99:>9}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline steps on synthetic data with a stub encoder and a fake Bedrock.")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--steps", nargs="+", choices=STEP_NAMES, default=list(STEP_NAMES), help="Steps to run (later steps need the outputs of earlier ones)")
+    parser.add_argument("--work-dir", default=None, help="Where to write the dataset and step outputs (default: a new temp dir)")
+    parser.add_argument("--results", default="benchmark_results.jsonl", help="Results file; one JSON line is appended per run")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--encoder-dimension", type=int, default=256)
+    parser.add_argument("--encoder-seconds-per-text", type=float, default=0.0, help="Simulated encoder cost per text")
+    parser.add_argument("--bedrock-latency-ms", type=float, default=800.0)
+    parser.add_argument("--bedrock-jitter-ms", type=float, default=400.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.02)
+    parser.add_argument("--malformed-rate", type=float, default=0.01)
+    parser.add_argument("--step4-rows", type=int, default=2_000, help="Step 2 rows sent to the fake Bedrock")
+    parser.add_argument("--max-in-flight", type=int, default=8)
+    parser.add_argument("--metadata-prefilter", action="store_true", help="Restrict step 2 searches to the flashcards selected by the metadata index")
+    args = parser.parse_args()
+
+    run_benchmarks(
+        scale=args.scale,
+        steps=args.steps,
+        work_dir=args.work_dir,
+        results_path=args.results,
+        seed=args.seed,
+        encoder_dimension=args.encoder_dimension,
+        encoder_seconds_per_text=args.encoder_seconds_per_text,
+        bedrock_latency_ms=args.bedrock_latency_ms,
+        bedrock_jitter_ms=args.bedrock_jitter_ms,
+        throttle_rate=args.throttle_rate,
+        malformed_rate=args.malformed_rate,
+        step4_rows=args.step4_rows,
+        max_in_flight=args.max_in_flight,
+        metadata_prefilter=args.metadata_prefilter,
+    )
+
+if __name__ == "__main__":
+    main()
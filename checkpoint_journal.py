@@ -0,0 +1,91 @@
+import hashlib
+import json
+import os
+import time
+
+def response_hash(response_text) -> str:
+    return hashlib.sha256(str(response_text).encode("utf-8")).hexdigest()[:16]
+
+def _drop_torn_tail(path: str, block_size: int = 65536):
+    """
+    Truncates a journal after its last newline, dropping a record torn by a crash mid-write.
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(0, position - block_size)
+            f.seek(start)
+            block = f.read(position - start)
+            newline = block.rfind(b"\n")
+            if newline >= 0:
+                position = start + newline + 1
+                break
+            position = start
+        if position < end:
+            f.truncate(position)
+
+class CheckpointJournal:
+    """
+    Append-only JSON-lines journal of classified rows: one {"row", "classification", "response_hash"} record per row.
+    Every batch is flushed to the OS; fsync happens in groups of fsync_every records or every fsync_interval seconds.
+    A journal belongs to one input file, since rows are identified by their index in it.
+    Reopening a journal drops a torn last line left by a crash before appending.
+    """
+
+    def __init__(self, path: str, fsync_every: int = 64, fsync_interval: float = 5.0):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Otherwise the first record appended would continue the torn line and be lost on replay
+        _drop_torn_tail(path)
+        self._file = open(path, "a", encoding="utf-8")
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def append_batch(self, rows, classifications, response_text):
+        """
+        Records the classifications of one batch, in O(batch) time.
+        """
+        batch_hash = response_hash(response_text)
+        self._file.write("".join(
+            json.dumps({"row": int(row), "classification": classification, "response_hash": batch_hash}) + "\n"
+            for row, classification in zip(rows, classifications)
+        ))
+        self._file.flush()
+        self._unsynced += len(rows)
+        if self._unsynced >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+            self.sync()
+
+    def sync(self):
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
+
+    @staticmethod
+    def replay(path: str) -> dict:
+        """
+        Returns {row index: classification} from a journal, ignoring a torn last line.
+        Later records for a row win.
+        """
+        classifications = {}
+        if not os.path.exists(path):
+            return classifications
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                classifications[record["row"]] = record["classification"]
+        return classifications
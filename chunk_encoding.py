@@ -0,0 +1,60 @@
+import numpy as np
+
+def encode_sorted_batches(texts, encode_fn, batch_size: int = 64, cache=None) -> np.ndarray:
+    """
+    Encodes texts in batches of similar length (longest first) and returns the embeddings in input order.
+    With a ChunkEmbeddingCache, cached texts are not encoded and new embeddings are written back.
+    Without texts the dimension is unknown, so a (0, 0) array is returned; the search indexes accept it.
+    """
+    if not texts:
+        return np.empty((0, 0), dtype=np.float32)
+    cached = cache.get_many(texts) if cache is not None else {}
+    embeddings = None
+    if cached:
+        dimension = len(next(iter(cached.values())))
+        embeddings = np.empty((len(texts), dimension), dtype=np.float32)
+        for i, text in enumerate(texts):
+            if text in cached:
+                embeddings[i] = cached[text]
+    misses = [i for i, text in enumerate(texts) if text not in cached]
+    order = sorted(misses, key=lambda i: len(texts[i]), reverse=True)
+    for start in range(0, len(order), batch_size):
+        batch_positions = order[start:start + batch_size]
+        batch_texts = [texts[i] for i in batch_positions]
+        batch_embeddings = np.asarray(encode_fn(batch_texts), dtype=np.float32)
+        if embeddings is None:
+            embeddings = np.empty((len(texts), batch_embeddings.shape[1]), dtype=np.float32)
+        embeddings[batch_positions] = batch_embeddings
+        if cache is not None:
+            cache.put_many(batch_texts, batch_embeddings)
+    return embeddings
+
+def _encode_window(window, encode_fn, batch_size, cache):
+    # Identical chunks inside the window are encoded once
+    unique_positions = {}
+    for _, chunks in window:
+        for chunk in chunks:
+            unique_positions.setdefault(chunk, len(unique_positions))
+    unique_embeddings = encode_sorted_batches(list(unique_positions), encode_fn, batch_size, cache)
+    for payload, chunks in window:
+        rows = [unique_positions[chunk] for chunk in chunks]
+        yield payload, chunks, unique_embeddings[rows] if rows else np.empty((0, unique_embeddings.shape[1]), dtype=np.float32)
+
+def iter_encoded_entries(chunked_entries, encode_fn, batch_size: int = 64, window_batches: int = 16, cache=None):
+    """
+    Streams (payload, chunks, embeddings) for each (payload, chunks) pair, in input order.
+    Chunks are pooled across entries in windows of about batch_size * window_batches chunks and encoded
+    in length-sorted batches, so batch shapes no longer depend on the length of any one transcript.
+    Chunks found in the optional cache skip the encoder entirely.
+    """
+    window = []
+    window_chunks = 0
+    for payload, chunks in chunked_entries:
+        window.append((payload, chunks))
+        window_chunks += len(chunks)
+        if window_chunks >= batch_size * window_batches:
+            yield from _encode_window(window, encode_fn, batch_size, cache)
+            window = []
+            window_chunks = 0
+    if window:
+        yield from _encode_window(window, encode_fn, batch_size, cache)
@@ -1,53 +1,194 @@
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+import numpy as np
 import pandas as pd
+from table_io import TableWriter, iter_table_chunks, table_format
+from metrics import span, timed
 
-def clean_and_merge_files(input_files, merged_output="finalmerged_output.xlsx", no_class_output="no_class.xlsx", with_class_output="with_class.xlsx"):
-    """
-    Cleans and merges input Excel and CSV files by:
-    - Separating rows with "No Class" from the "Flashcard Classification" column.
-    - Saving separate files for "No Class" and classified rows.
-    - Merging all input files into a final cleaned output.
+# Rows with the same pair are the same flashcard match; only the first is kept
+DEDUPE_COLUMNS = ("videoID", "Flashcard ID")
 
-    Parameters:
-    input_files (list): List of file paths to process.
-    merged_output (str): Path to save the final merged file.
-    no_class_output (str): Path to save entries with "No Class".
-    with_class_output (str): Path to save entries without "No Class".
+_END_OF_FILE = object()
+
+def _read_chunks(path: str, chunk_rows: int):
+    chunks = iter_table_chunks(path, chunk_rows)
+    while True:
+        with span("step5.read_chunk"):
+            chunk = next(chunks, None)
+        if chunk is None:
+            return
+        yield chunk
+
+def _put(chunks: queue.Queue, item, stop: threading.Event) -> bool:
+    while not stop.is_set():
+        try:
+            chunks.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def iter_input_chunks(input_files, chunk_rows: int = 20_000, read_workers: int = 4):
+    """
+    Yields the chunks of all input files, in input order.
+    With read_workers > 1 the next chunks and files are read ahead on threads while the current chunk is
+    processed; each reader holds at most two chunks, so memory stays bounded by the chunk size, not by the file sizes.
     """
+    if read_workers <= 1:
+        for path in input_files:
+            yield from _read_chunks(path, chunk_rows)
+        return
 
-    # List to store DataFrames
-    dfs = []
+    stop = threading.Event()
 
-    # Read and append each file
-    for file in input_files:
-        if file.endswith(".xlsx") or file.endswith(".xls"):
-            df = pd.read_excel(file)
-        elif file.endswith(".csv"):
-            df = pd.read_csv(file)
-        else:
-            print(f"Skipping unsupported file format: {file}")
+    def read_ahead(path, chunks):
+        try:
+            for chunk in _read_chunks(path, chunk_rows):
+                if not _put(chunks, chunk, stop):
+                    return
+            _put(chunks, _END_OF_FILE, stop)
+        except Exception as e:
+            _put(chunks, e, stop)
+
+    executor = ThreadPoolExecutor(max_workers=read_workers)
+    try:
+        pending = deque()
+        paths = iter(input_files)
+
+        def submit_next():
+            path = next(paths, None)
+            if path is not None:
+                chunks = queue.Queue(maxsize=1)
+                executor.submit(read_ahead, path, chunks)
+                pending.append(chunks)
+
+        for _ in range(read_workers):
+            submit_next()
+        while pending:
+            chunks = pending.popleft()
+            # Keeps read_workers files in flight, the one being consumed included
+            submit_next()
+            while True:
+                item = chunks.get()
+                if item is _END_OF_FILE:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+    finally:
+        stop.set()
+        executor.shutdown(wait=True)
+
+def _normalized_id(value):
+    # Missing IDs (blank cells) identify nothing, so they become None rather than "nan"
+    if value is None or value is pd.NA or value == "" or (isinstance(value, float) and np.isnan(value)):
+        return None
+    # 12 and 12.0 are the same ID, e.g. from a CSV column that also holds blanks
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+def _id_strings(values: pd.Series) -> list:
+    if pd.api.types.is_integer_dtype(values) and not values.hasnans:
+        return list(map(str, values.tolist()))
+    return list(map(_normalized_id, values.tolist()))
+
+def first_occurrences(chunk: pd.DataFrame, seen: set) -> np.ndarray:
+    """
+    Marks the rows whose (videoID, Flashcard ID) was not seen in this or an earlier chunk, and records them.
+    Rows missing either ID are always kept and not recorded.
+    """
+    video_ids, flashcard_ids = (_id_strings(chunk[column]) for column in DEDUPE_COLUMNS)
+    keep = np.ones(len(chunk), dtype=bool)
+    for row, (video_id, flashcard_id) in enumerate(zip(video_ids, flashcard_ids)):
+        if video_id is None or flashcard_id is None:
             continue
-        dfs.append(df)
+        # One joined string per pair takes far less memory than a tuple of two
+        key = f"{video_id}\0{flashcard_id}"
+        if key in seen:
+            keep[row] = False
+        else:
+            seen.add(key)
+    return keep
 
-    # Merge all DataFrames
-    merged_df = pd.concat(dfs, ignore_index=True)
-    print(f"Total records after merging: {len(merged_df)}")
+@timed("step5.clean_and_merge_files")
+def clean_and_merge_files(input_files, merged_output="finalmerged_output.xlsx", no_class_output="no_class.xlsx", with_class_output="with_class.xlsx", chunk_rows=20_000, read_workers=4, dedupe=True):
+    """
+    Cleans and merges input tables (Excel, CSV, Parquet, Arrow or JSON) in one streaming pass:
+    - Reading every input in chunks of chunk_rows rows, with read_workers files read ahead in parallel.
+    - Dropping repeated (videoID, Flashcard ID) rows, keeping the first one; rows missing either ID are kept.
+    - Routing rows with "No Class" in the "Flashcard Classification" column to no_class_output and the others to with_class_output.
+    - Appending all kept rows to merged_output, unless it is None.
+    Memory is bounded by the chunks in flight and the set of seen (videoID, Flashcard ID) pairs, not by the total rows.
 
-    # Filter "No Class" entries
-    df_no_class = merged_df[merged_df["Flashcard Classification"] == "No Class"]
-    df_with_class = merged_df[merged_df["Flashcard Classification"] != "No Class"]
+    Parameters:
+    input_files (list): List of file paths to process.
+    merged_output (str): Path to save the final merged file, or None to only write the split files.
+    no_class_output (str): Path to save entries with "No Class".
+    with_class_output (str): Path to save entries without "No Class".
+    """
+    try:
+        readable_files = []
+        for file in input_files:
+            try:
+                table_format(file)
+            except ValueError:
+                print(f"Skipping unsupported file format: {file}")
+                continue
+            readable_files.append(file)
+        if not readable_files:
+            raise ValueError("No input files to merge")
 
-    # Save separate files
-    df_no_class.to_excel(no_class_output, index=False)
-    df_with_class.to_excel(with_class_output, index=False)
-    merged_df.to_excel(merged_output, index=False)
+        writers = {"no_class": TableWriter(no_class_output), "with_class": TableWriter(with_class_output)}
+        if merged_output is not None:
+            writers["merged"] = TableWriter(merged_output)
+        seen = set()
+        total_rows = 0
+        duplicate_rows = 0
+        try:
+            with closing(iter_input_chunks(readable_files, chunk_rows, read_workers)) as chunks:
+                for chunk in chunks:
+                    total_rows += len(chunk)
+                    if dedupe and all(column in chunk.columns for column in DEDUPE_COLUMNS):
+                        keep = first_occurrences(chunk, seen)
+                        duplicate_rows += int((~keep).sum())
+                        chunk = chunk[keep]
 
-    print("Cleaning and merging completed successfully!")
+                    # Single pass: every chunk is split once and appended to the sinks
+                    is_no_class = (chunk["Flashcard Classification"] == "No Class").to_numpy()
+                    with span("step5.write_tables"):
+                        writers["no_class"].write(chunk[is_no_class])
+                        writers["with_class"].write(chunk[~is_no_class])
+                        if "merged" in writers:
+                            writers["merged"].write(chunk)
+            rows = {name: writer.close() for name, writer in writers.items()}
+        except BaseException:
+            for writer in writers.values():
+                writer.abort()
+            raise
 
-# Example usage
-input_files = [
-    "/content/merged_output.xlsx",
-    "/content/13_1endocrinology_delta_v3_13mar2025final.csv"
-]
+        print(f"Total records read: {total_rows}, duplicates dropped: {duplicate_rows}")
+        print("Cleaning and merging completed successfully!")
+        return {
+            "status": "success",
+            "message": "Cleaning and merging completed successfully",
+            "output_files": [writer.path for writer in writers.values()],
+            "rows": total_rows - duplicate_rows,
+            "duplicate_rows": duplicate_rows,
+            "no_class_rows": rows["no_class"],
+            "with_class_rows": rows["with_class"],
+        }
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
 
-clean_and_merge_files(input_files)
+if __name__ == "__main__":
+    # Example usage
+    input_files = [
+        "/content/merged_output.xlsx",
+        "/content/13_1endocrinology_delta_v3_13mar2025final.csv"
+    ]
 
+    clean_and_merge_files(input_files)
@@ -1,6 +1,6 @@
-import pandas as pd
 import json
 import os
+from table_io import read_table, write_table
 
 def create_excel_file(input_file1, input_file2, output_filename="output.xlsx"):
     column_mapping = {
@@ -13,11 +13,11 @@ def create_excel_file(input_file1, input_file2, output_filename="output.xlsx"):
         "Cadmore Alternate ID": "Id"
     }
 
-    df1 = pd.read_excel(input_file1, engine="openpyxl")
+    df1 = read_table(input_file1)
     df1 = df1.rename(columns=column_mapping)
     df1 = df1[list(column_mapping.values())]
 
-    df2 = pd.read_excel(input_file2, engine="openpyxl")
+    df2 = read_table(input_file2)
     additional_columns_mapping = {
         "Dev Video ID": "videoID",
         "Update Status": "updatedStatus",
@@ -28,20 +28,20 @@ def create_excel_file(input_file1, input_file2, output_filename="output.xlsx"):
 
     df2 = df2[df2["videoID"].isin(df1["videoID"])]
     combined_df = df1.merge(df2, on="videoID", how="left")
-    combined_df.to_excel(output_filename, index=False, engine="openpyxl")
+    write_table(combined_df, output_filename)
     print(f"Excel file '{output_filename}' created successfully.")
 
 def map_transcripts_to_excel(excel_file, json_file, output_file="updated_excel.xlsx"):
-    df = pd.read_excel(excel_file)
+    df = read_table(excel_file)
     with open(json_file, "r", encoding="utf-8") as f:
         json_data = json.load(f)
     id_transcript_mapping = {item["Id"]: item["Transcript"] for item in json_data}
     df["Transcript"] = df["Id"].map(id_transcript_mapping)
-    df.to_excel(output_file, index=False)
+    write_table(df, output_file)
     print(f"Updated Excel file saved as {output_file}")
 
 def excel_to_json(file_path, sheet_name=0, output_path="output.json"):
-    df = pd.read_excel(file_path, sheet_name=sheet_name)
+    df = read_table(file_path, sheet_name=sheet_name)
     data = df.to_dict(orient='records')
     json_data = json.dumps(data, indent=4)
     with open(output_path, "w") as json_file:
@@ -49,15 +49,15 @@ def excel_to_json(file_path, sheet_name=0, output_path="output.json"):
     print(f"JSON file saved as {output_path}")
     return json_data
 
-# Example execution
-input_file1 = "/content/Boards & Beyond - Endocrinology new video details (1).xlsx"
-input_file2 = "/content/Endocrinology Old vs new videos (1).xlsx"
-json_file = "/content/BoardsAndBeyondTranscriptExport.json"
-output_excel = "new_file.xlsx"
-updated_excel = "updated_excel.xlsx"
-output_json = "delta_endocrniology_file_output.json"
-
-create_excel_file(input_file1, input_file2, output_excel)
-map_transcripts_to_excel(output_excel, json_file, updated_excel)
-excel_to_json(updated_excel, output_path=output_json)
-
+if __name__ == "__main__":
+    # Example execution
+    input_file1 = "/content/Boards & Beyond - Endocrinology new video details (1).xlsx"
+    input_file2 = "/content/Endocrinology Old vs new videos (1).xlsx"
+    json_file = "/content/BoardsAndBeyondTranscriptExport.json"
+    output_table = "new_file.xlsx"
+    updated_table = "updated_excel.xlsx"
+    output_json = "delta_endocrniology_file_output.json"
+
+    create_excel_file(input_file1, input_file2, output_table)
+    map_transcripts_to_excel(output_table, json_file, updated_table)
+    excel_to_json(updated_table, output_path=output_json)
@@ -0,0 +1,103 @@
+import hashlib
+import sqlite3
+import threading
+import time
+import numpy as np
+
+class ChunkEmbeddingCache:
+    """
+    On-disk SQLite cache of transcript-chunk embeddings keyed by (model name, max_paragraph_length, chunk text hash).
+    Least recently used entries are evicted once the stored vectors exceed max_bytes.
+    """
+
+    def __init__(self, db_path: str, model_name: str, max_paragraph_length: int, max_bytes: int = 2 * 1024 ** 3):
+        self.db_path = db_path
+        self.model_name = model_name
+        self.max_paragraph_length = max_paragraph_length
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=60)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunk_embeddings ("
+            "key TEXT PRIMARY KEY, dim INTEGER NOT NULL, vector BLOB NOT NULL, "
+            "nbytes INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chunk_embeddings_last_used ON chunk_embeddings (last_used)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM chunk_embeddings").fetchone()[0]
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{self.max_paragraph_length}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, texts) -> dict:
+        """
+        Returns {text: vector} for the texts found in the cache.
+        """
+        keys = {self.key(text): text for text in texts}
+        found = {}
+        found_keys = []
+        with self._lock:
+            key_list = list(keys)
+            for start in range(0, len(key_list), 500):
+                batch = key_list[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM chunk_embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, vector in rows:
+                    found[keys[key]] = np.frombuffer(vector, dtype=np.float32)
+                    found_keys.append(key)
+            now = time.time()
+            self._conn.executemany(
+                "UPDATE chunk_embeddings SET last_used = ? WHERE key = ?",
+                [(now, key) for key in found_keys],
+            )
+            self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, texts, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        now = time.time()
+        rows = [
+            (self.key(text), vector.shape[0], vector.tobytes(), vector.nbytes, now)
+            for text, vector in zip(texts, vectors)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunk_embeddings (key, dim, vector, nbytes, last_used) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+            self._total_bytes += sum(row[3] for row in rows)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """
+        Drops least recently used entries until the cache is back under 90% of max_bytes.
+        """
+        target = int(self.max_bytes * 0.9)
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM chunk_embeddings").fetchone()[0]
+        while self._total_bytes > target:
+            rows = self._conn.execute(
+                "SELECT key, nbytes FROM chunk_embeddings ORDER BY last_used LIMIT 1000"
+            ).fetchall()
+            if not rows:
+                break
+            evicted = []
+            for key, nbytes in rows:
+                if self._total_bytes <= target:
+                    break
+                evicted.append((key,))
+                self._total_bytes -= nbytes
+            self._conn.executemany("DELETE FROM chunk_embeddings WHERE key = ?", evicted)
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,45 +1,84 @@
-import pickle
+import os
+import time
 import numpy as np
 import pandas as pd
 from tqdm import tqdm
-from sentence_transformers import SentenceTransformer
+from flashcard_embedding_store import compute_card_hash, load_embedding_store, save_embedding_store
+from flashcard_search import normalize_embeddings
+from flashcard_metadata_index import build_metadata_index
+from model_registry import get_embedding_model
+from metrics import record_encoder_batch, span, timed
 
-def create_flashcard_embeddings(excel_file_path: str, output_pkl_path: str, model_name: str = 'abhinand/MedEmbed-large-v0.1', batch_size: int = 10):
+def load_reusable_vectors(store_path: str, model_name: str) -> dict:
     """
-    Creates embeddings for flashcards and saves them to a .pkl file.
+    Maps card hash -> stored vector for a previous store built with the same model.
+    Returns an empty dict when there is no usable previous store.
+    """
+    if not store_path or not os.path.isdir(store_path):
+        return {}
+    try:
+        previous = load_embedding_store(store_path, expected_model_name=model_name)
+    except (ValueError, OSError, KeyError) as e:
+        print(f"Ignoring previous embedding store {store_path}: {e}")
+        return {}
+    card_hashes = previous.get('card_hashes') or [compute_card_hash(text, model_name) for text in previous['flashcards']]
+    embeddings = previous['flashcard_embeddings']
+    # Copy the rows out so the previous store's files can be replaced safely
+    return {card_hash: np.array(embeddings[i]) for i, card_hash in enumerate(card_hashes)}
+
+@timed("step3.create_flashcard_embeddings")
+def create_flashcard_embeddings(excel_file_path: str, output_store_path: str, model_name: str = 'abhinand/MedEmbed-large-v0.1', batch_size: int = 10, incremental: bool = False, previous_store_path: str = None, quantizations=(), metadata_columns: dict = None):
+    """
+    Creates normalised embeddings for flashcards and saves them as a memory-mappable embedding store directory.
+    With incremental, vectors of unchanged cards (same text and model) are reused from previous_store_path
+    (defaults to output_store_path) and only new or edited cards are encoded; deleted cards are dropped.
+    quantizations ("float16", "int8") also saves compact copies for the quantised search backends.
+    An inverted index from the exam type and tags columns (metadata_columns, by default "Exam Type" and "tags",
+    when the sheet has them) to flashcard rows is saved with the store for step 2's candidate pre-filtering.
+    A sheet without flashcards is reported as an error and no store is written.
     """
     try:
-        # Load model
-        embedding_model = SentenceTransformer(model_name)
-        
         # Load Excel file
-        flashcards_df = pd.read_excel(excel_file_path, sheet_name=1)
+        with span("step3.read_excel"):
+            flashcards_df = pd.read_excel(excel_file_path, sheet_name=1)
+        if flashcards_df.empty:
+            # An empty store has no embedding dimension and nothing to match against
+            return {"status": "error", "message": f"No flashcards in {excel_file_path}"}
         
         # Prepare data
         flashcards_df['Flashcard ID'] = flashcards_df['id'].astype(str)
         flashcard_ids = flashcards_df['Flashcard ID'].tolist()
         flashcards = flashcards_df['text_and_extra'].tolist()
+        card_hashes = [compute_card_hash(text, model_name) for text in flashcards]
+        metadata_index = build_metadata_index(flashcards_df, metadata_columns)
         
-        # Generate embeddings
-        flashcard_embeddings = []
-        for i in tqdm(range(0, len(flashcards), batch_size), desc='Generating Flashcard Embeddings'):
-            batch_flashcards = flashcards[i:i+batch_size]
-            batch_embeddings = embedding_model.encode(batch_flashcards)
-            flashcard_embeddings.extend(batch_embeddings)
+        reusable_vectors = {}
+        if incremental:
+            reusable_vectors = load_reusable_vectors(previous_store_path or output_store_path, model_name)
+        to_encode = [i for i, card_hash in enumerate(card_hashes) if card_hash not in reusable_vectors]
+        print(f"Reusing {len(flashcards) - len(to_encode)} flashcard embeddings, encoding {len(to_encode)}")
         
-        flashcard_embeddings_np = np.array(flashcard_embeddings)
+        # Generate embeddings for new or edited cards
+        new_vectors = {}
+        if to_encode:
+            embedding_model = get_embedding_model(model_name)
+            for i in tqdm(range(0, len(to_encode), batch_size), desc='Generating Flashcard Embeddings'):
+                batch_rows = to_encode[i:i+batch_size]
+                encode_start = time.perf_counter()
+                batch_embeddings = normalize_embeddings(embedding_model.encode([flashcards[row] for row in batch_rows]))
+                record_encoder_batch(len(batch_rows), time.perf_counter() - encode_start, model_name)
+                for row, embedding in zip(batch_rows, batch_embeddings):
+                    new_vectors[card_hashes[row]] = embedding
         
-        # Save embeddings to a pickle file
-        embeddings_data = {
-            'flashcard_ids': flashcard_ids,
-            'flashcards': flashcards,
-            'flashcard_embeddings': flashcard_embeddings_np
-        }
+        flashcard_embeddings_np = np.array([
+            new_vectors[card_hash] if card_hash in new_vectors else reusable_vectors[card_hash]
+            for card_hash in card_hashes
+        ], dtype=np.float32)
         
-        with open(output_pkl_path, 'wb') as f:
-            pickle.dump(embeddings_data, f)
+        # Save embeddings to the store
+        with span("step3.save_store"):
+            save_embedding_store(output_store_path, flashcard_ids, flashcards, flashcard_embeddings_np, model_name, normalized=True, card_hashes=card_hashes, quantizations=quantizations, metadata_index=metadata_index)
         
-        return {"status": "success", "message": "Embeddings saved successfully", "output_file": output_pkl_path}
+        return {"status": "success", "message": "Embeddings saved successfully", "output_file": output_store_path, "encoded": len(to_encode), "reused": len(flashcards) - len(to_encode)}
     except Exception as e:
         return {"status": "error", "message": str(e)}
-
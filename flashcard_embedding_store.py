@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+import pickle
+import numpy as np
+from flashcard_search import QUANTIZATION_DTYPES, quantize_embeddings
+
+STORE_FORMAT_VERSION = 1
+HEADER_FILE = "header.json"
+EMBEDDINGS_FILE = "embeddings.npy"
+SIDECAR_FILE = "flashcards.json"
+METADATA_INDEX_FILE = "metadata_index.json"
+
+def quantized_file(dtype: str) -> str:
+    return f"embeddings.{dtype}.npy"
+
+def quantized_scales_file(dtype: str) -> str:
+    return f"embeddings.{dtype}.scales.npy"
+
+def compute_content_hash(flashcard_ids, flashcards, embeddings) -> str:
+    """
+    Hashes the IDs, texts and raw embedding bytes of a store.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([list(flashcard_ids), list(flashcards)], ensure_ascii=False).encode("utf-8"))
+    digest.update(np.ascontiguousarray(embeddings).tobytes())
+    return digest.hexdigest()
+
+def _replace_file(path: str, write):
+    """
+    Writes through a temporary file and renames it into place.
+    """
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def compute_card_hash(text, model_name: str) -> str:
+    """
+    Hashes one flashcard text together with the model that embeds it.
+    """
+    return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+def save_embedding_store(store_path: str, flashcard_ids, flashcards, embeddings, model_name: str, normalized: bool = True, card_hashes=None, quantizations=(), metadata_index: dict = None):
+    """
+    Saves flashcard embeddings as a store directory:
+    - embeddings.npy: raw float32 matrix that can be memory-mapped
+    - embeddings.<dtype>.npy (+ .scales.npy for int8): compact copies for each of quantizations ("float16", "int8")
+    - metadata_index.json: the flashcard metadata index (see flashcard_metadata_index), when given
+    - flashcards.json: sidecar with the flashcard IDs, texts and per-card content hashes
+    - header.json: format version, model name, dimension, normalisation flag and content hash
+    Returns the header.
+    """
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    if embeddings.ndim != 2 or not (len(flashcard_ids) == len(flashcards) == len(embeddings)):
+        raise ValueError("Mismatch in data lengths")
+    unknown = sorted(set(quantizations) - set(QUANTIZATION_DTYPES))
+    if unknown:
+        raise ValueError(f"Unknown quantizations {unknown}, expected some of {list(QUANTIZATION_DTYPES)}")
+    if quantizations and not normalized:
+        raise ValueError("Quantized copies need normalized embeddings")
+
+    os.makedirs(store_path, exist_ok=True)
+    if card_hashes is None:
+        card_hashes = [compute_card_hash(text, model_name) for text in flashcards]
+    sidecar = {"flashcard_ids": list(flashcard_ids), "flashcards": list(flashcards), "card_hashes": list(card_hashes)}
+    header = {
+        "format_version": STORE_FORMAT_VERSION,
+        "model_name": model_name,
+        "dimension": int(embeddings.shape[1]),
+        "count": int(embeddings.shape[0]),
+        "dtype": "float32",
+        "normalized": bool(normalized),
+        "content_hash": compute_content_hash(flashcard_ids, flashcards, embeddings),
+        "quantizations": sorted(set(quantizations)),
+        "metadata_index": metadata_index is not None,
+    }
+
+    _replace_file(os.path.join(store_path, EMBEDDINGS_FILE), lambda f: np.save(f, embeddings))
+    for dtype in header["quantizations"]:
+        quantized, scales = quantize_embeddings(embeddings, dtype)
+        _replace_file(os.path.join(store_path, quantized_file(dtype)), lambda f: np.save(f, quantized))
+        if scales is not None:
+            _replace_file(os.path.join(store_path, quantized_scales_file(dtype)), lambda f: np.save(f, scales))
+    _replace_file(os.path.join(store_path, SIDECAR_FILE), lambda f: f.write(json.dumps(sidecar, ensure_ascii=False).encode("utf-8")))
+    if metadata_index is not None:
+        _replace_file(os.path.join(store_path, METADATA_INDEX_FILE), lambda f: f.write(json.dumps(metadata_index).encode("utf-8")))
+    # The header goes last so a half-written store never looks complete
+    _replace_file(os.path.join(store_path, HEADER_FILE), lambda f: f.write(json.dumps(header, indent=4).encode("utf-8")))
+    return header
+
+def read_store_header(store_path: str) -> dict:
+    with open(os.path.join(store_path, HEADER_FILE), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def load_embedding_store(store_path: str, expected_model_name: str = None, mmap: bool = True, verify_hash: bool = False) -> dict:
+    """
+    Loads a store written by save_embedding_store.
+    With mmap the matrix is a read-only memory map, so worker processes share the page cache instead of copying it.
+    Quantized copies saved with the store are returned under quantized_embeddings, {dtype: {"embeddings", "scales"}},
+    and the metadata index under metadata_index (None when the store has none).
+    Raises ValueError if the store was built with a different model than expected_model_name.
+    """
+    header = read_store_header(store_path)
+    if header.get("format_version") != STORE_FORMAT_VERSION:
+        raise ValueError(f"Unsupported embedding store version {header.get('format_version')} in {store_path}")
+    if expected_model_name is not None and header["model_name"] != expected_model_name:
+        raise ValueError(
+            f"Embedding store {store_path} was built with '{header['model_name']}', not '{expected_model_name}'"
+        )
+
+    embeddings = np.load(os.path.join(store_path, EMBEDDINGS_FILE), mmap_mode="r" if mmap else None)
+    with open(os.path.join(store_path, SIDECAR_FILE), "r", encoding="utf-8") as f:
+        sidecar = json.load(f)
+
+    if embeddings.shape != (header["count"], header["dimension"]):
+        raise ValueError(f"Embedding store {store_path} does not match its header")
+    if verify_hash and compute_content_hash(sidecar["flashcard_ids"], sidecar["flashcards"], embeddings) != header["content_hash"]:
+        raise ValueError(f"Embedding store {store_path} failed its content hash check")
+
+    quantized_embeddings = {}
+    for dtype in header.get("quantizations", []):
+        quantized = np.load(os.path.join(store_path, quantized_file(dtype)), mmap_mode="r" if mmap else None)
+        if quantized.shape != embeddings.shape:
+            raise ValueError(f"Quantized {dtype} embeddings in {store_path} do not match the store")
+        scales_path = os.path.join(store_path, quantized_scales_file(dtype))
+        quantized_embeddings[dtype] = {"embeddings": quantized, "scales": np.load(scales_path) if os.path.exists(scales_path) else None}
+
+    metadata_index = None
+    if header.get("metadata_index"):
+        with open(os.path.join(store_path, METADATA_INDEX_FILE), "r", encoding="utf-8") as f:
+            metadata_index = json.load(f)
+
+    store = dict(sidecar)
+    store["flashcard_embeddings"] = embeddings
+    store["quantized_embeddings"] = quantized_embeddings
+    store["metadata_index"] = metadata_index
+    store["header"] = header
+    return store
+
+def load_flashcard_embeddings(path: str, expected_model_name: str = None, mmap: bool = True) -> dict:
+    """
+    Loads flashcard embeddings from a store directory, or from a legacy .pkl file.
+    Legacy pickles carry no header, so their model cannot be checked.
+    """
+    if os.path.isdir(path):
+        return load_embedding_store(path, expected_model_name=expected_model_name, mmap=mmap)
+    with open(path, 'rb') as f:
+        embeddings_data = pickle.load(f)
+    embeddings_data["header"] = {"model_name": None, "normalized": False}
+    return embeddings_data
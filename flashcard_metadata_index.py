@@ -0,0 +1,107 @@
+import re
+import numpy as np
+import pandas as pd
+
+METADATA_INDEX_FORMAT_VERSION = 1
+
+# Index field -> column of the Anki flashcard sheet it is built from
+DEFAULT_METADATA_COLUMNS = {"exam_type": "Exam Type", "tag": "tags"}
+
+# Words too common in titles and tags to say anything about the subject
+STOP_WORDS = {"and", "the", "for", "with", "of", "in", "to", "part", "review", "misc", "other"}
+
+def normalize_term(value) -> str:
+    """
+    Lower-cases and collapses punctuation, so "Step_1", "step-1" and "Step 1" are the same term.
+    """
+    return " ".join(re.findall(r"[a-z0-9]+", str(value).lower()))
+
+def subject_words(text) -> set:
+    """
+    Words of a category title or tag that can identify a subject: no digits, stop words or very short words.
+    """
+    return {word for word in normalize_term(text).split() if len(word) > 2 and not word.isdigit() and word not in STOP_WORDS}
+
+def tag_words(tags) -> set:
+    """
+    Anki tags are space separated and hierarchical ("#AK_Step1_v12::#B&B::Cardiology"); every level contributes its words.
+    """
+    words = set()
+    for tag in str(tags).split():
+        for level in tag.split("::"):
+            words |= subject_words(level)
+    return words
+
+def _is_missing(value) -> bool:
+    return value is None or (not isinstance(value, str) and pd.isna(value)) or str(value).strip() == ""
+
+def build_metadata_index(flashcards_df: pd.DataFrame, metadata_columns: dict = None) -> dict:
+    """
+    Inverted index from flashcard metadata to flashcard row numbers (positions in the embedding store):
+    - "exam_type": normalised exam type -> rows
+    - "tag": subject word from the tags -> rows
+    Rows without a value for a field are listed under "unlabelled", as they cannot be ruled out by that field.
+    Fields whose column is not in the sheet are left out. Returns None when there is nothing to index.
+    """
+    metadata_columns = DEFAULT_METADATA_COLUMNS if metadata_columns is None else metadata_columns
+    fields = {}
+    unlabelled = {}
+    for field, column in metadata_columns.items():
+        if column not in flashcards_df.columns:
+            continue
+        postings = {}
+        missing = []
+        for row, value in enumerate(flashcards_df[column].tolist()):
+            if _is_missing(value):
+                missing.append(row)
+                continue
+            terms = tag_words(value) if field == "tag" else {normalize_term(value)}
+            for term in terms:
+                postings.setdefault(term, []).append(row)
+        fields[field] = postings
+        unlabelled[field] = missing
+    if not fields:
+        return None
+    return {"format_version": METADATA_INDEX_FORMAT_VERSION, "count": len(flashcards_df), "fields": fields, "unlabelled": unlabelled}
+
+class CandidateSelector:
+    """
+    Picks the flashcards worth searching for a step 1 entry from a metadata index:
+    cards whose exam type appears in the entry's product (as in step 1's FA4 URL lookup, at word boundaries)
+    and whose tags share a subject word with its categoryTitle or subcategoryTitle.
+    Unlabelled cards always stay in. Results are cached per (product, category, subcategory),
+    and the same array is returned for the same key, so search indexes can reuse gathered rows.
+    """
+
+    def __init__(self, metadata_index: dict):
+        if metadata_index.get("format_version") != METADATA_INDEX_FORMAT_VERSION:
+            raise ValueError(f"Unsupported metadata index version {metadata_index.get('format_version')}")
+        self.count = metadata_index["count"]
+        self.fields = {field: {term: np.asarray(rows, dtype=np.int64) for term, rows in postings.items()} for field, postings in metadata_index["fields"].items()}
+        self.unlabelled = {field: np.asarray(rows, dtype=np.int64) for field, rows in metadata_index["unlabelled"].items()}
+        self._cache = {}
+
+    def _field_rows(self, field: str, matching_terms) -> np.ndarray:
+        arrays = [self.unlabelled[field]] + [self.fields[field][term] for term in matching_terms]
+        return np.unique(np.concatenate(arrays))
+
+    def candidates(self, entry: dict) -> np.ndarray:
+        """
+        Sorted row numbers of the candidate flashcards for entry; may be empty.
+        """
+        key = (entry.get("product"), entry.get("categoryTitle"), entry.get("subcategoryTitle"))
+        if key in self._cache:
+            return self._cache[key]
+
+        selected = None
+        if "exam_type" in self.fields:
+            product = f" {normalize_term(key[0] or '')} "
+            selected = self._field_rows("exam_type", [term for term in self.fields["exam_type"] if f" {term} " in product])
+        if "tag" in self.fields:
+            words = subject_words(key[1] or "") | subject_words(key[2] or "")
+            rows = self._field_rows("tag", [word for word in words if word in self.fields["tag"]])
+            selected = rows if selected is None else np.intersect1d(selected, rows, assume_unique=True)
+        if selected is None:
+            selected = np.arange(self.count)
+        self._cache[key] = selected
+        return selected
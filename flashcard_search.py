@@ -0,0 +1,362 @@
+import functools
+import time
+from collections import OrderedDict
+import numpy as np
+
+# Compact flashcard matrix formats; each is also the name of its search backend
+QUANTIZATION_DTYPES = ("float16", "int8")
+
+def normalize_embeddings(embeddings, assume_normalized: bool = False) -> np.ndarray:
+    """
+    Returns a float32 copy of the embeddings with unit-length rows.
+    With assume_normalized, float32 input (including a memory map) is used as is without a copy.
+    """
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    if assume_normalized:
+        return matrix
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def select_top_matches(candidate_ids, candidate_scores, top_k: int = 20, threshold: float = 0.65):
+    """
+    Keeps the best top_k candidates scoring at least threshold.
+    Ranks like step 2 always has: by score rounded to 4 places, ties kept in flashcard order.
+    Returns a list of (flashcard_index, rounded_score) pairs; empty when top_k is not positive.
+    """
+    if top_k <= 0:
+        return []
+    candidate_ids = np.asarray(candidate_ids)
+    candidate_scores = np.asarray(candidate_scores)
+    keep = candidate_scores >= threshold
+    ids = candidate_ids[keep]
+    rounded = np.round(candidate_scores[keep], 4)
+    if len(ids) > top_k:
+        # Partial selection: only candidates tied with or above the k-th best rounded score survive
+        kth_score = np.partition(rounded, len(rounded) - top_k)[len(rounded) - top_k]
+        survivors = rounded >= kth_score
+        ids = ids[survivors]
+        rounded = rounded[survivors]
+    order = np.lexsort((ids, -rounded))[:top_k]
+    return [(int(ids[i]), float(rounded[i])) for i in order]
+
+class SubsetRows:
+    """
+    Rows of a flashcard matrix gathered for a candidate subset, kept for the last few subsets.
+    Candidate arrays are recognised by identity, so callers should reuse the same array for the same subset.
+    """
+
+    def __init__(self, max_subsets: int = 4):
+        self.max_subsets = max_subsets
+        self._subsets = OrderedDict()
+
+    def rows(self, matrix, candidate_ids) -> np.ndarray:
+        key = id(candidate_ids)
+        cached = self._subsets.get(key)
+        # The cache holds the candidate array itself, so its id cannot be reused by another array meanwhile
+        if cached is not None and cached[0] is candidate_ids:
+            self._subsets.move_to_end(key)
+            return cached[1]
+        rows = np.asarray(matrix[candidate_ids])
+        self._subsets[key] = (candidate_ids, rows)
+        if len(self._subsets) > self.max_subsets:
+            self._subsets.popitem(last=False)
+        return rows
+
+class ExactSearchIndex:
+    """
+    Brute-force cosine search over a pre-normalised float32 flashcard matrix.
+    """
+
+    def __init__(self, embeddings, query_block_size: int = 256, assume_normalized: bool = False):
+        self.embeddings = normalize_embeddings(embeddings, assume_normalized)
+        self.query_block_size = query_block_size
+        self._subset_rows = SubsetRows()
+
+    def __len__(self):
+        return len(self.embeddings)
+
+    @property
+    def scan_bytes(self) -> int:
+        """
+        Bytes of flashcard vectors read by every search.
+        """
+        return self.embeddings.nbytes
+
+    def search(self, query_embeddings, top_k: int = 20, threshold: float = 0.65, candidate_ids=None):
+        """
+        Returns one list of (flashcard_index, rounded_score) pairs per query row.
+        With candidate_ids (sorted flashcard indices), only those flashcards are searched.
+        """
+        queries = normalize_embeddings(query_embeddings)
+        if candidate_ids is None:
+            ids, embeddings = np.arange(len(self.embeddings)), self.embeddings
+        else:
+            ids, embeddings = candidate_ids, self._subset_rows.rows(self.embeddings, candidate_ids)
+        results = []
+        for start in range(0, len(queries), self.query_block_size):
+            scores_block = queries[start:start + self.query_block_size] @ embeddings.T
+            for scores in scores_block:
+                results.append(select_top_matches(ids, scores, top_k, threshold))
+        return results
+
+class IVFSearchIndex:
+    """
+    Approximate cosine search with an inverted file of k-means clusters.
+    Raise nprobe for recall, lower it for speed; nprobe == nlist is an exact search.
+    """
+
+    def __init__(self, embeddings, nlist: int = None, nprobe: int = 8, n_iter: int = 10, seed: int = 0, assume_normalized: bool = False):
+        self.embeddings = normalize_embeddings(embeddings, assume_normalized)
+        n_vectors = len(self.embeddings)
+        if nlist is None:
+            nlist = int(np.sqrt(n_vectors))
+        self.nlist = max(1, min(nlist, n_vectors))
+        self.nprobe = nprobe
+        self.centroids, assignments = self._train(n_iter, seed)
+        order = np.argsort(assignments, kind="stable")
+        boundaries = np.searchsorted(assignments[order], np.arange(self.nlist + 1))
+        self.lists = [order[boundaries[c]:boundaries[c + 1]] for c in range(self.nlist)]
+
+    def __len__(self):
+        return len(self.embeddings)
+
+    @property
+    def scan_bytes(self) -> int:
+        return self.embeddings.nbytes + self.centroids.nbytes
+
+    def _train(self, n_iter, seed):
+        """
+        Spherical k-means over the flashcard vectors.
+        """
+        rng = np.random.default_rng(seed)
+        centroids = self.embeddings[rng.choice(len(self.embeddings), self.nlist, replace=False)].copy()
+        assignments = np.zeros(len(self.embeddings), dtype=np.int64)
+        for _ in range(n_iter):
+            assignments = self._assign(centroids)
+            for c in range(self.nlist):
+                members = self.embeddings[assignments == c]
+                if len(members):
+                    centroids[c] = members.sum(axis=0)
+            centroids = normalize_embeddings(centroids)
+        return centroids, self._assign(centroids)
+
+    def _assign(self, centroids, block_size: int = 8192):
+        assignments = np.empty(len(self.embeddings), dtype=np.int64)
+        for start in range(0, len(self.embeddings), block_size):
+            block = self.embeddings[start:start + block_size]
+            assignments[start:start + block_size] = np.argmax(block @ centroids.T, axis=1)
+        return assignments
+
+    def search(self, query_embeddings, top_k: int = 20, threshold: float = 0.65, nprobe: int = None, candidate_ids=None):
+        """
+        Returns one list of (flashcard_index, rounded_score) pairs per query row.
+        With candidate_ids, flashcards outside them are dropped from the probed lists.
+        """
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        queries = normalize_embeddings(query_embeddings)
+        if len(queries) == 0:
+            # Entries without chunks come as (0, 0) query arrays
+            return []
+        centroid_scores = queries @ self.centroids.T
+        allowed = None
+        if candidate_ids is not None:
+            allowed = np.zeros(len(self.embeddings), dtype=bool)
+            allowed[candidate_ids] = True
+        results = []
+        for query, scores in zip(queries, centroid_scores):
+            probes = np.argpartition(-scores, nprobe - 1)[:nprobe]
+            probed_ids = np.concatenate([self.lists[c] for c in probes])
+            if allowed is not None:
+                probed_ids = probed_ids[allowed[probed_ids]]
+            probed_scores = self.embeddings[probed_ids] @ query
+            results.append(select_top_matches(probed_ids, probed_scores, top_k, threshold))
+        return results
+
+def quantize_embeddings(embeddings, dtype: str = "int8", block_size: int = 8192) -> tuple:
+    """
+    Compact copy of unit-length float32 rows, made block by block so a memory map is never copied whole.
+    float16 halves the matrix; int8 quarters it, with one symmetric scale per dimension
+    (max |value| / 127, so nothing is clipped). Returns (quantized matrix, per-dimension scales or None).
+    """
+    n_vectors, dimension = embeddings.shape
+    if dtype == "float16":
+        quantized = np.empty((n_vectors, dimension), dtype=np.float16)
+        for start in range(0, n_vectors, block_size):
+            quantized[start:start + block_size] = embeddings[start:start + block_size]
+        return quantized, None
+    if dtype == "int8":
+        max_abs = np.zeros(dimension, dtype=np.float32)
+        for start in range(0, n_vectors, block_size):
+            np.maximum(max_abs, np.abs(embeddings[start:start + block_size]).max(axis=0), out=max_abs)
+        scales = max_abs / 127
+        scales[scales == 0] = 1.0
+        quantized = np.empty((n_vectors, dimension), dtype=np.int8)
+        for start in range(0, n_vectors, block_size):
+            quantized[start:start + block_size] = np.rint(embeddings[start:start + block_size] / scales)
+        return quantized, scales
+    raise ValueError(f"Unknown quantization '{dtype}', expected one of {list(QUANTIZATION_DTYPES)}")
+
+def quantization_error_bound(queries, dtype: str, scales=None) -> np.ndarray:
+    """
+    Per-query upper bound on |quantised score - float32 score| for unit-length queries and flashcards.
+    """
+    # Slack for float32 rounding in the dot products themselves
+    slack = 1e-5
+    if dtype == "int8":
+        # Rounding moves each value by at most half its dimension's scale
+        return 0.5 * (np.abs(queries) @ scales) + slack
+    # float16 keeps 11 significant bits, and sum |q_d x_d| <= 1 for unit vectors
+    return np.full(len(queries), 2.0 ** -11 + slack, dtype=np.float32)
+
+class QuantizedSearchIndex:
+    """
+    Cosine search that scans a float16 or per-dimension int8 copy of the flashcard matrix.
+    With rerank, the shortlist is re-scored against the float32 vectors, and the shortlist is cut with the
+    quantisation error bound, so the flashcards above the threshold are those of ExactSearchIndex. Their rounded
+    scores can differ from it in the last place, since float32 sums in another order than the exact blocked
+    product. The float32 matrix (normally a memory map) is then only read for shortlisted rows; without rerank
+    it is not read at all.
+    A store can pass its precomputed quantized matrix and scales instead of quantising at start-up.
+    """
+
+    def __init__(self, embeddings, dtype: str = "int8", rerank: bool = True, quantized=None, scales=None, query_block_size: int = 256, scan_block_rows: int = 8192, assume_normalized: bool = False):
+        if dtype not in QUANTIZATION_DTYPES:
+            raise ValueError(f"Unknown quantization '{dtype}', expected one of {list(QUANTIZATION_DTYPES)}")
+        self.embeddings = normalize_embeddings(embeddings, assume_normalized)
+        if quantized is None:
+            quantized, scales = quantize_embeddings(self.embeddings, dtype)
+        if quantized.shape != self.embeddings.shape or (dtype == "int8" and scales is None):
+            raise ValueError("Quantized flashcard matrix does not match the float32 one")
+        self.dtype = dtype
+        self.quantized = quantized
+        self.scales = None if scales is None else np.asarray(scales, dtype=np.float32)
+        self.rerank = rerank
+        self.query_block_size = query_block_size
+        self.scan_block_rows = scan_block_rows
+        self._subset_rows = SubsetRows()
+
+    def __len__(self):
+        return len(self.quantized)
+
+    @property
+    def scan_bytes(self) -> int:
+        return self.quantized.nbytes + (0 if self.scales is None else self.scales.nbytes)
+
+    def _scan(self, queries, quantized) -> np.ndarray:
+        """
+        Quantised scores of a block of queries against the rows of quantized. numpy has no float16 or int8
+        matrix product, so the matrix is widened to float32 a slice of rows at a time.
+        """
+        if self.scales is not None:
+            # Folding the scales into the queries keeps the int8 rows as they are
+            queries = queries * self.scales
+        scores = np.empty((len(queries), len(quantized)), dtype=np.float32)
+        for start in range(0, len(quantized), self.scan_block_rows):
+            rows = quantized[start:start + self.scan_block_rows].astype(np.float32)
+            scores[:, start:start + len(rows)] = queries @ rows.T
+        return scores
+
+    def _shortlist(self, scores, margin: float, top_k: int, threshold: float) -> np.ndarray:
+        """
+        Positions in scores of the flashcards whose float32 score can still reach the threshold and the top_k.
+        """
+        candidate_ids = np.flatnonzero(scores >= threshold - margin)
+        if top_k <= 0:
+            return candidate_ids[:0]
+        if len(candidate_ids) > top_k:
+            candidate_scores = scores[candidate_ids]
+            kth_score = np.partition(candidate_scores, len(candidate_scores) - top_k)[len(candidate_scores) - top_k]
+            # The exact k-th best is at least kth_score - margin; 1e-4 covers ties after rounding to 4 places
+            candidate_ids = candidate_ids[candidate_scores >= kth_score - 2 * margin - 1e-4]
+        return candidate_ids
+
+    def search(self, query_embeddings, top_k: int = 20, threshold: float = 0.65, rerank: bool = None, candidate_ids=None):
+        """
+        Returns one list of (flashcard_index, rounded_score) pairs per query row.
+        With candidate_ids (sorted flashcard indices), only those flashcards are searched.
+        """
+        rerank = self.rerank if rerank is None else rerank
+        queries = normalize_embeddings(query_embeddings)
+        if len(queries) == 0:
+            return []
+        margins = quantization_error_bound(queries, self.dtype, self.scales)
+        if candidate_ids is None:
+            ids, quantized = np.arange(len(self.quantized)), self.quantized
+        else:
+            ids, quantized = candidate_ids, self._subset_rows.rows(self.quantized, candidate_ids)
+        results = []
+        for start in range(0, len(queries), self.query_block_size):
+            block = queries[start:start + self.query_block_size]
+            for query, scores, margin in zip(block, self._scan(block, quantized), margins[start:start + self.query_block_size]):
+                if not rerank:
+                    results.append(select_top_matches(ids, scores, top_k, threshold))
+                    continue
+                shortlist_ids = ids[self._shortlist(scores, margin, top_k, threshold)]
+                shortlist_scores = np.asarray(self.embeddings[shortlist_ids], dtype=np.float32) @ query
+                results.append(select_top_matches(shortlist_ids, shortlist_scores, top_k, threshold))
+        return results
+
+SEARCH_BACKENDS = {
+    "exact": ExactSearchIndex,
+    "ivf": IVFSearchIndex,
+    "float16": functools.partial(QuantizedSearchIndex, dtype="float16"),
+    "int8": functools.partial(QuantizedSearchIndex, dtype="int8"),
+}
+
+def build_search_index(embeddings, backend: str = "exact", **index_options):
+    """
+    Builds a flashcard search index for the named backend ("exact", "ivf", "float16" or "int8").
+    """
+    if backend not in SEARCH_BACKENDS:
+        raise ValueError(f"Unknown search backend '{backend}', expected one of {sorted(SEARCH_BACKENDS)}")
+    return SEARCH_BACKENDS[backend](embeddings, **index_options)
+
+def build_store_search_index(embeddings_data: dict, backend: str = "exact", **index_options):
+    """
+    Builds the search index for loaded flashcard embeddings (see load_flashcard_embeddings).
+    The quantised backends use the store's precomputed float16 / int8 matrix when it has one.
+    """
+    index_options.setdefault("assume_normalized", embeddings_data['header'].get('normalized', False))
+    precomputed = embeddings_data.get('quantized_embeddings', {}).get(backend)
+    if precomputed is not None:
+        index_options.setdefault("quantized", precomputed["embeddings"])
+        index_options.setdefault("scales", precomputed["scales"])
+    return build_search_index(embeddings_data['flashcard_embeddings'], backend=backend, **index_options)
+
+def recall_report(index, reference_index, query_embeddings, top_k: int = 20, threshold: float = 0.65) -> dict:
+    """
+    Compares an index with a reference (normally ExactSearchIndex over the float32 vectors) on the same queries:
+    recall of the reference's matches, the share of queries whose matches are identical, the largest score
+    difference on shared matches, scanned bytes and time per query.
+    """
+    timings = {}
+    results = {}
+    for name, search_index in (("reference", reference_index), ("index", index)):
+        start = time.perf_counter()
+        results[name] = search_index.search(query_embeddings, top_k=top_k, threshold=threshold)
+        timings[name] = (time.perf_counter() - start) * 1000 / max(len(results[name]), 1)
+
+    expected_total = found_total = identical = 0
+    max_score_diff = 0.0
+    for expected, actual in zip(results["reference"], results["index"]):
+        expected_scores = dict(expected)
+        actual_scores = dict(actual)
+        shared = expected_scores.keys() & actual_scores.keys()
+        expected_total += len(expected_scores)
+        found_total += len(shared)
+        identical += expected == actual
+        max_score_diff = max([max_score_diff] + [abs(expected_scores[i] - actual_scores[i]) for i in shared])
+
+    return {
+        "queries": len(results["reference"]),
+        "recall": found_total / expected_total if expected_total else 1.0,
+        "identical_queries": identical / max(len(results["reference"]), 1),
+        "max_score_diff": max_score_diff,
+        "scan_bytes": getattr(index, "scan_bytes", None),
+        "reference_scan_bytes": getattr(reference_index, "scan_bytes", None),
+        "ms_per_query": timings["index"],
+        "reference_ms_per_query": timings["reference"],
+    }
@@ -0,0 +1,282 @@
+import json
+import multiprocessing as mp
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+JOB_STATUSES = ("queued", "running", "succeeded", "failed", "cancelled")
+FINISHED_STATUSES = ("succeeded", "failed", "cancelled")
+
+def new_job_id() -> str:
+    return uuid.uuid4().hex
+
+def is_within(path: str, root: str) -> bool:
+    """
+    Whether path, with symlinks resolved, is root or lies below it.
+    """
+    path, root = os.path.realpath(path), os.path.realpath(root)
+    return os.path.commonpath([path, root]) == root
+
+def job_workspace(workspace_root: str, job_id: str) -> str:
+    """
+    The directory a job writes its outputs to.
+    """
+    return os.path.join(os.path.realpath(workspace_root), "jobs", job_id)
+
+class JobQueue:
+    """
+    Persistent job queue in a SQLite file, shared by the API process and the job processes.
+    Jobs are claimed oldest first; progress, results and cancel requests are stored on the job row,
+    so they survive restarts and can be polled from any process.
+    """
+
+    def __init__(self, db_path: str = "jobs.db"):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=60, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, kind TEXT NOT NULL, params TEXT NOT NULL, status TEXT NOT NULL, "
+            "progress REAL NOT NULL DEFAULT 0, message TEXT, result TEXT, cancel_requested INTEGER NOT NULL DEFAULT 0, "
+            "created_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created_at)")
+
+    def submit(self, kind: str, params: dict = None, job_id: str = None) -> str:
+        job_id = job_id or new_job_id()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, params, status, created_at) VALUES (?, ?, ?, 'queued', ?)",
+                (job_id, kind, json.dumps(params or {}), time.time()),
+            )
+        return job_id
+
+    def claim(self):
+        """
+        Marks the oldest queued job as running and returns it, or None when the queue is empty.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1").fetchone()
+                if row is not None:
+                    self._conn.execute("UPDATE jobs SET status = 'running', started_at = ? WHERE id = ?", (time.time(), row["id"]))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self.get(row["id"]) if row is not None else None
+
+    def set_progress(self, job_id: str, progress: float, message: str = None):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET progress = ?, message = COALESCE(?, message) WHERE id = ? AND status = 'running'",
+                (min(max(progress, 0.0), 1.0), message, job_id),
+            )
+
+    def finish(self, job_id: str, status: str, result: dict = None, message: str = None):
+        if status not in FINISHED_STATUSES:
+            raise ValueError(f"Not a final job status: {status}")
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, message = COALESCE(?, message), finished_at = ?, "
+                "progress = CASE WHEN ? = 'succeeded' THEN 1.0 ELSE progress END WHERE id = ? AND status IN ('queued', 'running')",
+                (status, json.dumps(result, default=str) if result is not None else None, message, time.time(), status, job_id),
+            )
+
+    def request_cancel(self, job_id: str) -> bool:
+        """
+        Cancels a queued job at once and flags a running one for its worker to stop.
+        Returns False when the job does not exist or has already finished.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                if row is not None and row["status"] == "queued":
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'cancelled', cancel_requested = 1, finished_at = ?, message = 'Cancelled before start' WHERE id = ?",
+                        (time.time(), job_id),
+                    )
+                elif row is not None and row["status"] == "running":
+                    self._conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return row is not None and row["status"] in ("queued", "running")
+
+    def cancel_requested(self, job_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row["cancel_requested"])
+
+    def requeue_interrupted(self) -> int:
+        """
+        Puts jobs left running by a process that died back on the queue. Call once at startup.
+        """
+        with self._lock:
+            cursor = self._conn.execute("UPDATE jobs SET status = 'queued', started_at = NULL, progress = 0 WHERE status = 'running'")
+        return cursor.rowcount
+
+    def get(self, job_id: str):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _job_dict(row) if row is not None else None
+
+    def list(self, status: str = None, limit: int = 100) -> list:
+        with self._lock:
+            if status:
+                rows = self._conn.execute("SELECT * FROM jobs WHERE status = ? ORDER BY created_at DESC LIMIT ?", (status, limit)).fetchall()
+            else:
+                rows = self._conn.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        return [_job_dict(row) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def _job_dict(row) -> dict:
+    job = dict(row)
+    job["params"] = json.loads(job["params"])
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    job["cancel_requested"] = bool(job["cancel_requested"])
+    return job
+
+class JobContext:
+    """
+    Handed to a job function: reports progress and tells whether the job was cancelled.
+    """
+
+    def __init__(self, queue: JobQueue, job_id: str, min_interval: float = 1.0):
+        self.queue = queue
+        self.job_id = job_id
+        self.min_interval = min_interval
+        self._last_update = 0.0
+
+    def progress(self, fraction: float, message: str = None):
+        # Progress writes are throttled; the final 100% is always recorded
+        now = time.monotonic()
+        if fraction >= 1.0 or now - self._last_update >= self.min_interval:
+            self.queue.set_progress(self.job_id, fraction, message)
+            self._last_update = now
+
+    def cancelled(self) -> bool:
+        return self.queue.cancel_requested(self.job_id)
+
+def _run_job_process(db_path: str, job_id: str, kind: str, params: dict):
+    """
+    Entry point of the child process running one job.
+    """
+    from pipeline_jobs import JOB_KINDS
+
+    queue = JobQueue(db_path)
+    try:
+        result = JOB_KINDS[kind](JobContext(queue, job_id), **params)
+        if isinstance(result, dict):
+            # Job processes are not scraped by /metrics; their metrics travel with the result
+            from metrics import REGISTRY
+
+            result = dict(result, metrics=REGISTRY.summary())
+        if isinstance(result, dict) and result.get("status") == "error":
+            queue.finish(job_id, "failed", result, result.get("message"))
+        else:
+            queue.finish(job_id, "succeeded", result)
+    except Exception as e:
+        queue.finish(job_id, "failed", message=f"{type(e).__name__}: {e}")
+    finally:
+        queue.close()
+
+class JobWorkerPool:
+    """
+    num_workers background threads, each claiming jobs from the queue and running them one at a time
+    in a separate process, so long CPU-bound jobs never block the API process.
+    A cancelled running job has its process terminated.
+    """
+
+    def __init__(self, queue: JobQueue, num_workers: int = 2, poll_interval: float = 1.0):
+        self.queue = queue
+        self.num_workers = num_workers
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._threads = []
+        self._processes = {}
+        self._context = mp.get_context("spawn")
+
+    def start(self):
+        requeued = self.queue.requeue_interrupted()
+        if requeued:
+            print(f"Requeued {requeued} interrupted jobs")
+        for i in range(self.num_workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 10.0):
+        """
+        Stops claiming jobs and terminates running job processes; their jobs are requeued at the next start.
+        """
+        self._stop.set()
+        for process in list(self._processes.values()):
+            process.terminate()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _work(self):
+        while not self._stop.is_set():
+            job = self.queue.claim()
+            if job is None:
+                self._stop.wait(self.poll_interval)
+                continue
+            self._run(job)
+
+    def _run(self, job: dict):
+        job_id = job["id"]
+        process = self._context.Process(target=_run_job_process, args=(self.queue.db_path, job_id, job["kind"], job["params"]), daemon=True)
+        process.start()
+        self._processes[job_id] = process
+        try:
+            while process.is_alive():
+                process.join(self.poll_interval)
+                if self._stop.is_set():
+                    return
+                if process.is_alive() and self.queue.cancel_requested(job_id):
+                    process.terminate()
+                    process.join()
+                    self.queue.finish(job_id, "cancelled", message="Cancelled while running")
+                    return
+            # A job process that died without recording an outcome (e.g. killed for memory) is a failure
+            self.queue.finish(job_id, "failed", message=f"Job process exited with code {process.exitcode}")
+        finally:
+            self._processes.pop(job_id, None)
+
+def job_artifacts(job: dict, workspace_root: str) -> list:
+    """
+    The files produced by a finished job: every existing path under output_file / output_files / output_directory
+    of its result, with directories expanded to the files they contain.
+    Only files inside the job's workspace directory are listed, whatever its result names.
+    """
+    job_dir = job_workspace(workspace_root, job["id"])
+    result = job.get("result") or {}
+    paths = []
+    for key in ("output_file", "output_directory"):
+        if isinstance(result.get(key), str):
+            paths.append(result[key])
+    for key in ("output_files", "artifacts"):
+        if isinstance(result.get(key), list):
+            paths.extend(path for path in result[key] if isinstance(path, str))
+
+    artifacts = []
+    for path in dict.fromkeys(paths):
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                artifacts.extend(os.path.join(root, name) for name in sorted(files) if not name.startswith("."))
+        elif os.path.isfile(path):
+            artifacts.append(path)
+    artifacts = [path for path in dict.fromkeys(artifacts) if is_within(path, job_dir)]
+    return [{"index": i, "path": path, "bytes": os.path.getsize(path)} for i, path in enumerate(artifacts)]
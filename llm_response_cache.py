@@ -0,0 +1,66 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+class LLMResponseCache:
+    """
+    Persistent SQLite cache of LLM responses keyed by a hash of (modelId, system prompt, user prompt, inferenceConfig).
+    Entries older than ttl_seconds are ignored; with bypass the cache is neither read nor written.
+    """
+
+    def __init__(self, db_path: str, ttl_seconds: float = None, bypass: bool = False):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=60)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_responses ("
+            "key TEXT PRIMARY KEY, model_id TEXT NOT NULL, response TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model_id: str, system_prompt: str, user_prompt: str, inference_config: dict) -> str:
+        payload = json.dumps(
+            {"modelId": model_id, "system": system_prompt, "user": user_prompt, "inferenceConfig": inference_config},
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        """
+        Returns the cached response text, or None on a miss.
+        """
+        if self.bypass:
+            return None
+        with self._lock:
+            row = self._conn.execute("SELECT response, created_at FROM llm_responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and (self.ttl_seconds is None or time.time() - row[1] <= self.ttl_seconds):
+                self.hits += 1
+                return row[0]
+            self.misses += 1
+            return None
+
+    def put(self, key: str, model_id: str, response: str):
+        if self.bypass:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_responses (key, model_id, response, created_at) VALUES (?, ?, ?, ?)",
+                (key, model_id, response, time.time()),
+            )
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,6 +1,56 @@
-from fastapi import FastAPI
+import os
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import FileResponse, PlainTextResponse
+from pydantic import BaseModel, Field
+from job_queue import JOB_STATUSES, JobQueue, JobWorkerPool, job_artifacts, new_job_id
+from pipeline_jobs import JOB_KINDS, prepare_job_params
+from metrics import REGISTRY
 
-app = FastAPI()
+# Flashcard matching settings, read from the pod environment
+MATCH_EMBEDDINGS_STORE = os.environ.get("MATCH_EMBEDDINGS_STORE", "flashcard_embeddings_store")
+MATCH_MODEL_NAME = os.environ.get("MATCH_MODEL_NAME", "abhinand/MedEmbed-large-v0.1")
+MATCH_SEARCH_BACKEND = os.environ.get("MATCH_SEARCH_BACKEND", "exact")
+MATCH_MAX_BATCH_SIZE = int(os.environ.get("MATCH_MAX_BATCH_SIZE", "64"))
+MATCH_MAX_WAIT_MS = float(os.environ.get("MATCH_MAX_WAIT_MS", "5"))
+# Largest top_k a /match request may ask for
+MATCH_MAX_TOP_K = int(os.environ.get("MATCH_MAX_TOP_K", "200"))
+
+# Background job settings; JOB_WORKERS=0 accepts jobs without running them in this process
+JOB_DB_PATH = os.environ.get("JOB_DB_PATH", "jobs.db")
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+# Jobs read files under this directory and write to their own jobs/<job_id> directory in it
+JOB_WORKSPACE_ROOT = os.environ.get("JOB_WORKSPACE_ROOT", "job_workspace")
+
+services = {}
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    services["jobs"] = JobQueue(JOB_DB_PATH)
+    worker_pool = JobWorkerPool(services["jobs"], num_workers=JOB_WORKERS)
+    if JOB_WORKERS > 0:
+        worker_pool.start()
+
+    # The matcher is optional: without an embedding store the service still serves the other routes
+    if os.path.isdir(MATCH_EMBEDDINGS_STORE):
+        from match_service import MatchService
+
+        service = MatchService(
+            MATCH_EMBEDDINGS_STORE,
+            model_name=MATCH_MODEL_NAME,
+            search_backend=MATCH_SEARCH_BACKEND,
+            max_batch_size=MATCH_MAX_BATCH_SIZE,
+            max_wait_ms=MATCH_MAX_WAIT_MS,
+        )
+        service.start()
+        services["match"] = service
+    yield
+    if "match" in services:
+        await services.pop("match").stop()
+    worker_pool.stop()
+    services.pop("jobs").close()
+
+app = FastAPI(lifespan=lifespan)
 
 @app.get("/")
 def read_root():
@@ -8,3 +58,92 @@ def read_root():
 @app.get("/")
 def read_root():
     return {"message": "Hello from GitHub Actions!"}
+
+class MatchRequest(BaseModel):
+    transcript: str
+    top_k: int = Field(20, ge=1, le=MATCH_MAX_TOP_K)
+    threshold: float = Field(0.65, ge=0, le=1)
+
+def get_match_service():
+    if "match" not in services:
+        raise HTTPException(status_code=503, detail=f"Flashcard matching is not available: no embedding store at {MATCH_EMBEDDINGS_STORE}")
+    return services["match"]
+
+@app.post("/match")
+async def match(request: MatchRequest):
+    """
+    Matches a transcript to flashcards with the same chunking, top_k and threshold rules as step 2.
+    """
+    chunks = await get_match_service().match(request.transcript, top_k=request.top_k, threshold=request.threshold)
+    return {"chunks": chunks}
+
+@app.get("/match/stats")
+def match_stats():
+    """
+    Request count, throughput, mean encoder batch size and p50/p95/p99 latency of /match.
+    """
+    return get_match_service().stats.summary()
+
+class JobRequest(BaseModel):
+    kind: str
+    params: dict = {}
+
+def get_job(job_id: str) -> dict:
+    job = services["jobs"].get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return job
+
+@app.post("/jobs", status_code=202)
+def submit_job(request: JobRequest):
+    """
+    Queues a step2, classification or pipeline job (see pipeline_jobs.JOB_KINDS) and returns its ID.
+    Paths in params are relative to the job workspace (see pipeline_jobs.prepare_job_params).
+    """
+    if request.kind not in JOB_KINDS:
+        raise HTTPException(status_code=400, detail=f"Unknown job kind '{request.kind}', expected one of {sorted(JOB_KINDS)}")
+    job_id = new_job_id()
+    try:
+        params = prepare_job_params(request.kind, request.params, JOB_WORKSPACE_ROOT, job_id)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return {"job_id": services["jobs"].submit(request.kind, params, job_id)}
+
+@app.get("/jobs")
+def list_jobs(status: str = None, limit: int = 100):
+    if status is not None and status not in JOB_STATUSES:
+        raise HTTPException(status_code=400, detail=f"Unknown status '{status}'")
+    return {"jobs": services["jobs"].list(status, limit)}
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    """
+    Status, progress (0-1), last message and result of a job.
+    """
+    return get_job(job_id)
+
+@app.post("/jobs/{job_id}/cancel")
+def cancel_job(job_id: str):
+    get_job(job_id)
+    if not services["jobs"].request_cancel(job_id):
+        raise HTTPException(status_code=409, detail=f"Job {job_id} has already finished")
+    return get_job(job_id)
+
+@app.get("/jobs/{job_id}/artifacts")
+def list_job_artifacts(job_id: str):
+    return {"artifacts": job_artifacts(get_job(job_id), JOB_WORKSPACE_ROOT)}
+
+@app.get("/jobs/{job_id}/artifacts/{index}")
+def fetch_job_artifact(job_id: str, index: int):
+    artifacts = job_artifacts(get_job(job_id), JOB_WORKSPACE_ROOT)
+    if not 0 <= index < len(artifacts):
+        raise HTTPException(status_code=404, detail=f"Job {job_id} has no artifact {index}")
+    path = artifacts[index]["path"]
+    return FileResponse(path, filename=os.path.basename(path))
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """
+    Counters and histograms of this process in the Prometheus text format.
+    """
+    return PlainTextResponse(REGISTRY.render_prometheus(), media_type="text/plain; version=0.0.4")
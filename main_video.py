@@ -4,71 +4,204 @@ import pandas as pd
 import json
 import tqdm
 import boto3
+from MHE_Dtacreation_video_step1 import process_data
+from transcript_flashcardmapping_step2 import process_step2
+from flashcard_embedding_creation import create_flashcard_embeddings
+from bedrock_llm_run1_step4 import setup_output_directory, initialize_bedrock, load_data, load_transcripts, process_bb_video_titles
+from llm_response_cache import LLMResponseCache
+from cleaning_step5_merge import clean_and_merge_files
+from table_io import export_excel
+from pipeline_runner import PipelineRunner, Stage
+from metrics import dump_summary
+from video_delta import carry_forward_results, commit_video_manifest, detect_video_changes
+
+def run_classification(step2_output_path, bb_transcripts_file, classified_output_dir, classified_output_file, progress_callback=None, max_in_flight=8, requests_per_minute=250, tokens_per_minute=2_000_000, response_cache_path=None, journal_path=None):
+    """
+    Step 4: LLM-based flashcard classification of the step 2 matches.
+    Up to max_in_flight requests run concurrently within requests_per_minute / tokens_per_minute.
+    Answers are cached in response_cache_path and finished batches journaled to journal_path, so a re-run
+    skips prompts already answered and an interrupted run resumes; both default to files in classified_output_dir.
+    The journal is removed once the step has finished.
+    progress_callback(done, total) is called as request batches finish.
+    """
+    setup_output_directory(classified_output_dir)
+    data = load_data(step2_output_path)
 
-def main():
-    # Step 1: Process JSON & Excel data (Extract & Structure)
-    bb_transcripts_file = "/path/to/bb_transcripts.json"
-    bb_hierarchical_file = "/path/to/bb_hierarchical.json"
-    anki_excel_file = "/path/to/anki_data.xlsx"
-    output_dir = "product_files2"
-
-    process_result = process_data(bb_transcripts_file, bb_hierarchical_file, anki_excel_file, output_dir)
-    print(process_result)
-
-    if process_result["status"] != "success":
-        print("Error in Step 1: Exiting pipeline.")
-        return  
-
-    # Step 2: Flashcard Matching using Sentence Embeddings
-    json_file_path = os.path.join(output_dir, "some_output.json")  # Replace with actual filename
-    embeddings_pkl_path = "/path/to/flashcard_embeddings.pkl"
-    output_excel_path = "flashcards_mapped.xlsx"
-
-    step2_result = process_step2(json_file_path, embeddings_pkl_path, output_excel_path)
-    print(step2_result)
-
-    if step2_result["status"] != "success":
-        print("Error in Step 2: Exiting pipeline.")
-        return  
-
-    # Step 3: Generate Flashcard Embeddings (For Step 2)
-    flashcard_excel = "/path/to/anki_data.xlsx"
-    flashcard_embeddings_output = "flashcard_embeddings.pkl"
-
-    step3_result = create_flashcard_embeddings(flashcard_excel, flashcard_embeddings_output)
-    print(step3_result)
-
-    if step3_result["status"] != "success":
-        print("Error in Step 3: Exiting pipeline.")
-        return  
-
-    # Step 4: LLM-Based Flashcard Classification
-    classified_output_dir = "classified_flashcards_output"
-    classified_output_file = os.path.join(classified_output_dir, "classified_flashcards.csv")
+    # Nothing to classify, e.g. an incremental run in which no video changed
+    if data.empty:
+        data.to_csv(classified_output_file, index=False)
+        return {"status": "success", "output_file": classified_output_file}
 
-    setup_output_directory(classified_output_dir)
     bedrock_runtime = initialize_bedrock()
-    data = load_data(output_excel_path)
     transcript_mapping = load_transcripts(bb_transcripts_file)
-
-    step4_result = process_bb_video_titles(data, transcript_mapping)
+    journal_path = journal_path or os.path.join(classified_output_dir, "classification_journal.jsonl")
+    response_cache = LLMResponseCache(response_cache_path or os.path.join(classified_output_dir, "llm_response_cache.sqlite"))
+    try:
+        step4_result = process_bb_video_titles(
+            data,
+            transcript_mapping,
+            output_dir=classified_output_dir,
+            bedrock_client=bedrock_runtime,
+            max_in_flight=max_in_flight,
+            requests_per_minute=requests_per_minute,
+            tokens_per_minute=tokens_per_minute,
+            response_cache=response_cache,
+            journal_path=journal_path,
+            progress_callback=progress_callback,
+        )
+    finally:
+        response_cache.close()
 
     if step4_result == 0:
-        print("No flashcards classified. Exiting pipeline.")
-        return  
+        return {"status": "error", "message": "No flashcards classified"}
 
     data.to_csv(classified_output_file, index=False)
+    # Only needed to resume an interrupted run; a later run with new step 2 output must not replay it
+    if os.path.exists(journal_path):
+        os.remove(journal_path)
     print(f"Step 4 completed. Classified flashcards saved to {classified_output_file}")
+    return {"status": "success", "output_file": classified_output_file}
+
+def build_stages(bb_transcripts_file="/path/to/bb_transcripts.json", bb_hierarchical_file="/path/to/bb_hierarchical.json", anki_excel_file="/path/to/anki_data.xlsx", output_dir="product_files2", json_file_path=None, flashcard_embeddings_store="flashcard_embeddings_store", step2_output_path="flashcards_mapped.parquet", classified_output_dir="classified_flashcards_output", final_output="final_merged_output.xlsx", no_class_output="no_class.xlsx", with_class_output="with_class.xlsx", video_manifest_path=None, max_in_flight=8, requests_per_minute=250, tokens_per_minute=2_000_000, response_cache_path="llm_response_cache.sqlite"):
+    """
+    Declares the pipeline stages with their inputs, outputs and parameters.
+    Dependencies follow from the paths: a stage waits for the stages producing its inputs.
+    With video_manifest_path, steps 2 and 4 only process the videos added or changed since the last completed run;
+    the results of unchanged videos are carried forward from the previous step2_output_path / classified output.
+    max_in_flight, requests_per_minute, tokens_per_minute and response_cache_path configure step 4 (see run_classification).
+    """
+    if json_file_path is None:
+        json_file_path = os.path.join(output_dir, "some_output.json")  # Replace with actual filename
+    classified_output_file = os.path.join(classified_output_dir, "classified_flashcards.csv")
+    classification_options = {"max_in_flight": max_in_flight, "requests_per_minute": requests_per_minute, "tokens_per_minute": tokens_per_minute, "response_cache_path": response_cache_path}
+    if video_manifest_path:
+        return build_delta_stages(bb_transcripts_file, bb_hierarchical_file, anki_excel_file, output_dir, json_file_path, flashcard_embeddings_store, step2_output_path, classified_output_dir, classified_output_file, final_output, no_class_output, with_class_output, video_manifest_path, classification_options)
+
+    return [
+        # Step 1: Process JSON & Excel data (Extract & Structure)
+        Stage(
+            "step1_process_data",
+            process_data,
+            inputs=[bb_transcripts_file, bb_hierarchical_file, anki_excel_file],
+            outputs=[output_dir],
+            params={"bb_transcripts_file": bb_transcripts_file, "bb_hierarchical_file": bb_hierarchical_file, "anki_excel_file": anki_excel_file, "output_dir": output_dir},
+        ),
+        # Step 3: Generate Flashcard Embeddings (needed by step 2, independent of step 1)
+        Stage(
+            "step3_flashcard_embeddings",
+            create_flashcard_embeddings,
+            inputs=[anki_excel_file],
+            outputs=[flashcard_embeddings_store],
+            params={"excel_file_path": anki_excel_file, "output_store_path": flashcard_embeddings_store, "incremental": True},
+        ),
+        # Step 2: Flashcard Matching using Sentence Embeddings
+        Stage(
+            "step2_flashcard_matching",
+            process_step2,
+            inputs=[json_file_path, flashcard_embeddings_store],
+            outputs=[step2_output_path],
+            params={"json_file_path": json_file_path, "embeddings_pkl_path": flashcard_embeddings_store, "output_excel_path": step2_output_path, "threshold": 0.65},
+        ),
+        # Step 4: LLM-Based Flashcard Classification
+        Stage(
+            "step4_classification",
+            run_classification,
+            inputs=[step2_output_path, bb_transcripts_file],
+            outputs=[classified_output_file],
+            params={"step2_output_path": step2_output_path, "bb_transcripts_file": bb_transcripts_file, "classified_output_dir": classified_output_dir, "classified_output_file": classified_output_file, **classification_options},
+        ),
+        # Step 5: Clean and Merge Output
+        Stage(
+            "step5_clean_merge",
+            clean_and_merge_files,
+            inputs=[classified_output_file],
+            outputs=[final_output, no_class_output, with_class_output],
+            params={"input_files": [classified_output_file], "merged_output": final_output, "no_class_output": no_class_output, "with_class_output": with_class_output},
+        ),
+    ]
+
+def build_delta_stages(bb_transcripts_file, bb_hierarchical_file, anki_excel_file, output_dir, json_file_path, flashcard_embeddings_store, step2_output_path, classified_output_dir, classified_output_file, final_output, no_class_output, with_class_output, video_manifest_path, classification_options=None):
+    """
+    The stages of an incremental run (see build_stages): change detection, steps 2 and 4 on the delta,
+    carry-forward of unchanged results, step 5, and finally the manifest update.
+    """
+    stem = os.path.splitext(json_file_path)[0]
+    delta_json_path = f"{stem}_delta.json"
+    changes_path = f"{stem}_changes.json"
+    step2_base, step2_extension = os.path.splitext(step2_output_path)
+    step2_delta_path = f"{step2_base}_delta{step2_extension}"
+    classified_delta_dir = os.path.join(classified_output_dir, "delta")
+    classified_delta_file = os.path.join(classified_delta_dir, "classified_flashcards.csv")
+
+    stages = build_stages(bb_transcripts_file, bb_hierarchical_file, anki_excel_file, output_dir, json_file_path, flashcard_embeddings_store, step2_output_path, classified_output_dir, final_output, no_class_output, with_class_output, **(classification_options or {}))
+    step1, step3, step5 = stages[0], stages[1], stages[4]
+    return [
+        step1,
+        step3,
+        # Only the added and changed videos go on to steps 2 and 4
+        Stage(
+            "step1_detect_changes",
+            detect_video_changes,
+            inputs=[json_file_path],
+            outputs=[delta_json_path, changes_path],
+            params={"json_file_paths": json_file_path, "manifest_path": video_manifest_path, "delta_json_path": delta_json_path, "changes_path": changes_path, "stale_output_dirs": [classified_delta_dir]},
+        ),
+        Stage(
+            "step2_flashcard_matching",
+            process_step2,
+            inputs=[delta_json_path, flashcard_embeddings_store],
+            outputs=[step2_delta_path],
+            params={"json_file_path": delta_json_path, "embeddings_pkl_path": flashcard_embeddings_store, "output_excel_path": step2_delta_path, "threshold": 0.65},
+        ),
+        Stage(
+            "step2_carry_forward",
+            carry_forward_results,
+            inputs=[step2_delta_path, changes_path],
+            outputs=[step2_output_path],
+            params={"previous_results_path": step2_output_path, "delta_results_path": step2_delta_path, "output_path": step2_output_path, "changes_path": changes_path},
+        ),
+        Stage(
+            "step4_classification",
+            run_classification,
+            inputs=[step2_delta_path, bb_transcripts_file],
+            outputs=[classified_delta_file],
+            params={"step2_output_path": step2_delta_path, "bb_transcripts_file": bb_transcripts_file, "classified_output_dir": classified_delta_dir, "classified_output_file": classified_delta_file, **(classification_options or {})},
+        ),
+        Stage(
+            "step4_carry_forward",
+            carry_forward_results,
+            inputs=[classified_delta_file, changes_path],
+            outputs=[classified_output_file],
+            params={"previous_results_path": classified_output_file, "delta_results_path": classified_delta_file, "output_path": classified_output_file, "changes_path": changes_path},
+        ),
+        step5,
+        # Recorded last, so an interrupted run is picked up as a delta again
+        Stage(
+            "commit_video_manifest",
+            commit_video_manifest,
+            inputs=[json_file_path],
+            outputs=[video_manifest_path],
+            params={"json_file_paths": json_file_path, "manifest_path": video_manifest_path},
+            after=[step5.name, "step2_carry_forward"],
+        ),
+    ]
 
-    # Step 5: Clean and Merge Output
-    input_files = [classified_output_file]
-    final_output = "final_merged_output.xlsx"
-    no_class_output = "no_class.xlsx"
-    with_class_output = "with_class.xlsx"
-    clean_and_merge_files(input_files, final_output, no_class_output, with_class_output)
+def main():
+    # Incremental: only videos added or changed since the last completed run go through steps 2 and 4
+    runner = PipelineRunner(build_stages(video_manifest_path=".video_manifest.json"), manifest_path=".pipeline_manifest.json", max_workers=2)
+    report = runner.run()
+    dump_summary("pipeline_metrics.json")
+
+    if any(outcome["status"] in ("failed", "blocked") for outcome in report.values()):
+        print("Pipeline stopped: see the failed stages above.")
+        return
+
+    # Optional: Excel copy of the step 2 matches for review
+    export_step2_excel = False
+    if export_step2_excel:
+        export_excel("flashcards_mapped.parquet", "flashcards_mapped.xlsx")
 
     print("Pipeline execution completed successfully!")
 
 if __name__ == "__main__":
     main()
-
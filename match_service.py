@@ -0,0 +1,174 @@
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from flashcard_embedding_store import load_flashcard_embeddings
+from flashcard_search import build_store_search_index
+from model_registry import warm_up
+from product_files import transcript_hash
+from text_chunker import chunk_text_with_ids
+from metrics import REGISTRY, record_encoder_batch
+
+class LatencyStats:
+    """
+    Rolling window of request latencies and encoder batch sizes, reported as percentiles.
+    """
+
+    def __init__(self, window: int = 10_000):
+        self.latencies_ms = deque(maxlen=window)
+        self.batch_sizes = deque(maxlen=window)
+        self.requests = 0
+        self.started_at = time.time()
+
+    def record_request(self, latency_ms: float):
+        self.latencies_ms.append(latency_ms)
+        self.requests += 1
+
+    def record_batch(self, size: int):
+        self.batch_sizes.append(size)
+
+    def summary(self) -> dict:
+        latencies = np.asarray(self.latencies_ms, dtype=np.float64)
+        summary = {
+            "requests": self.requests,
+            "requests_per_second": self.requests / max(time.time() - self.started_at, 1e-9),
+            "window": len(latencies),
+            "mean_batch_size": float(np.mean(self.batch_sizes)) if self.batch_sizes else 0.0,
+        }
+        for name, q in (("p50_ms", 50), ("p95_ms", 95), ("p99_ms", 99)):
+            summary[name] = float(np.percentile(latencies, q)) if len(latencies) else None
+        return summary
+
+class MicroBatcher:
+    """
+    Coalesces concurrent encode requests into one encoder call.
+    A batch is sent when it holds max_batch_size texts or max_wait_ms after its first request arrived;
+    encoding runs on a single background thread so the event loop keeps accepting requests meanwhile.
+    """
+
+    def __init__(self, encode_fn, max_batch_size: int = 64, max_wait_ms: float = 5.0, stats: LatencyStats = None):
+        self.encode_fn = encode_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.stats = stats
+        self._queue = None
+        self._task = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="encoder")
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._executor.shutdown(wait=False)
+
+    async def encode(self, texts) -> np.ndarray:
+        """
+        Returns the embeddings of texts, encoded together with whatever other requests arrive meanwhile.
+        """
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((list(texts), future))
+        return await future
+
+    async def _next_batch(self) -> list:
+        batch = [await self._queue.get()]
+        size = len(batch[0][0])
+        deadline = time.perf_counter() + self.max_wait_ms / 1000
+        while size < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            texts = [text for item_texts, _ in batch for text in item_texts]
+            try:
+                embeddings = await loop.run_in_executor(self._executor, self.encode_fn, texts)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            if self.stats is not None:
+                self.stats.record_batch(len(texts))
+            start = 0
+            for item_texts, future in batch:
+                if not future.done():
+                    future.set_result(embeddings[start:start + len(item_texts)])
+                start += len(item_texts)
+
+class MatchService:
+    """
+    Online transcript -> flashcard matching with the flashcard matrix, search index and encoder kept resident.
+    Transcripts are chunked, encoded and searched exactly as in process_step2, so a transcript gets the
+    same top_k / threshold matches here as in the batch output.
+    """
+
+    def __init__(self, embeddings_store_path: str, model_name: str = 'abhinand/MedEmbed-large-v0.1', search_backend: str = "exact", search_options: dict = None, max_batch_size: int = 64, max_wait_ms: float = 5.0, max_paragraph_length: int = 150, encode_batch_size: int = 64):
+        self.model_name = model_name
+        self.max_paragraph_length = max_paragraph_length
+        self.embeddings_data = load_flashcard_embeddings(embeddings_store_path, expected_model_name=model_name, mmap=True)
+        self.search_index = build_store_search_index(self.embeddings_data, backend=search_backend, **(search_options or {}))
+        self.embedding_model = warm_up(model_name)
+        self.stats = LatencyStats()
+        def encode(texts):
+            encode_start = time.perf_counter()
+            embeddings = self.embedding_model.encode(texts, batch_size=encode_batch_size)
+            record_encoder_batch(len(texts), time.perf_counter() - encode_start, model_name)
+            return embeddings
+
+        self.batcher = MicroBatcher(
+            encode,
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_wait_ms,
+            stats=self.stats,
+        )
+
+    def start(self):
+        self.batcher.start()
+
+    async def stop(self):
+        await self.batcher.stop()
+
+    async def match(self, transcript: str, top_k: int = 20, threshold: float = 0.65) -> list:
+        """
+        Returns one {"chunk_id", "chunk", "matches"} dict per transcript chunk (IDs as in the step 2 output), each match being
+        {"flashcard_id", "flashcard", "score"} in the order process_step2 writes them.
+        """
+        start = time.perf_counter()
+        id_chunks = chunk_text_with_ids(transcript, max_tokens=self.max_paragraph_length, transcript_key=transcript_hash(transcript) if isinstance(transcript, str) else None)
+        chunks = [chunk for _, chunk in id_chunks]
+        results = []
+        if chunks:
+            embeddings = await self.batcher.encode(chunks)
+            # The search runs off the event loop, next to the encoder thread
+            chunk_matches = await asyncio.get_running_loop().run_in_executor(None, lambda: self.search_index.search(embeddings, top_k=top_k, threshold=threshold))
+            flashcard_ids = self.embeddings_data['flashcard_ids']
+            flashcards = self.embeddings_data['flashcards']
+            for (chunk_id, chunk), matches in zip(id_chunks, chunk_matches):
+                results.append({
+                    "chunk_id": chunk_id,
+                    "chunk": chunk,
+                    "matches": [{"flashcard_id": flashcard_ids[i], "flashcard": flashcards[i], "score": score} for i, score in matches],
+                })
+        self.stats.record_request((time.perf_counter() - start) * 1000)
+        REGISTRY.histogram("match_request_seconds", "/match request latency").observe(time.perf_counter() - start)
+        return results
@@ -0,0 +1,194 @@
+import functools
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+import numpy as np
+
+# Histogram bucket upper bounds
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+TOKEN_BUCKETS = (50, 100, 250, 500, 1_000, 2_500, 5_000, 10_000, 25_000, 50_000, 100_000)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8)
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+def _format_labels(key: tuple, extra: tuple = ()) -> str:
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+class Counter:
+    def __init__(self, name: str, help_text: str, lock: threading.Lock):
+        self.name = name
+        self.help_text = help_text
+        self._lock = lock
+        self._values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_format_labels(key)} {value}" for key, value in sorted(self._values.items())]
+        return lines
+
+    def summary(self) -> dict:
+        return {_format_labels(key) or "total": value for key, value in sorted(self._values.items())}
+
+class Histogram:
+    """
+    Prometheus-style cumulative buckets plus a bounded window of recent samples for percentiles.
+    """
+
+    def __init__(self, name: str, help_text: str, buckets, lock: threading.Lock, window: int = 10_000):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.window = window
+        self._lock = lock
+        self._series = {}
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * len(self.buckets), "count": 0, "sum": 0.0, "samples": deque(maxlen=self.window)}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+            series["count"] += 1
+            series["sum"] += value
+            series["samples"].append(value)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(self._series.items()):
+            for bound, count in zip(self.buckets, series["counts"]):
+                lines.append(f"{self.name}_bucket{_format_labels(key, (('le', str(bound)),))} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(key, (('le', '+Inf'),))} {series['count']}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {series['sum']}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {series['count']}")
+        return lines
+
+    def summary(self) -> dict:
+        summary = {}
+        for key, series in sorted(self._series.items()):
+            samples = np.asarray(series["samples"], dtype=np.float64)
+            summary[_format_labels(key) or "total"] = {
+                "count": series["count"],
+                "sum": series["sum"],
+                "mean": series["sum"] / series["count"],
+                "p50": float(np.percentile(samples, 50)),
+                "p95": float(np.percentile(samples, 95)),
+                "p99": float(np.percentile(samples, 99)),
+                "max": float(samples.max()),
+            }
+        return summary
+
+class MetricsRegistry:
+    """
+    Process-wide counters and histograms, rendered in the Prometheus text format or as a JSON summary.
+    Asking twice for the same name returns the same metric.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def counter(self, name: str, help_text: str = "") -> Counter:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Counter(name, help_text, threading.Lock())
+            return self._metrics[name]
+
+    def histogram(self, name: str, help_text: str = "", buckets=SECONDS_BUCKETS) -> Histogram:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Histogram(name, help_text, buckets, threading.Lock())
+            return self._metrics[name]
+
+    def render_prometheus(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> dict:
+        with self._lock:
+            metrics = dict(self._metrics)
+        summary = {name: metric.summary() for name, metric in sorted(metrics.items())}
+        summary["derived"] = derived_rates(summary)
+        return summary
+
+    def reset(self):
+        with self._lock:
+            self._metrics.clear()
+
+REGISTRY = MetricsRegistry()
+
+def derived_rates(summary: dict) -> dict:
+    """
+    Rates computed from the raw metrics, e.g. encoder chunks per second of encoding time.
+    """
+    derived = {}
+    encode_seconds = summary.get("encoder_batch_seconds", {})
+    encoded_chunks = summary.get("encoder_chunks_total", {})
+    for labels, stats in encode_seconds.items():
+        if stats["sum"] > 0 and labels in encoded_chunks:
+            derived[f"encoder_chunks_per_second{'' if labels == 'total' else labels}"] = encoded_chunks[labels] / stats["sum"]
+    return derived
+
+def span_histogram() -> Histogram:
+    return REGISTRY.histogram("pipeline_span_seconds", "Wall time of instrumented pipeline steps and inner calls", SECONDS_BUCKETS)
+
+@contextmanager
+def span(name: str):
+    """
+    Times the enclosed block into pipeline_span_seconds{span=name}; failures are counted in pipeline_span_errors_total.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        REGISTRY.counter("pipeline_span_errors_total", "Instrumented blocks that raised").inc(span=name)
+        raise
+    finally:
+        span_histogram().observe(time.perf_counter() - start, span=name)
+
+def timed(name: str):
+    """
+    Decorator form of span for step functions.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def record_encoder_batch(n_chunks: int, seconds: float, model_name: str = ""):
+    REGISTRY.histogram("encoder_batch_seconds", "Encoder call wall time", SECONDS_BUCKETS).observe(seconds, model=model_name)
+    REGISTRY.counter("encoder_chunks_total", "Texts encoded").inc(n_chunks, model=model_name)
+
+def dump_summary(path: str = "pipeline_metrics.json", registry: MetricsRegistry = None) -> dict:
+    """
+    Writes the JSON summary of all metrics (counts, sums, p50/p95/p99, derived rates) at the end of a batch run.
+    """
+    summary = (registry or REGISTRY).summary()
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=4)
+    print(f"Metrics summary written to {path}")
+    return summary
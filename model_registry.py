@@ -0,0 +1,58 @@
+import threading
+
+DEFAULT_MODEL_NAME = 'abhinand/MedEmbed-large-v0.1'
+
+# Process-wide SentenceTransformer instances keyed by (model name, device)
+_models = {}
+_key_locks = {}
+_registry_lock = threading.Lock()
+
+def default_device() -> str:
+    """
+    Automatically use GPU if available, otherwise fall back to CPU.
+    """
+    try:
+        import torch
+    except ImportError:
+        return "cpu"
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+def get_embedding_model(model_name: str = DEFAULT_MODEL_NAME, device: str = None):
+    """
+    Returns the shared SentenceTransformer for (model_name, device), loading it on first use.
+    torch and sentence_transformers are only imported here, so importing a step module stays cheap.
+    Concurrent callers for the same key wait for a single load.
+    """
+    device = device or default_device()
+    key = (model_name, device)
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    with _registry_lock:
+        key_lock = _key_locks.setdefault(key, threading.Lock())
+    with key_lock:
+        if key not in _models:
+            from sentence_transformers import SentenceTransformer
+
+            print(f"Loading embedding model {model_name} on {device}")
+            _models[key] = SentenceTransformer(model_name, device=device)
+        return _models[key]
+
+def warm_up(model_name: str = DEFAULT_MODEL_NAME, device: str = None, sample_texts=("warm-up",)):
+    """
+    Loads the model and runs one encode call, so the first real request does not pay for
+    weight loading and kernel initialisation.
+    """
+    model = get_embedding_model(model_name, device)
+    model.encode(list(sample_texts))
+    return model
+
+def register_model(model, model_name: str = DEFAULT_MODEL_NAME, device: str = None):
+    """
+    Makes model the shared instance for (model_name, device), e.g. a stub encoder in benchmarks.
+    """
+    device = device or default_device()
+    with _registry_lock:
+        _models[(model_name, device)] = model
+    return model
@@ -0,0 +1,164 @@
+import json
+import os
+import queue
+import shutil
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+from tqdm import tqdm
+from MHE_Dtacreation_video_step1 import build_anki_url_index, build_result_item, iter_linked_pairs, write_product_file
+from product_files import count_placements
+from table_io import read_table, table_format, write_table
+
+# Per-worker state, set once by the pool initializers
+_worker_state = {}
+
+def _step1_shard(product: str, pairs: list, anki_index: dict, output_dir: str) -> str:
+    records = [build_result_item(transcript, hierarchical_data, anki_index) for transcript, hierarchical_data in pairs]
+    return write_product_file(product, records, output_dir)
+
+def run_step1_parallel(bb_transcripts_file: str, bb_hierarchical_file: str, anki_excel_file: str, output_dir: str = "product_files2", max_workers: int = None):
+    """
+    Step 1 sharded by product: the inputs are loaded once, then each product's records are linked
+    and written to its JSON file in a separate process. Output files match process_data.
+    """
+    try:
+        with open(bb_transcripts_file, 'r') as f:
+            bb_transcripts = json.load(f)
+        with open(bb_hierarchical_file, 'r') as f:
+            bb_hierarchical = json.load(f)
+        anki_index = build_anki_url_index(pd.read_excel(anki_excel_file))
+
+        product_to_pairs = {}
+        for transcript, hierarchical_data in iter_linked_pairs(bb_transcripts, bb_hierarchical):
+            product = hierarchical_data.get('product')
+            if product:
+                product_to_pairs.setdefault(product, []).append((transcript, hierarchical_data))
+
+        os.makedirs(output_dir, exist_ok=True)
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = []
+            for product, pairs in product_to_pairs.items():
+                # Each shard only carries the Anki rows of its own video titles
+                titles = {hierarchical_data['videoTitle'] for _, hierarchical_data in pairs}
+                shard_index = {title: anki_index[title] for title in titles if title in anki_index}
+                futures.append(executor.submit(_step1_shard, product, pairs, shard_index, output_dir))
+            output_files = [future.result() for future in tqdm(as_completed(futures), total=len(futures), desc="Step 1 products")]
+
+        return {"status": "success", "message": "JSON files created successfully", "output_directory": output_dir, "output_files": sorted(output_files)}
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+def _init_step2_worker(embeddings_store_path: str, model_name: str, search_backend: str, search_options: dict, threads_per_worker: int, progress_queue):
+    """
+    Loads and warms up the worker's shared encoder once and memory-maps the flashcard store, so all workers share its pages.
+    """
+    import torch
+    from flashcard_embedding_store import load_flashcard_embeddings
+    from flashcard_search import build_store_search_index
+    from model_registry import warm_up
+
+    torch.set_num_threads(threads_per_worker)
+    embeddings_data = load_flashcard_embeddings(embeddings_store_path, expected_model_name=model_name, mmap=True)
+    _worker_state.update(
+        embedding_model=warm_up(model_name),
+        embeddings_data=embeddings_data,
+        search_index=build_store_search_index(embeddings_data, backend=search_backend, **(search_options or {})),
+        progress_queue=progress_queue,
+    )
+
+def _step2_shard(json_file_path: str, embeddings_store_path: str, output_path: str, model_name: str, step2_options: dict) -> dict:
+    from transcript_flashcardmapping_step2 import process_step2
+
+    progress_queue = _worker_state["progress_queue"]
+    return process_step2(
+        json_file_path,
+        embeddings_store_path,
+        output_path,
+        model_name=model_name,
+        embedding_model=_worker_state["embedding_model"],
+        embeddings_data=_worker_state["embeddings_data"],
+        search_index=_worker_state["search_index"],
+        progress_callback=progress_queue.put,
+        **step2_options,
+    )
+
+def merge_step2_outputs(output_paths, merged_output_path: str):
+    """
+    Concatenates per-product step 2 outputs in the given order.
+    Parquet part directories are merged by moving their part files, without loading any rows.
+    """
+    if table_format(merged_output_path) == "parquet" and all(os.path.isdir(path) for path in output_paths):
+        if os.path.isdir(merged_output_path):
+            shutil.rmtree(merged_output_path)
+        os.makedirs(merged_output_path)
+        part_number = 0
+        for path in output_paths:
+            for part_name in sorted(name for name in os.listdir(path) if name.startswith("part-")):
+                os.replace(os.path.join(path, part_name), os.path.join(merged_output_path, f"part-{part_number:06d}.parquet"))
+                part_number += 1
+            shutil.rmtree(path)
+    else:
+        write_table(pd.concat([read_table(path) for path in output_paths], ignore_index=True), merged_output_path)
+    return merged_output_path
+
+def run_step2_parallel(json_file_paths, embeddings_store_path: str, output_dir: str, merged_output_path: str = None, model_name: str = 'abhinand/MedEmbed-large-v0.1', max_workers: int = None, search_backend: str = "exact", search_options: dict = None, output_format: str = "parquet", **step2_options):
+    """
+    Runs process_step2 over many product JSON files on a process pool.
+    Each worker loads the encoder once and memory-maps the flashcard store; torch threads are split
+    between workers so they do not oversubscribe the cores. Progress is aggregated over all entries,
+    and the per-product outputs (optionally merged) are ordered by input file name, whatever order workers finish in.
+    """
+    try:
+        json_file_paths = sorted(json_file_paths)
+        max_workers = max_workers or min(len(json_file_paths), os.cpu_count() or 1)
+        threads_per_worker = max(1, (os.cpu_count() or 1) // max_workers)
+        os.makedirs(output_dir, exist_ok=True)
+
+        total_entries = sum(count_placements(json_file_path) for json_file_path in json_file_paths)
+
+        output_paths = [
+            os.path.join(output_dir, f"{os.path.splitext(os.path.basename(path))[0]}_flashcards_mapped.{output_format}")
+            for path in json_file_paths
+        ]
+
+        # The manager's server process is shut down when the pool is done
+        with mp.Manager() as manager:
+            progress_queue = manager.Queue()
+            results = {}
+            with ProcessPoolExecutor(
+                max_workers=max_workers,
+                initializer=_init_step2_worker,
+                initargs=(embeddings_store_path, model_name, search_backend, search_options, threads_per_worker, progress_queue),
+            ) as executor:
+                futures = {
+                    executor.submit(_step2_shard, json_file_path, embeddings_store_path, output_path, model_name, step2_options): json_file_path
+                    for json_file_path, output_path in zip(json_file_paths, output_paths)
+                }
+                pending = set(futures)
+                with tqdm(total=total_entries, desc="Step 2 entries (all workers)") as progress:
+                    while pending:
+                        try:
+                            progress.update(progress_queue.get(timeout=0.5))
+                        except queue.Empty:
+                            pass
+                        for future in [future for future in pending if future.done()]:
+                            pending.discard(future)
+                            results[futures[future]] = future.result()
+                    while not progress_queue.empty():
+                        progress.update(progress_queue.get())
+
+        failed = {path: result for path, result in results.items() if result["status"] != "success"}
+        if failed:
+            return {"status": "error", "message": f"Step 2 failed for {sorted(failed)}", "results": results}
+
+        if merged_output_path:
+            merge_step2_outputs(output_paths, merged_output_path)
+        return {
+            "status": "success",
+            "message": "Step 2 processing completed",
+            "output_files": [merged_output_path] if merged_output_path else output_paths,
+            "results": results,
+        }
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
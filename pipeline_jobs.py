@@ -0,0 +1,190 @@
+import ast
+import builtins
+import importlib.util
+import inspect
+import os
+from job_queue import is_within, job_workspace
+from product_files import count_placements
+
+def run_step2_job(context, json_file_path: str, embeddings_store_path: str, output_path: str, **step2_options):
+    """
+    Step 2 for one product JSON file; progress is the fraction of entries matched.
+    """
+    from transcript_flashcardmapping_step2 import process_step2
+
+    total_entries = max(count_placements(json_file_path), 1)
+    finished = [0]
+
+    def progress_callback(n):
+        finished[0] += n
+        context.progress(finished[0] / total_entries, f"{finished[0]}/{total_entries} entries matched")
+
+    return process_step2(json_file_path, embeddings_store_path, output_path, progress_callback=progress_callback, **step2_options)
+
+def run_classification_job(context, step2_output_path: str, bb_transcripts_file: str, classified_output_dir: str, classified_output_file: str, **classification_options):
+    """
+    Step 4 classification of a step 2 output; progress is the fraction of request batches finished.
+    classification_options (concurrency, rate limits, response_cache_path, journal_path) go to run_classification.
+    """
+    from main_video import run_classification
+
+    def progress_callback(done, total):
+        context.progress(done / max(total, 1), f"{done}/{total} batches classified")
+
+    return run_classification(step2_output_path, bb_transcripts_file, classified_output_dir, classified_output_file, progress_callback=progress_callback, **classification_options)
+
+def run_pipeline_job(context, manifest_path: str = ".pipeline_manifest.json", max_workers: int = 2, **paths):
+    """
+    The full main_video pipeline with the given input and output paths (see build_stages);
+    progress is the fraction of stages finished. Unchanged stages are skipped as usual.
+    """
+    from main_video import build_stages
+    from pipeline_runner import PipelineRunner
+
+    def on_stage_done(name, outcome, finished, total):
+        context.progress(finished / total, f"{name}: {outcome['status']}")
+
+    stages = build_stages(**paths)
+    report = PipelineRunner(stages, manifest_path=manifest_path, max_workers=max_workers, on_stage_done=on_stage_done).run()
+    failed = sorted(name for name, outcome in report.items() if outcome["status"] in ("failed", "blocked"))
+    # Outputs of failed or blocked stages may be partial or missing; unchanged (skipped) stages kept theirs
+    output_files = [path for stage in stages if report.get(stage.name, {}).get("status") in ("ran", "skipped") for path in stage.outputs]
+    if failed:
+        return {"status": "error", "message": f"Pipeline stopped at stages {failed}", "report": report, "output_files": output_files}
+    return {"status": "success", "message": "Pipeline execution completed", "report": report, "output_files": output_files}
+
+# Job kind -> function(context, **params)
+JOB_KINDS = {
+    "step2": run_step2_job,
+    "classification": run_classification_job,
+    "pipeline": run_pipeline_job,
+}
+
+# Job kind -> (parameters naming files it reads, parameters naming files or directories it writes)
+JOB_PATH_PARAMS = {
+    "step2": (("json_file_path", "embeddings_store_path"), ("output_path", "embedding_cache_path")),
+    "classification": (("step2_output_path", "bb_transcripts_file"), ("classified_output_dir", "classified_output_file", "response_cache_path", "journal_path")),
+    "pipeline": (
+        ("bb_transcripts_file", "bb_hierarchical_file", "anki_excel_file"),
+        ("output_dir", "json_file_path", "flashcard_embeddings_store", "step2_output_path", "classified_output_dir", "final_output", "no_class_output", "with_class_output", "video_manifest_path", "manifest_path", "response_cache_path"),
+    ),
+}
+
+# Job kind -> (module, function) that receives the job's extra keyword parameters, and the ones the job sets itself
+JOB_OPTION_TARGETS = {
+    "step2": ("transcript_flashcardmapping_step2", "process_step2", ("json_file_path", "embeddings_pkl_path", "output_excel_path", "progress_callback", "embedding_model", "embeddings_data", "search_index")),
+    "classification": ("main_video", "run_classification", ("step2_output_path", "bb_transcripts_file", "classified_output_dir", "classified_output_file", "progress_callback")),
+    "pipeline": ("main_video", "build_stages", ()),
+}
+
+# Default of a parameter whose default expression is not a plain literal (e.g. 2 * 1024 ** 3)
+COMPUTED_DEFAULT = "<computed>"
+
+def _source_value(node, fallback):
+    if node is None:
+        return fallback
+    try:
+        return ast.literal_eval(node)
+    except ValueError:
+        return COMPUTED_DEFAULT
+
+def _source_annotation(node):
+    if isinstance(node, ast.Name) and node.id in ("str", "int", "float", "bool", "dict", "list"):
+        return getattr(builtins, node.id)
+    return inspect.Parameter.empty
+
+def source_signature(module_name: str, function_name: str) -> inspect.Signature:
+    """
+    The signature of a module-level function, read from the module's source without importing it,
+    so the API process does not load the step modules and their dependencies to check a job request.
+    Only builtin annotations and literal defaults are kept; other defaults become COMPUTED_DEFAULT.
+    """
+    spec = importlib.util.find_spec(module_name)
+    if spec is None or not spec.origin:
+        raise ImportError(f"Module '{module_name}' not found")
+    with open(spec.origin, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=spec.origin)
+    function = next((node for node in tree.body if isinstance(node, ast.FunctionDef) and node.name == function_name), None)
+    if function is None:
+        raise ImportError(f"Function '{function_name}' not found in module '{module_name}'")
+    args = function.args
+    positional = args.posonlyargs + args.args
+    defaults = [None] * (len(positional) - len(args.defaults)) + list(args.defaults)
+    parameters = [
+        inspect.Parameter(arg.arg, inspect.Parameter.POSITIONAL_OR_KEYWORD, default=_source_value(default, inspect.Parameter.empty), annotation=_source_annotation(arg.annotation))
+        for arg, default in zip(positional, defaults)
+    ]
+    parameters += [
+        inspect.Parameter(arg.arg, inspect.Parameter.KEYWORD_ONLY, default=_source_value(default, inspect.Parameter.empty), annotation=_source_annotation(arg.annotation))
+        for arg, default in zip(args.kwonlyargs, args.kw_defaults)
+    ]
+    return inspect.Signature(parameters)
+
+def job_parameters(kind: str) -> dict:
+    """
+    {name: inspect.Parameter} of the parameters a job request of this kind may set.
+    """
+    parameters = {}
+    for name, parameter in list(inspect.signature(JOB_KINDS[kind]).parameters.items())[1:]:
+        if parameter.kind != inspect.Parameter.VAR_KEYWORD:
+            parameters[name] = parameter
+    if kind in JOB_OPTION_TARGETS:
+        module_name, function_name, reserved = JOB_OPTION_TARGETS[kind]
+        for name, parameter in source_signature(module_name, function_name).parameters.items():
+            if name not in reserved and name not in parameters:
+                parameters[name] = parameter
+    return parameters
+
+def _check_type(name: str, value, parameter: inspect.Parameter):
+    annotation = parameter.annotation
+    if annotation not in (str, int, float, bool) or (value is None and parameter.default is None):
+        return
+    valid = isinstance(value, annotation) and not (annotation in (int, float) and isinstance(value, bool))
+    if annotation is float and isinstance(value, int) and not isinstance(value, bool):
+        valid = True
+    if not valid:
+        raise ValueError(f"Parameter '{name}' must be of type {annotation.__name__}")
+
+def _confined_path(name: str, value, base: str, root: str) -> str:
+    if not isinstance(value, str) or not value:
+        raise ValueError(f"Parameter '{name}' must be a non-empty path")
+    path = os.path.realpath(os.path.join(base, value))
+    if not is_within(path, root):
+        raise ValueError(f"Parameter '{name}' points outside the allowed directory: {value}")
+    return path
+
+def prepare_job_params(kind: str, params: dict, workspace_root: str, job_id: str) -> dict:
+    """
+    Checks a job request against the signature of its kind and confines its paths.
+    Files a job reads must lie under workspace_root; files it writes go to its own directory
+    (job_workspace), which relative paths and the default output names are taken from.
+    Returns the parameters with absolute paths; raises ValueError for unknown, missing or mistyped
+    parameters and for paths outside those directories.
+    """
+    if kind not in JOB_KINDS:
+        raise ValueError(f"Unknown job kind '{kind}', expected one of {sorted(JOB_KINDS)}")
+    params = dict(params or {})
+    parameters = job_parameters(kind)
+    unknown = sorted(set(params) - set(parameters))
+    if unknown:
+        raise ValueError(f"Unknown parameters for a {kind} job: {unknown}")
+    missing = sorted(name for name, parameter in parameters.items() if parameter.default is inspect.Parameter.empty and name not in params)
+    if missing:
+        raise ValueError(f"Missing parameters for a {kind} job: {missing}")
+    for name, value in params.items():
+        _check_type(name, value, parameters[name])
+
+    root = os.path.realpath(workspace_root)
+    job_dir = job_workspace(workspace_root, job_id)
+    input_params, output_params = JOB_PATH_PARAMS[kind]
+    for names, base in ((input_params, root), (output_params, job_dir)):
+        for name in names:
+            if name not in parameters:
+                continue
+            # Unset paths with a default name (e.g. the pipeline outputs) are placed in the job directory too
+            value = params.get(name, parameters[name].default)
+            if value is None or value is inspect.Parameter.empty:
+                continue
+            params[name] = _confined_path(name, value, base, base)
+    os.makedirs(job_dir, exist_ok=True)
+    return params
@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from metrics import span
+
+def hash_path(path: str) -> str:
+    """
+    Content hash of a file, or of every file under a directory (names included).
+    A missing path hashes to "missing".
+    """
+    digest = hashlib.sha256()
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                file_path = os.path.join(root, name)
+                digest.update(os.path.relpath(file_path, path).encode("utf-8"))
+                digest.update(hash_path(file_path).encode("utf-8"))
+    elif os.path.isfile(path):
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+    else:
+        return "missing"
+    return digest.hexdigest()
+
+def _is_within(path: str, parent: str) -> bool:
+    path = os.path.abspath(path)
+    parent = os.path.abspath(parent)
+    return path == parent or path.startswith(parent + os.sep)
+
+class Stage:
+    """
+    One pipeline step: func(**params) reads the inputs paths and writes the outputs paths.
+    A stage depends on every stage producing one of its inputs (or a directory containing it), plus those named in after.
+    func may return a step result dict; {"status": "error"} marks the stage as failed.
+    """
+
+    def __init__(self, name: str, func, inputs=(), outputs=(), params: dict = None, after=()):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.params = dict(params or {})
+        self.after = list(after)
+
+    def fingerprint(self) -> str:
+        """
+        Hash of the stage function, its parameters and the content of its inputs.
+        """
+        digest = hashlib.sha256()
+        digest.update(f"{self.func.__module__}.{self.func.__qualname__}".encode("utf-8"))
+        digest.update(json.dumps(self.params, sort_keys=True, default=str).encode("utf-8"))
+        for path in self.inputs:
+            digest.update(path.encode("utf-8"))
+            digest.update(hash_path(path).encode("utf-8"))
+        return digest.hexdigest()
+
+class PipelineRunner:
+    """
+    Runs stages in dependency order, independent stages in parallel.
+    A stage is skipped when its fingerprint matches the manifest of the last successful run and its outputs exist,
+    so changing one parameter only re-runs that stage and the stages downstream of changed outputs.
+    on_stage_done(name, outcome, finished, total) is called as each stage finishes, is skipped or is blocked.
+    """
+
+    def __init__(self, stages, manifest_path: str = ".pipeline_manifest.json", max_workers: int = 2, on_stage_done=None):
+        self.stages = {stage.name: stage for stage in stages}
+        self.manifest_path = manifest_path
+        self.max_workers = max_workers
+        self.on_stage_done = on_stage_done
+        self.dependencies = {name: self._dependencies(stage) for name, stage in self.stages.items()}
+        self._manifest_lock = threading.Lock()
+
+    def _dependencies(self, stage: Stage) -> set:
+        dependencies = set(stage.after)
+        for other in self.stages.values():
+            if other is stage:
+                continue
+            if any(_is_within(path, output) for path in stage.inputs for output in other.outputs):
+                dependencies.add(other.name)
+        unknown = dependencies - set(self.stages)
+        if unknown:
+            raise ValueError(f"Stage '{stage.name}' depends on unknown stages {sorted(unknown)}")
+        return dependencies
+
+    def _load_manifest(self) -> dict:
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_manifest(self, manifest: dict):
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=4)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _run_stage(self, stage: Stage, manifest: dict) -> dict:
+        start = time.perf_counter()
+        fingerprint = stage.fingerprint()
+        previous = manifest.get(stage.name, {})
+        if previous.get("fingerprint") == fingerprint and all(os.path.exists(path) for path in stage.outputs):
+            return {"status": "skipped", "seconds": time.perf_counter() - start}
+
+        try:
+            with span(f"stage.{stage.name}"):
+                result = stage.func(**stage.params)
+        except Exception as e:
+            result = {"status": "error", "message": str(e)}
+        seconds = time.perf_counter() - start
+        if isinstance(result, dict) and result.get("status") == "error":
+            return {"status": "failed", "seconds": seconds, "message": result.get("message")}
+
+        with self._manifest_lock:
+            manifest[stage.name] = {"fingerprint": fingerprint, "outputs": stage.outputs, "completed_at": time.time()}
+            self._save_manifest(manifest)
+        return {"status": "ran", "seconds": seconds}
+
+    def _stage_done(self, name: str, report: dict):
+        if self.on_stage_done is not None:
+            self.on_stage_done(name, report[name], len(report), len(self.stages))
+
+    def run(self) -> dict:
+        """
+        Runs the pipeline and returns {stage name: {"status", "seconds", ...}}.
+        Stages downstream of a failure are reported as "blocked".
+        """
+        manifest = self._load_manifest()
+        report = {}
+        remaining = set(self.stages)
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while remaining or running:
+                for name in sorted(remaining):
+                    dependencies = self.dependencies[name]
+                    if any(report.get(dep, {}).get("status") in ("failed", "blocked") for dep in dependencies):
+                        report[name] = {"status": "blocked", "seconds": 0.0}
+                        remaining.discard(name)
+                        self._stage_done(name, report)
+                    elif all(dep in report for dep in dependencies):
+                        print(f"Starting stage {name}")
+                        running[executor.submit(self._run_stage, self.stages[name], manifest)] = name
+                        remaining.discard(name)
+                if not running:
+                    if remaining:
+                        raise ValueError(f"Dependency cycle between stages {sorted(remaining)}")
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    report[name] = future.result()
+                    print(f"Stage {name}: {report[name]['status']} in {report[name]['seconds']:.1f}s")
+                    self._stage_done(name, report)
+
+        print_report(report)
+        return report
+
+def print_report(report: dict):
+    print(f"{'Stage':<32} {'Status':<8} {'Wall time':>10}")
+    for name, outcome in report.items():
+        print(f"{name:<32} {outcome['status']:<8} {outcome['seconds']:>9.1f}s")
@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+
+PRODUCT_FILE_FORMAT_VERSION = 2
+TRANSCRIPT_HASH_KEY = "transcriptHash"
+
+def transcript_hash(text: str) -> str:
+    """
+    Content address of a transcript: the SHA-256 of its UTF-8 text.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def pack_entries(entries) -> dict:
+    """
+    Turns step 1 entries into a product file body: every distinct transcript is stored once in "transcripts"
+    (hash -> text) and each placement refers to it by its transcriptHash instead of carrying a copy.
+    """
+    transcripts = {}
+    placements = []
+    for entry in entries:
+        text = entry.get("Transcript")
+        if not isinstance(text, str):
+            # Missing or null transcripts stay inline, as they were
+            placements.append(dict(entry))
+            continue
+        key = transcript_hash(text)
+        transcripts.setdefault(key, text)
+        placement = {name: value for name, value in entry.items() if name != "Transcript"}
+        placement[TRANSCRIPT_HASH_KEY] = key
+        placements.append(placement)
+    return {"format_version": PRODUCT_FILE_FORMAT_VERSION, "transcripts": transcripts, "placements": placements}
+
+def load_product_file(path: str) -> dict:
+    """
+    Reads a step 1 product file. Files from before the transcript table (a plain list of entries) are packed on load.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        return pack_entries(data)
+    if data.get("format_version") != PRODUCT_FILE_FORMAT_VERSION:
+        raise ValueError(f"Unsupported product file version {data.get('format_version')} in {path}")
+    return data
+
+def save_product_file(path: str, product_data: dict) -> str:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(product_data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return path
+
+def placement_transcript(product_data: dict, placement: dict):
+    """
+    The transcript text of one placement ("" when it has none, as step 2 always read it).
+    """
+    key = placement.get(TRANSCRIPT_HASH_KEY)
+    return product_data["transcripts"][key] if key is not None else placement.get("Transcript", "")
+
+def expand_entries(product_data: dict) -> list:
+    """
+    The placements as full step 1 entries with their "Transcript" text, as the old format stored them.
+    Entries of the same transcript share one string object.
+    """
+    entries = []
+    for placement in product_data["placements"]:
+        if TRANSCRIPT_HASH_KEY not in placement:
+            entries.append(dict(placement))
+            continue
+        entry = {name: value for name, value in placement.items() if name != TRANSCRIPT_HASH_KEY}
+        entry["Transcript"] = product_data["transcripts"][placement[TRANSCRIPT_HASH_KEY]]
+        entries.append(entry)
+    return entries
+
+def load_entries(json_file_paths) -> list:
+    """
+    Full step 1 entries of one or more product files, in either format.
+    """
+    if isinstance(json_file_paths, str):
+        json_file_paths = [json_file_paths]
+    entries = []
+    for path in json_file_paths:
+        entries.extend(expand_entries(load_product_file(path)))
+    return entries
+
+def count_placements(path: str) -> int:
+    return len(load_product_file(path)["placements"])
+
+def group_placements(product_data: dict) -> list:
+    """
+    [(transcript text, placements)] with one group per distinct transcript, in order of first appearance.
+    Placements without a stored transcript form groups of their own.
+    """
+    groups = {}
+    for position, placement in enumerate(product_data["placements"]):
+        key = placement.get(TRANSCRIPT_HASH_KEY, ("inline", position))
+        if key not in groups:
+            groups[key] = (placement_transcript(product_data, placement), [])
+        groups[key][1].append(placement)
+    return list(groups.values())
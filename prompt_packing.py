@@ -0,0 +1,53 @@
+import math
+
+# Instructions, examples and system prompt around the transcript and flashcards
+PROMPT_OVERHEAD_TOKENS = 700
+# One '    "Flashcard_N": "Non-Relevant",' line of the indented JSON answer measures 14-16 tokens; 20 leaves headroom
+OUTPUT_TOKENS_PER_CARD = 20
+# Braces, a possible code fence and a short preamble, so even a 1-card request has room (the old fixed budget was 100)
+OUTPUT_OVERHEAD_TOKENS = 100
+# Largest maxTokens a classification request is sent with
+MAX_OUTPUT_TOKENS = 4_096
+
+def estimate_tokens(text) -> int:
+    """
+    Rough token count (about 4 characters per token).
+    """
+    return len(str(text)) // 4 + 1
+
+def max_output_tokens(n_flashcards: int) -> int:
+    """
+    maxTokens for a request classifying n_flashcards, leaving room for the whole JSON answer.
+    """
+    return min(OUTPUT_OVERHEAD_TOKENS + OUTPUT_TOKENS_PER_CARD * n_flashcards, MAX_OUTPUT_TOKENS)
+
+def pack_flashcard_batches(flashcards, transcript_text, max_input_tokens: int = 30_000, max_cards: int = 40, max_output_tokens_per_request: int = MAX_OUTPUT_TOKENS):
+    """
+    Splits flashcards into (start, end) slices so each request fits the input and output token budgets.
+    Uses as few requests as the budgets allow (so the transcript is re-sent as rarely as possible),
+    then spreads the cards evenly across them. Every request holds at least one card.
+    """
+    n_cards = len(flashcards)
+    if n_cards == 0:
+        return []
+    card_tokens = [estimate_tokens(flashcard) + 4 for flashcard in flashcards]
+    card_budget = max(max_input_tokens - estimate_tokens(transcript_text) - PROMPT_OVERHEAD_TOKENS, 1)
+    max_cards = max(1, min(max_cards, (max_output_tokens_per_request - OUTPUT_OVERHEAD_TOKENS) // OUTPUT_TOKENS_PER_CARD))
+
+    n_requests = max(math.ceil(n_cards / max_cards), math.ceil(sum(card_tokens) / card_budget))
+    while True:
+        target = math.ceil(n_cards / n_requests)
+        batches = []
+        start = 0
+        used = 0
+        for i, tokens in enumerate(card_tokens):
+            if i > start and (i - start >= target or used + tokens > card_budget):
+                batches.append((start, i))
+                start = i
+                used = 0
+            used += tokens
+        batches.append((start, n_cards))
+        # Uneven card lengths can need more requests than the estimate; retry with one more
+        if len(batches) <= n_requests or n_requests >= n_cards:
+            return batches
+        n_requests += 1
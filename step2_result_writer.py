@@ -0,0 +1,167 @@
+import os
+import shutil
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from table_io import read_table, table_format, write_table
+from metrics import span
+
+# (output column, step 1 JSON key) for the per-video metadata columns, in output order
+METADATA_COLUMNS = (
+    ("categoryTitle", "categoryTitle"),
+    ("subcategoryTitle", "subcategoryTitle"),
+    ("videoID", "videoID"),
+    ("cadmoreAlternateID", "Id"),
+    ("videoTitle", "videoTitle"),
+    ("product", "product"),
+    ("videoUrl", "videoUrl"),
+    ("Update status", "updatedStatus"),
+)
+METADATA_DEFAULTS = {"videoTitle": "Unnamed"}
+
+def entry_metadata(entry: dict) -> dict:
+    """
+    Picks the output metadata columns of one step 1 entry.
+    """
+    return {column: entry.get(key, METADATA_DEFAULTS.get(column, "")) for column, key in METADATA_COLUMNS}
+
+def _is_missing(value) -> bool:
+    return value is None or (isinstance(value, float) and np.isnan(value))
+
+def infer_metadata_types(entries) -> dict:
+    """
+    Chooses an Arrow type per metadata column: int64 / float64 when every value is numeric,
+    otherwise a dictionary-encoded string.
+    """
+    types = {}
+    for column, key in METADATA_COLUMNS:
+        values = [entry.get(key, METADATA_DEFAULTS.get(column, "")) for entry in entries]
+        present = [value for value in values if not _is_missing(value)]
+        if present and all(isinstance(value, int) and not isinstance(value, bool) for value in present):
+            types[column] = pa.int64()
+        elif present and all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in present):
+            types[column] = pa.float64()
+        else:
+            types[column] = pa.dictionary(pa.int32(), pa.string())
+    return types
+
+def _dictionary_array(values, indices) -> pa.DictionaryArray:
+    """
+    Stores each distinct value once and references it by index from every row.
+    """
+    positions = {}
+    remap = np.array([
+        positions.setdefault(None if _is_missing(value) else str(value), len(positions)) for value in values
+    ], dtype=np.int32)
+    dictionary = pa.array(list(positions), type=pa.string())
+    return pa.DictionaryArray.from_arrays(pa.array(remap[np.asarray(indices, dtype=np.int64)], type=pa.int32()), dictionary)
+
+class Step2ResultWriter:
+    """
+    Streams step 2 matches to disk in row groups with bounded memory.
+    Each buffered entry keeps its metadata and chunk texts once; match rows only hold
+    (entry, chunk, flashcard, score) references until the row group is written.
+    Parquet output is a directory of self-contained part files, so finished row groups survive a crash;
+    CSV is appended to; other formats are spooled to Parquet parts and converted on close.
+    """
+
+    def __init__(self, output_path: str, flashcards, flashcard_ids, metadata_types: dict, row_group_rows: int = 50_000):
+        self.output_path = output_path
+        self.flashcards = flashcards
+        self.flashcard_ids = flashcard_ids
+        self.metadata_types = metadata_types
+        self.row_group_rows = row_group_rows
+        self.rows_written = 0
+        self._groups_written = 0
+        self._format = table_format(output_path)
+        self._parts_dir = output_path if self._format == "parquet" else f"{output_path}.parts.parquet"
+        self._reset_buffer()
+
+        for path in (output_path, self._parts_dir):
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            elif os.path.exists(path):
+                os.remove(path)
+        if self._format != "csv":
+            os.makedirs(self._parts_dir)
+
+    def _reset_buffer(self):
+        self._entries = []
+        self._chunks = []
+        self._chunk_ids = []
+        self._entry_refs = []
+        self._chunk_refs = []
+        self._flashcard_refs = []
+        self._scores = []
+
+    def add_entry(self, metadata: dict, transcript_chunks, chunk_matches, chunk_ids=None):
+        """
+        Buffers the matches of one entry: chunk_matches[i] is the (flashcard_index, score) list of transcript_chunks[i],
+        whose stable ID (see text_chunker.chunk_id) is chunk_ids[i].
+        """
+        entry_ref = len(self._entries)
+        self._entries.append(metadata)
+        if chunk_ids is None:
+            chunk_ids = [None] * len(transcript_chunks)
+        for transcript_chunk, chunk_id, matches in zip(transcript_chunks, chunk_ids, chunk_matches):
+            if not matches:
+                continue
+            chunk_ref = len(self._chunks)
+            self._chunks.append(transcript_chunk)
+            self._chunk_ids.append(chunk_id)
+            for flashcard_index, score in matches:
+                self._entry_refs.append(entry_ref)
+                self._chunk_refs.append(chunk_ref)
+                self._flashcard_refs.append(flashcard_index)
+                self._scores.append(score)
+        if len(self._scores) >= self.row_group_rows:
+            self.flush()
+
+    def _row_group_table(self) -> pa.Table:
+        entry_refs = np.asarray(self._entry_refs, dtype=np.int32)
+        columns = {}
+        for column, _ in METADATA_COLUMNS:
+            values = [entry[column] for entry in self._entries]
+            column_type = self.metadata_types[column]
+            if pa.types.is_dictionary(column_type):
+                columns[column] = _dictionary_array(values, entry_refs)
+            else:
+                columns[column] = pa.array([values[i] for i in entry_refs], type=column_type, from_pandas=True)
+        columns["Transcript Chunk"] = _dictionary_array(self._chunks, self._chunk_refs)
+        columns["Chunk ID"] = _dictionary_array(self._chunk_ids, self._chunk_refs)
+        used_flashcards, flashcard_refs = np.unique(np.asarray(self._flashcard_refs, dtype=np.int64), return_inverse=True)
+        columns["Flashcard"] = _dictionary_array([self.flashcards[i] for i in used_flashcards], flashcard_refs)
+        columns["Flashcard ID"] = _dictionary_array([self.flashcard_ids[i] for i in used_flashcards], flashcard_refs)
+        columns["Score"] = pa.array(self._scores, type=pa.float64())
+        return pa.table(columns)
+
+    def _write_part(self, table: pa.Table):
+        part_name = f"part-{self._groups_written:06d}.parquet"
+        # Hidden while being written, so readers never pick up a partial part
+        tmp_path = os.path.join(self._parts_dir, f".{part_name}.tmp")
+        pq.write_table(table, tmp_path, compression="zstd")
+        os.replace(tmp_path, os.path.join(self._parts_dir, part_name))
+
+    def flush(self):
+        """
+        Writes the buffered matches as one row group and empties the buffer.
+        """
+        # Empty row groups are skipped, except that the first one still records the schema
+        if not self._scores and self._groups_written:
+            return
+        with span("step2.write_row_group"):
+            table = self._row_group_table()
+            if self._format == "csv":
+                table.to_pandas().to_csv(self.output_path, mode="a", header=self._groups_written == 0, index=False)
+            else:
+                self._write_part(table)
+        self._groups_written += 1
+        self.rows_written += table.num_rows
+        self._reset_buffer()
+
+    def close(self):
+        self.flush()
+        if self._format not in ("parquet", "csv"):
+            write_table(read_table(self._parts_dir), self.output_path)
+            shutil.rmtree(self._parts_dir)
+        return self.rows_written
@@ -0,0 +1,365 @@
+import json
+import os
+import shutil
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Rows per Excel sheet, header included
+EXCEL_MAX_ROWS = 1_048_576
+
+PARQUET_EXTENSIONS = (".parquet", ".pq")
+ARROW_EXTENSIONS = (".arrow", ".feather", ".ipc")
+EXCEL_EXTENSIONS = (".xlsx", ".xls")
+
+# Columns that repeat the same few values on many rows; stored dictionary-encoded
+DICTIONARY_COLUMNS = (
+    "categoryTitle",
+    "subcategoryTitle",
+    "videoID",
+    "cadmoreAlternateID",
+    "videoTitle",
+    "product",
+    "videoUrl",
+    "Update status",
+    "updatedStatus",
+    "Transcript",
+    "Transcript Chunk",
+    "Chunk ID",
+    "Flashcard",
+    "Flashcard ID",
+    "Flashcard Classification",
+)
+
+def table_format(path: str) -> str:
+    """
+    Returns "parquet", "arrow", "excel", "csv" or "json" from the file extension.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension in PARQUET_EXTENSIONS:
+        return "parquet"
+    if extension in ARROW_EXTENSIONS:
+        return "arrow"
+    if extension in EXCEL_EXTENSIONS:
+        return "excel"
+    if extension == ".csv":
+        return "csv"
+    if extension == ".json":
+        return "json"
+    raise ValueError(f"Unsupported table format: {path}")
+
+def _with_dictionary_columns(df: pd.DataFrame, dictionary_columns) -> pd.DataFrame:
+    """
+    Converts repeated string columns to categoricals, which Arrow stores as dictionary arrays.
+    """
+    converted = {
+        column: df[column].astype("category")
+        for column in dictionary_columns
+        if column in df.columns
+        and not isinstance(df[column].dtype, pd.CategoricalDtype)
+        and pd.api.types.is_string_dtype(df[column])
+    }
+    return df.assign(**converted) if converted else df
+
+def _without_dictionary_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Turns categoricals read back from Parquet/Arrow into plain columns, as pd.read_excel would return them.
+    """
+    converted = {
+        column: df[column].astype(df[column].cat.categories.dtype)
+        for column in df.columns
+        if isinstance(df[column].dtype, pd.CategoricalDtype)
+    }
+    return df.assign(**converted) if converted else df
+
+def read_table(path: str, sheet_name=0, columns=None) -> pd.DataFrame:
+    """
+    Reads an intermediate table from Parquet, Arrow IPC, Excel, CSV or JSON (list of records).
+    """
+    fmt = table_format(path)
+    if fmt == "parquet":
+        df = _without_dictionary_columns(pd.read_parquet(path, columns=columns))
+    elif fmt == "arrow":
+        df = _without_dictionary_columns(pd.read_feather(path, columns=columns))
+    elif fmt == "excel":
+        df = pd.read_excel(path, sheet_name=sheet_name, usecols=columns)
+    elif fmt == "csv":
+        df = pd.read_csv(path, usecols=columns)
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            df = pd.DataFrame(json.load(f))
+        if columns is not None:
+            df = df[list(columns)]
+    return df
+
+def write_table(df: pd.DataFrame, path: str, dictionary_columns=DICTIONARY_COLUMNS):
+    """
+    Writes an intermediate table in the format given by the extension.
+    Parquet and Arrow IPC dictionary-encode the repeated transcript, title and flashcard columns.
+    """
+    fmt = table_format(path)
+    if fmt == "parquet":
+        _with_dictionary_columns(df, dictionary_columns).to_parquet(path, index=False, compression="zstd")
+    elif fmt == "arrow":
+        _with_dictionary_columns(df, dictionary_columns).reset_index(drop=True).to_feather(path, compression="zstd")
+    elif fmt == "excel":
+        df.to_excel(path, index=False)
+    elif fmt == "csv":
+        df.to_csv(path, index=False)
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(df.to_json(orient="records", force_ascii=False))
+
+def export_excel(input_path: str, output_path: str):
+    """
+    Optional final stage: converts an intermediate table to Excel for hand-off.
+    Excel sheets hold at most 1,048,576 rows, so larger tables are refused.
+    """
+    df = read_table(input_path)
+    if len(df) >= EXCEL_MAX_ROWS:
+        raise ValueError(f"{input_path} has {len(df)} rows, more than an Excel sheet can hold")
+    df.to_excel(output_path, index=False)
+    return output_path
+
+def _parquet_files(path: str) -> list:
+    if not os.path.isdir(path):
+        return [path]
+    # Part directories (e.g. step 2 output); hidden files are parts still being written
+    return sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith(PARQUET_EXTENSIONS) and not name.startswith("."))
+
+def _iter_chunks(path: str, chunk_rows: int, sheet_name=0):
+    fmt = table_format(path)
+    if fmt == "parquet":
+        for file_path in _parquet_files(path):
+            for batch in pq.ParquetFile(file_path).iter_batches(batch_size=chunk_rows):
+                yield _without_dictionary_columns(pa.Table.from_batches([batch]).to_pandas())
+    elif fmt == "arrow":
+        with pa.memory_map(path) as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                for start in range(0, batch.num_rows, chunk_rows):
+                    yield _without_dictionary_columns(batch.slice(start, chunk_rows).to_pandas())
+    elif fmt == "csv":
+        with pd.read_csv(path, chunksize=chunk_rows) as reader:
+            yield from reader
+    elif fmt == "excel" and path.lower().endswith(".xlsx"):
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            sheet = workbook.worksheets[sheet_name] if isinstance(sheet_name, int) else workbook[sheet_name]
+            rows = sheet.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            buffer = []
+            for row in rows:
+                buffer.append(row)
+                if len(buffer) == chunk_rows:
+                    yield pd.DataFrame(buffer, columns=header)
+                    buffer = []
+            yield pd.DataFrame(buffer, columns=header)
+        finally:
+            workbook.close()
+    else:
+        # .xls and JSON record lists have no incremental reader
+        df = read_table(path, sheet_name=sheet_name)
+        for start in range(0, len(df), chunk_rows):
+            yield df.iloc[start:start + chunk_rows]
+
+def iter_table_chunks(path: str, chunk_rows: int = 50_000, sheet_name=0):
+    """
+    Reads a table as DataFrames of at most chunk_rows rows, so memory is bounded by the chunk size.
+    Parquet (file or part directory) and Arrow IPC are read batch by batch, CSV with the pandas chunked
+    reader and .xlsx through a read-only openpyxl workbook. A table without rows still yields one empty
+    frame carrying its columns.
+    """
+    empty = True
+    for chunk in _iter_chunks(path, chunk_rows, sheet_name):
+        empty = False
+        yield chunk
+    if empty:
+        yield read_table(path, sheet_name=sheet_name).iloc[:0]
+
+def _widened_type(current: pa.DataType, incoming: pa.DataType) -> pa.DataType:
+    """
+    A type both current and incoming values fit in: float64 for mixed numbers, otherwise text.
+    """
+    numeric = (pa.types.is_integer, pa.types.is_floating)
+    if any(check(current) for check in numeric) and any(check(incoming) for check in numeric):
+        return pa.float64()
+    return pa.string()
+
+class TableWriter:
+    """
+    Appends DataFrames to one output table without keeping earlier rows in memory.
+    Parquet and Arrow IPC are written through pyarrow's streaming writers with the types of the first frame's
+    dtypes; later frames are cast to them, and a column is widened (int to float, or to text) when they do not
+    fit. Rows go out in row groups of at least row_group_rows so many small frames do not make many tiny row
+    groups. CSV and JSON are appended as text, and Excel goes through a write-only openpyxl
+    workbook. The output is written under a temporary name and moved into place on close.
+    """
+
+    def __init__(self, path: str, row_group_rows: int = 50_000):
+        self.path = path
+        self.row_group_rows = row_group_rows
+        self.format = table_format(path)
+        self.columns = None
+        self.rows_written = 0
+        base, extension = os.path.splitext(path)
+        self._tmp_path = f"{base}.partial-{os.getpid()}{extension}"
+        self._writer = None
+        self._schema = None
+        self._file = None
+        self._sheet = None
+        self._buffer = []
+        self._buffered_rows = 0
+
+    def _arrow_schema(self, df: pd.DataFrame) -> pa.Schema:
+        # Types follow the pandas dtypes, so an empty first frame still gives numeric columns their types;
+        # only object columns without any value (Arrow's null type) are taken to be text
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        return pa.schema([pa.field(field.name, pa.string()) if pa.types.is_null(field.type) else field for field in table.schema])
+
+    def _arrow_table(self, df: pd.DataFrame) -> pa.Table:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        widened = []
+        for field in self._schema:
+            column = table.column(field.name)
+            if column.type == field.type or column.null_count == len(column):
+                continue
+            try:
+                column.cast(field.type)
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+                widened.append(pa.field(field.name, _widened_type(field.type, column.type)))
+        if widened:
+            # e.g. an int64 videoID column meeting float IDs: rewrite what was written so far with the wider types
+            replacements = {field.name: field for field in widened}
+            self._widen(pa.schema([replacements.get(field.name, field) for field in self._schema]))
+        arrays = []
+        for field in self._schema:
+            column = table.column(field.name)
+            if column.type == field.type:
+                arrays.append(column)
+            elif column.null_count == len(column):
+                arrays.append(pa.nulls(len(column), field.type))
+            else:
+                try:
+                    arrays.append(column.cast(field.type))
+                except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+                    raise ValueError(f"Column '{field.name}' cannot be written to {self.path} as {field.type}: {e}")
+        return pa.Table.from_arrays(arrays, schema=self._schema)
+
+    def _new_arrow_writer(self, schema: pa.Schema):
+        if self.format == "parquet":
+            return pq.ParquetWriter(self._tmp_path, schema, compression="zstd")
+        return pa.ipc.new_file(self._tmp_path, schema, options=pa.ipc.IpcWriteOptions(compression="zstd"))
+
+    def _widen(self, schema: pa.Schema):
+        """
+        Switches to a wider schema: the row groups already written are copied batch by batch into a new file.
+        """
+        self._writer.close()
+        old_path = f"{self._tmp_path}.old"
+        os.replace(self._tmp_path, old_path)
+        self._schema = schema
+        self._writer = self._new_arrow_writer(schema)
+        try:
+            if self.format == "parquet":
+                for batch in pq.ParquetFile(old_path).iter_batches():
+                    self._writer.write_table(pa.Table.from_batches([batch]).cast(schema))
+            else:
+                with pa.memory_map(old_path) as source:
+                    reader = pa.ipc.open_file(source)
+                    for i in range(reader.num_record_batches):
+                        self._writer.write_table(pa.Table.from_batches([reader.get_batch(i)]).cast(schema))
+        finally:
+            os.remove(old_path)
+        self._buffer[:] = [table.cast(schema) for table in self._buffer]
+
+    def _open(self, df: pd.DataFrame):
+        self.columns = list(df.columns)
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+        if self.format in ("parquet", "arrow"):
+            self._schema = self._arrow_schema(df)
+            self._writer = self._new_arrow_writer(self._schema)
+        elif self.format == "excel":
+            from openpyxl import Workbook
+
+            self._writer = Workbook(write_only=True)
+            self._sheet = self._writer.create_sheet()
+            self._sheet.append(self.columns)
+        else:
+            self._file = open(self._tmp_path, "w", encoding="utf-8", newline="")
+            if self.format == "csv":
+                df.iloc[:0].to_csv(self._file, index=False)
+            else:
+                self._file.write("[")
+
+    def write(self, df: pd.DataFrame):
+        """
+        Appends the rows of df; the first call fixes the columns, later frames are aligned to them.
+        """
+        if self.columns is None:
+            self._open(df)
+        df = df.reindex(columns=self.columns)
+        if not len(df):
+            return
+        if self.format in ("parquet", "arrow"):
+            self._buffer.append(self._arrow_table(df))
+            self._buffered_rows += len(df)
+            if self._buffered_rows >= self.row_group_rows:
+                self._flush()
+        elif self.format == "excel":
+            if self.rows_written + len(df) >= EXCEL_MAX_ROWS:
+                raise ValueError(f"{self.path} would have more rows than an Excel sheet can hold")
+            for row in df.astype(object).where(df.notna(), None).values.tolist():
+                self._sheet.append(row)
+        elif self.format == "csv":
+            df.to_csv(self._file, header=False, index=False)
+        else:
+            records = df.to_json(orient="records", force_ascii=False)[1:-1]
+            self._file.write(("," if self.rows_written else "") + records)
+        self.rows_written += len(df)
+
+    def _flush(self):
+        if self._buffer:
+            self._writer.write_table(pa.concat_tables(self._buffer))
+        self._buffer = []
+        self._buffered_rows = 0
+
+    def _close_handles(self):
+        if self._writer is not None and self.format != "excel":
+            self._writer.close()
+        if self._file is not None:
+            self._file.close()
+        self._writer = self._file = None
+
+    def close(self) -> int:
+        """
+        Finishes the table and moves it to its final path. Returns the number of rows written.
+        """
+        if self.columns is None:
+            self._open(pd.DataFrame())
+        if self.format == "excel":
+            self._writer.save(self._tmp_path)
+        elif self.format in ("parquet", "arrow"):
+            self._flush()
+        elif self.format == "json":
+            self._file.write("]")
+        self._close_handles()
+        if os.path.isdir(self.path):
+            shutil.rmtree(self.path)
+        os.replace(self._tmp_path, self.path)
+        return self.rows_written
+
+    def abort(self):
+        """
+        Drops a partly written table, leaving any previous output at path untouched.
+        """
+        self._buffer = []
+        self._close_handles()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
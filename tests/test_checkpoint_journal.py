@@ -0,0 +1,28 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from checkpoint_journal import CheckpointJournal
+
+def test_records_after_a_torn_line_are_replayed(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = CheckpointJournal(path)
+    journal.append_batch([0, 1], ["Primary Flashcard", "Secondary Flashcard"], "{}")
+    journal.close()
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"row": 2, "classifica')
+
+    journal = CheckpointJournal(path)
+    journal.append_batch([2, 3], ["Non-Relevant Flashcard", "Primary Flashcard"], "{}")
+    journal.close()
+    assert CheckpointJournal.replay(path) == {0: "Primary Flashcard", 1: "Secondary Flashcard", 2: "Non-Relevant Flashcard", 3: "Primary Flashcard"}
+
+def test_a_journal_torn_inside_its_only_line_starts_empty(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('{"row": 0')
+    journal = CheckpointJournal(path)
+    journal.append_batch([5], ["Primary Flashcard"], "{}")
+    journal.close()
+    assert CheckpointJournal.replay(path) == {5: "Primary Flashcard"}
@@ -0,0 +1,58 @@
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bedrock_llm_run1_step4 import process_bb_video_titles
+from benchmark_fixtures import FakeBedrockClient
+from prompt_packing import max_output_tokens
+
+class CappedAnswerClient(FakeBedrockClient):
+    """
+    Cuts every answer off at maxTokens when it classifies more than max_cards cards or gets less than min_tokens.
+    """
+
+    def __init__(self, max_cards=None, min_tokens=None):
+        super().__init__(latency_ms=0, jitter_ms=0, throttle_rate=0, malformed_rate=0)
+        self.max_cards = max_cards
+        self.min_tokens = min_tokens
+        self.requests = []
+
+    def converse(self, modelId=None, messages=None, system=None, inferenceConfig=None, **kwargs):
+        response = super().converse(modelId, messages, system, inferenceConfig, **kwargs)
+        n_cards = messages[0]["content"][0]["text"].count("\nFlashcard_")
+        self.requests.append((n_cards, inferenceConfig["maxTokens"]))
+        if (self.max_cards and n_cards > self.max_cards) or (self.min_tokens and inferenceConfig["maxTokens"] < self.min_tokens):
+            content = response["output"]["message"]["content"][0]
+            content["text"] = content["text"][: len(content["text"]) // 2]
+            response["stopReason"] = "max_tokens"
+        return response
+
+def _flashcards(n):
+    return pd.DataFrame({
+        "videoTitle": ["Video 1"] * n,
+        "cadmoreAlternateID": ["cad-1"] * n,
+        "Flashcard": [f"Card {i} about the thyroid" for i in range(n)],
+    })
+
+def test_output_budget_fits_an_indented_answer():
+    assert max_output_tokens(5) >= 100 + 5 * 15
+    assert max_output_tokens(40) >= 40 * 20
+
+def test_truncated_batches_are_split_instead_of_marked_no_class(tmp_path):
+    data = _flashcards(10)
+    client = CappedAnswerClient(max_cards=3)
+    processed = process_bb_video_titles(data, {"cad-1": "Thyroid transcript."}, output_dir=str(tmp_path), bedrock_client=client)
+    assert processed == 1
+    assert "No Class" not in set(data["Flashcard Classification"])
+    assert data["Flashcard Classification"].notna().all()
+    assert max(n_cards for n_cards, _ in client.requests[1:]) <= 5
+
+def test_truncated_single_card_is_retried_with_a_larger_budget(tmp_path):
+    data = _flashcards(1)
+    client = CappedAnswerClient(min_tokens=4 * max_output_tokens(1))
+    process_bb_video_titles(data, {"cad-1": "Thyroid transcript."}, output_dir=str(tmp_path), bedrock_client=client)
+    assert [max_tokens for _, max_tokens in client.requests] == [max_output_tokens(1) * 2 ** i for i in range(3)]
+    assert data["Flashcard Classification"].iloc[0] != "No Class"
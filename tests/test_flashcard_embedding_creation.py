@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flashcard_embedding_creation import create_flashcard_embeddings
+
+def test_sheet_without_flashcards_is_reported(tmp_path):
+    excel_path = str(tmp_path / "anki.xlsx")
+    with pd.ExcelWriter(excel_path, engine="openpyxl") as writer:
+        pd.DataFrame({"deck": ["Endocrinology"]}).to_excel(writer, sheet_name="Decks", index=False)
+        pd.DataFrame({"id": [], "text_and_extra": []}).to_excel(writer, sheet_name="Cards", index=False)
+    result = create_flashcard_embeddings(excel_path, str(tmp_path / "store"))
+    assert result == {"status": "error", "message": f"No flashcards in {excel_path}"}
+    assert not os.path.exists(tmp_path / "store")
@@ -0,0 +1,43 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chunk_encoding import iter_encoded_entries
+from flashcard_search import build_search_index
+
+BACKENDS = ("exact", "ivf", "float16", "int8")
+
+def _unit_rows(n, dimension=32, seed=0):
+    rows = np.random.default_rng(seed).standard_normal((n, dimension)).astype(np.float32)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_entries_without_chunks_search_to_no_matches(backend):
+    index = build_search_index(_unit_rows(200), backend=backend)
+    encoded = list(iter_encoded_entries([("entry 1", []), ("entry 2", [])], lambda texts: _unit_rows(len(texts))))
+    for _, chunks, embeddings in encoded:
+        assert index.search(embeddings) == []
+        assert index.search(embeddings, candidate_ids=np.arange(10)) == []
+
+def _clustered_rows(n, centers, noise, rng):
+    rows = centers[rng.integers(0, len(centers), n)] + noise * rng.standard_normal((n, centers.shape[1]))
+    return (rows / np.linalg.norm(rows, axis=1, keepdims=True)).astype(np.float32)
+
+@pytest.mark.parametrize("backend", ("float16", "int8"))
+@pytest.mark.parametrize("with_candidates", (False, True))
+def test_reranked_quantized_search_keeps_the_exact_matches(backend, with_candidates):
+    rng = np.random.default_rng(0)
+    centers = _unit_rows(20, dimension=256, seed=1)
+    # The noise puts the scores within a cluster on both sides of the threshold
+    flashcards = _clustered_rows(3000, centers, 0.05, rng)
+    queries = _clustered_rows(100, centers, 0.05, rng)
+    candidate_ids = np.arange(0, len(flashcards), 3) if with_candidates else None
+    exact = build_search_index(flashcards, backend="exact").search(queries, top_k=len(flashcards), threshold=0.65, candidate_ids=candidate_ids)
+    quantized = build_search_index(flashcards, backend=backend).search(queries, top_k=len(flashcards), threshold=0.65, candidate_ids=candidate_ids)
+    assert sum(len(matches) for matches in exact) > len(queries)
+    for quantized_matches, exact_matches in zip(quantized, exact):
+        assert {i for i, _ in quantized_matches} == {i for i, _ in exact_matches}
@@ -0,0 +1,63 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from job_queue import job_artifacts, job_workspace
+from pipeline_jobs import COMPUTED_DEFAULT, JOB_OPTION_TARGETS, prepare_job_params, source_signature
+
+STEP2_PARAMS = {"json_file_path": "products/Step_1.json", "embeddings_store_path": "store", "output_path": "mapped.parquet"}
+
+def test_paths_are_resolved_in_the_workspace(tmp_path):
+    params = prepare_job_params("step2", dict(STEP2_PARAMS, top_k=5), str(tmp_path), "job1")
+    root = os.path.realpath(str(tmp_path))
+    assert params["json_file_path"] == os.path.join(root, "products", "Step_1.json")
+    assert params["output_path"] == os.path.join(job_workspace(str(tmp_path), "job1"), "mapped.parquet")
+    assert params["top_k"] == 5
+
+@pytest.mark.parametrize("params", [
+    dict(STEP2_PARAMS, output_path="/etc/passwd"),
+    dict(STEP2_PARAMS, output_path="../../elsewhere.parquet"),
+    dict(STEP2_PARAMS, json_file_path="/etc/passwd"),
+    dict(STEP2_PARAMS, embedding_model="not-a-request-parameter"),
+    dict(STEP2_PARAMS, top_k="20"),
+    {"json_file_path": "products/Step_1.json"},
+])
+def test_invalid_step2_params_are_rejected(tmp_path, params):
+    with pytest.raises(ValueError):
+        prepare_job_params("step2", params, str(tmp_path), "job1")
+
+def test_artifacts_outside_the_job_workspace_are_not_listed(tmp_path):
+    job_dir = job_workspace(str(tmp_path), "job1")
+    os.makedirs(job_dir)
+    output = os.path.join(job_dir, "mapped.csv")
+    with open(output, "w") as f:
+        f.write("a\n1\n")
+    other_job = tmp_path / "jobs" / "job2"
+    other_job.mkdir()
+    (other_job / "secret.csv").write_text("b\n")
+    job = {"id": "job1", "result": {"output_file": output, "output_files": ["/etc/passwd", str(other_job / "secret.csv")]}}
+    assert [artifact["path"] for artifact in job_artifacts(job, str(tmp_path))] == [output]
+
+def test_job_requests_are_checked_without_importing_the_step_modules(tmp_path, monkeypatch):
+    for module_name in ("transcript_flashcardmapping_step2", "main_video"):
+        monkeypatch.delitem(sys.modules, module_name, raising=False)
+    prepare_job_params("step2", STEP2_PARAMS, str(tmp_path), "job1")
+    prepare_job_params("classification", {"step2_output_path": "mapped.parquet", "bb_transcripts_file": "bb.json", "classified_output_dir": "out", "classified_output_file": "classified.xlsx", "max_in_flight": 4}, str(tmp_path), "job2")
+    prepare_job_params("pipeline", {"bb_transcripts_file": "bb.json", "bb_hierarchical_file": "bb_tree.json", "anki_excel_file": "anki.xlsx"}, str(tmp_path), "job3")
+    assert "transcript_flashcardmapping_step2" not in sys.modules
+    assert "main_video" not in sys.modules
+
+@pytest.mark.parametrize("kind", sorted(JOB_OPTION_TARGETS))
+def test_source_signature_matches_the_imported_function(kind):
+    import importlib
+    import inspect
+
+    module_name, function_name, _ = JOB_OPTION_TARGETS[kind]
+    from_source = source_signature(module_name, function_name).parameters
+    imported = inspect.signature(getattr(importlib.import_module(module_name), function_name)).parameters
+    assert list(from_source) == list(imported)
+    for name, parameter in from_source.items():
+        assert parameter.default == imported[name].default or parameter.default == COMPUTED_DEFAULT
@@ -0,0 +1,38 @@
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bedrock_llm_run1_step4 import process_bb_video_titles
+from benchmark_fixtures import FakeBedrockClient
+from llm_response_cache import LLMResponseCache
+
+def _classify(output_dir, client, cache):
+    output_dir.mkdir()
+    data = pd.DataFrame({
+        "videoTitle": ["Video 1"] * 3,
+        "cadmoreAlternateID": ["cad-1"] * 3,
+        "Flashcard": [f"Card {i} about the thyroid" for i in range(3)],
+    })
+    process_bb_video_titles(data, {"cad-1": "Thyroid transcript."}, output_dir=str(output_dir), bedrock_client=client, response_cache=cache)
+    return data
+
+def test_unparseable_answers_are_not_cached(tmp_path):
+    cache = LLMResponseCache(str(tmp_path / "cache.sqlite"))
+    try:
+        malformed = _classify(tmp_path / "run1", FakeBedrockClient(latency_ms=0, jitter_ms=0, throttle_rate=0, malformed_rate=1), cache)
+        assert set(malformed["Flashcard Classification"]) == {"No Class"}
+
+        client = FakeBedrockClient(latency_ms=0, jitter_ms=0, throttle_rate=0, malformed_rate=0)
+        rerun = _classify(tmp_path / "run2", client, cache)
+        assert client.calls == 1
+        assert "No Class" not in set(rerun["Flashcard Classification"])
+
+        replay_client = FakeBedrockClient(latency_ms=0, jitter_ms=0, throttle_rate=0, malformed_rate=1)
+        replayed = _classify(tmp_path / "run3", replay_client, cache)
+        assert replay_client.calls == 0
+        assert replayed["Flashcard Classification"].tolist() == rerun["Flashcard Classification"].tolist()
+    finally:
+        cache.close()
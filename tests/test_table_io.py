@@ -0,0 +1,77 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cleaning_step5_merge import clean_and_merge_files
+from table_io import TableWriter, read_table
+
+def _rows(video_ids, classification):
+    return pd.DataFrame({
+        "videoID": video_ids,
+        "Flashcard ID": [f"card-{i}" for i in range(len(video_ids))],
+        "Score": [0.7 + 0.01 * i for i in range(len(video_ids))],
+        "Flashcard Classification": [classification] * len(video_ids),
+    })
+
+@pytest.mark.parametrize("extension", [".parquet", ".arrow"])
+def test_empty_first_frame_keeps_the_pandas_types(tmp_path, extension):
+    path = str(tmp_path / f"out{extension}")
+    writer = TableWriter(path, row_group_rows=1)
+    writer.write(_rows([1, 2], "No Class").iloc[:0])
+    writer.write(_rows([1, 2], "No Class"))
+    assert writer.close() == 2
+    df = read_table(path)
+    assert df["Score"].dtype == "float64"
+    assert df["videoID"].tolist() == [1, 2]
+
+@pytest.mark.parametrize("extension", [".parquet", ".arrow"])
+def test_int_column_is_widened_for_float_values(tmp_path, extension):
+    path = str(tmp_path / f"out{extension}")
+    writer = TableWriter(path, row_group_rows=1)
+    writer.write(_rows([1, 2], "A"))
+    writer.write(_rows([3.5, None], "A"))
+    writer.write(_rows(["x-7"], "A"))
+    assert writer.close() == 5
+    video_ids = read_table(path)["videoID"].tolist()
+    assert video_ids[:3] == ["1", "2", "3.5"] and pd.isna(video_ids[3]) and video_ids[4] == "x-7"
+
+def test_merge_with_an_empty_first_no_class_chunk(tmp_path):
+    first = _rows([1, 2, 3], "Relevant")
+    second = pd.concat([_rows([4.5], "No Class"), _rows([5], "Relevant")], ignore_index=True)
+    first.to_csv(tmp_path / "a.csv", index=False)
+    second.to_csv(tmp_path / "b.csv", index=False)
+    result = clean_and_merge_files(
+        [str(tmp_path / "a.csv"), str(tmp_path / "b.csv")],
+        merged_output=None,
+        no_class_output=str(tmp_path / "no_class.parquet"),
+        with_class_output=str(tmp_path / "with_class.parquet"),
+        chunk_rows=2,
+        read_workers=1,
+    )
+    assert result["status"] == "success", result
+    no_class = read_table(str(tmp_path / "no_class.parquet"))
+    assert no_class["videoID"].tolist() == [4.5]
+    assert no_class["Score"].dtype == "float64"
+    assert read_table(str(tmp_path / "with_class.parquet"))["videoID"].tolist() == [1, 2, 3, 5]
+
+def test_rows_missing_an_id_are_not_deduplicated(tmp_path):
+    pd.DataFrame({
+        "videoID": [None, None, 7, 7, 8, 8],
+        "Flashcard ID": ["card-1", "card-1", "card-2", "card-2", None, None],
+        "Flashcard Classification": ["Relevant"] * 6,
+    }).to_csv(tmp_path / "a.csv", index=False)
+    result = clean_and_merge_files(
+        [str(tmp_path / "a.csv")],
+        merged_output=str(tmp_path / "merged.csv"),
+        no_class_output=str(tmp_path / "no_class.csv"),
+        with_class_output=str(tmp_path / "with_class.csv"),
+        read_workers=1,
+    )
+    assert result["status"] == "success", result
+    assert result["duplicate_rows"] == 1
+    merged = read_table(str(tmp_path / "merged.csv"))
+    assert merged["Flashcard ID"].fillna("").tolist() == ["card-1", "card-1", "card-2", "", ""]
@@ -0,0 +1,68 @@
+import json
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from product_files import load_entries
+from video_delta import carry_forward_results, commit_video_manifest, detect_video_changes
+
+def _entry(category, transcript="Thyroid hormone regulates metabolism."):
+    return {
+        "categoryTitle": category,
+        "subcategoryTitle": f"{category} 1",
+        "videoID": 1,
+        "Id": "cad-1",
+        "videoTitle": "Video 1",
+        "product": "Step 1",
+        "videoUrl": "https://example.org/videos/1",
+        "Transcript": transcript,
+    }
+
+def _result_rows(entries):
+    return pd.DataFrame([
+        {"categoryTitle": e["categoryTitle"], "subcategoryTitle": e["subcategoryTitle"], "videoID": e["videoID"], "product": e["product"], "Flashcard ID": 7, "Score": 0.9}
+        for e in entries
+    ])
+
+def _detect(tmp_path, entries):
+    json_path = tmp_path / "Step_1.json"
+    json_path.write_text(json.dumps(entries))
+    result = detect_video_changes(str(json_path), str(tmp_path / "manifest.json"), str(tmp_path / "delta.json"), str(tmp_path / "changes.json"))
+    assert result["status"] == "success", result
+    return json_path, result
+
+def test_video_in_two_placements_is_unchanged_on_rerun(tmp_path):
+    entries = [_entry("Cardio"), _entry("Renal")]
+    json_path, first = _detect(tmp_path, entries)
+    assert first["added"] == 2
+    _result_rows(entries).to_csv(tmp_path / "results.csv", index=False)
+    assert commit_video_manifest(str(json_path), str(tmp_path / "manifest.json"))["videos"] == 2
+
+    _, rerun = _detect(tmp_path, entries)
+    assert (rerun["added"], rerun["changed"], rerun["unchanged"], rerun["removed"]) == (0, 0, 2, 0)
+    assert load_entries(str(tmp_path / "delta.json")) == []
+
+    # Nothing changed, so the carried rows are the previous rows, without duplicates
+    _result_rows([]).reindex(columns=_result_rows(entries).columns).to_csv(tmp_path / "delta_results.csv", index=False)
+    result = carry_forward_results(str(tmp_path / "results.csv"), str(tmp_path / "delta_results.csv"), str(tmp_path / "results.csv"), str(tmp_path / "changes.json"))
+    assert result["status"] == "success", result
+    assert len(pd.read_csv(tmp_path / "results.csv")) == 2
+
+def test_only_the_changed_placement_is_reprocessed(tmp_path):
+    entries = [_entry("Cardio"), _entry("Renal")]
+    json_path, _ = _detect(tmp_path, entries)
+    _result_rows(entries).to_csv(tmp_path / "results.csv", index=False)
+    commit_video_manifest(str(json_path), str(tmp_path / "manifest.json"))
+
+    entries[1] = _entry("Renal", transcript="Kidney filtration depends on pressure.")
+    _, rerun = _detect(tmp_path, entries)
+    assert (rerun["changed"], rerun["unchanged"]) == (1, 1)
+    assert [entry["categoryTitle"] for entry in load_entries(str(tmp_path / "delta.json"))] == ["Renal"]
+
+    _result_rows([entries[1]]).to_csv(tmp_path / "delta_results.csv", index=False)
+    carry_forward_results(str(tmp_path / "results.csv"), str(tmp_path / "delta_results.csv"), str(tmp_path / "results.csv"), str(tmp_path / "changes.json"))
+    merged = pd.read_csv(tmp_path / "results.csv")
+    assert sorted(merged["categoryTitle"]) == ["Cardio", "Renal"]
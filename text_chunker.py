@@ -0,0 +1,111 @@
+import hashlib
+import math
+import re
+
+# Abbreviations whose trailing period does not end a sentence
+ABBREVIATIONS = {
+    "dr", "mr", "mrs", "ms", "prof", "st", "vs", "etc", "e.g", "i.e", "approx", "fig", "figs", "no", "vol",
+    "al", "ca", "cf", "min", "max", "mg", "mcg", "kg", "ml", "dl", "mm", "cm", "hr", "hrs", "wk", "yr", "yrs",
+    "jan", "feb", "mar", "apr", "jun", "jul", "aug", "sep", "sept", "oct", "nov", "dec", "u.s", "a.m", "p.m",
+}
+SENTENCE_BOUNDARY = re.compile(r"[.!?][\"')\]]*\s+(?=[\"'(\[]?[A-Z0-9])")
+
+def split_sentences(text: str) -> list:
+    """
+    Regex sentence splitter: breaks after . ! ? followed by whitespace and a capital letter or digit,
+    except after known abbreviations and single-letter initials. Needs no model download.
+    """
+    sentences = []
+    start = 0
+    for boundary in SENTENCE_BOUNDARY.finditer(text):
+        end = boundary.start() + 1
+        if text[end - 1] == ".":
+            word_start = max(text.rfind(" ", start, end) + 1, start)
+            last_word = text[word_start:end - 1].lower()
+            if last_word in ABBREVIATIONS or (len(last_word) == 1 and last_word.isalpha()):
+                continue
+        sentences.append(text[start:boundary.end()].strip())
+        start = boundary.end()
+    tail = text[start:].strip()
+    if tail:
+        sentences.append(tail)
+    return [sentence for sentence in sentences if sentence]
+
+def word_token_counter(sentences) -> list:
+    """
+    Counts whitespace-separated words, the unit split_text_into_paragraphs has always used.
+    """
+    return [len(sentence.split()) for sentence in sentences]
+
+def tokenizer_token_counter(tokenizer):
+    """
+    Builds a counter of tokenizer tokens (special tokens excluded) from a Hugging Face tokenizer,
+    e.g. SentenceTransformer(...).tokenizer. Sentences of a transcript are tokenized in one batch call.
+    """
+    def count(sentences):
+        if not sentences:
+            return []
+        return [len(ids) for ids in tokenizer(list(sentences), add_special_tokens=False)["input_ids"]]
+    return count
+
+def _split_long_sentence(sentence: str, length: int, max_tokens: int) -> list:
+    """
+    Splits a sentence longer than max_tokens into even word windows of about max_tokens each.
+    """
+    words = sentence.split()
+    pieces = math.ceil(length / max_tokens)
+    per_piece = math.ceil(len(words) / pieces)
+    return [" ".join(words[i:i + per_piece]) for i in range(0, len(words), per_piece)]
+
+def _chunk(text: str, max_tokens: int, overlap_sentences: int, token_counter) -> list:
+    sentences = split_sentences(text)
+    lengths = token_counter(sentences)
+
+    units = []
+    for sentence, length in zip(sentences, lengths):
+        if length > max_tokens and len(sentence.split()) > 1:
+            pieces = _split_long_sentence(sentence, length, max_tokens)
+            units.extend(zip(pieces, token_counter(pieces)))
+        else:
+            units.append((sentence, length))
+
+    chunks = []
+    current = []
+    current_length = 0
+    for unit, length in units:
+        if current and current_length + length > max_tokens:
+            chunks.append(" ".join(sentence for sentence, _ in current))
+            # Carry the last sentences over as context, if they leave room for the next one
+            carried = current[-overlap_sentences:] if overlap_sentences else []
+            while carried and sum(n for _, n in carried) + length > max_tokens:
+                carried = carried[1:]
+            current = list(carried)
+            current_length = sum(n for _, n in current)
+        current.append((unit, length))
+        current_length += length
+    if current:
+        chunks.append(" ".join(sentence for sentence, _ in current))
+    return chunks
+
+def chunk_text(text: str, max_tokens: int = 150, overlap_sentences: int = 0, token_counter=word_token_counter) -> list:
+    """
+    Packs sentences into chunks of at most max_tokens (as measured by token_counter).
+    With overlap_sentences, each chunk starts with up to that many sentences from the end of the previous one.
+    """
+    if not text or not isinstance(text, str):
+        return []
+    return _chunk(text, max_tokens, overlap_sentences, token_counter)
+
+def chunk_id(transcript_key: str, index: int, chunk: str) -> str:
+    """
+    Stable ID of the index-th chunk of a transcript: the same transcript and chunking settings always give the same IDs.
+    """
+    return hashlib.sha1(f"{transcript_key}\0{index}\0{chunk}".encode("utf-8")).hexdigest()[:16]
+
+def chunk_text_with_ids(text: str, max_tokens: int = 150, overlap_sentences: int = 0, token_counter=word_token_counter, transcript_key: str = None) -> list:
+    """
+    Like chunk_text, returning (chunk_id, chunk) pairs. transcript_key defaults to a hash of the text.
+    """
+    if transcript_key is None:
+        transcript_key = hashlib.sha1(str(text).encode("utf-8")).hexdigest()
+    return [(chunk_id(transcript_key, i, chunk), chunk) for i, chunk in enumerate(chunk_text(text, max_tokens, overlap_sentences, token_counter))]
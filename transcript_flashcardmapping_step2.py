@@ -1,120 +1,159 @@
-import os
-import json
-import nltk
-from nltk import sent_tokenize
-import pandas as pd
-from sklearn.metrics.pairwise import cosine_similarity
+import time
 from tqdm import tqdm
-import numpy as np
-import pickle
-import torch
-from sentence_transformers import SentenceTransformer
+from flashcard_search import build_store_search_index
+from flashcard_embedding_store import load_flashcard_embeddings
+from flashcard_metadata_index import CandidateSelector
+from chunk_encoding import iter_encoded_entries
+from product_files import group_placements, load_product_file, transcript_hash
+from embedding_cache import ChunkEmbeddingCache
+from step2_result_writer import Step2ResultWriter, entry_metadata, infer_metadata_types
+from text_chunker import chunk_text, chunk_text_with_ids, tokenizer_token_counter, word_token_counter
+from model_registry import get_embedding_model
+from metrics import REGISTRY, record_encoder_batch, span, timed
 
-nltk.download('punkt')
-
-# Automatically use GPU if available, otherwise fall back to CPU
-device = "cuda" if torch.cuda.is_available() else "cpu"
-
-def split_text_into_paragraphs(text, max_paragraph_length=150):
+def split_text_into_paragraphs(text, max_paragraph_length=150, token_counter=word_token_counter, overlap_sentences=0):
     """
-    Split large text into paragraphs with a specified max length.
+    Split large text into paragraphs of at most max_paragraph_length, counted in words
+    or, with a tokenizer_token_counter, in tokenizer tokens.
     """
-    sentences = sent_tokenize(text)
-    paragraphs = []
-    current_paragraph = []
-    current_length = 0
-
-    for sentence in sentences:
-        sentence_length = len(sentence.split())
-        if current_length + sentence_length > max_paragraph_length:
-            paragraphs.append(" ".join(current_paragraph))
-            current_paragraph = []
-            current_length = 0
-        current_paragraph.append(sentence)
-        current_length += sentence_length
-    if current_paragraph:
-        paragraphs.append(" ".join(current_paragraph))
-
-    return paragraphs
+    return chunk_text(text, max_tokens=max_paragraph_length, overlap_sentences=overlap_sentences, token_counter=token_counter)
 
-embedding_model = SentenceTransformer('abhinand/MedEmbed-large-v0.1', device=device)
-
-def process_step2(json_file_path: str, embeddings_pkl_path: str, output_excel_path: str, model_name: str = 'abhinand/MedEmbed-large-v0.1', threshold: float = 0.65):
+@timed("step2.process_step2")
+def process_step2(json_file_path: str, embeddings_pkl_path: str, output_excel_path: str, model_name: str = 'abhinand/MedEmbed-large-v0.1', threshold: float = 0.65, top_k: int = 20, search_backend: str = "exact", search_options: dict = None, encode_batch_size: int = 64, max_paragraph_length: int = 150, chunk_tokens: int = None, chunk_overlap_sentences: int = 0, embedding_cache_path: str = None, embedding_cache_max_bytes: int = 2 * 1024 ** 3, row_group_rows: int = 50_000, embedding_model=None, embeddings_data: dict = None, search_index=None, progress_callback=None, metadata_prefilter: bool = False, prefilter_fallback: bool = True):
     """
     Processes the JSON output from step 1 and finds matching flashcards.
+    The output format follows the extension of output_excel_path (.parquet, .arrow, .xlsx or .csv).
+    Matches are streamed out in row groups of row_group_rows; .parquet output is a directory of part files.
+    embeddings_pkl_path is an embedding store directory (or a legacy .pkl); a store built with another model than model_name is rejected.
+    search_backend selects the flashcard index ("exact", "ivf", or the quantised "float16" / "int8"); search_options are
+    passed to it (e.g. nlist, nprobe for "ivf", rerank for the quantised ones).
+    Transcripts are chunked into paragraphs of max_paragraph_length words or, with chunk_tokens, of that many
+    tokenizer tokens of the embedding model; chunk_overlap_sentences repeats trailing sentences at the start of the next chunk.
+    Each distinct transcript of the product file is chunked, encoded and searched once, and its matches are
+    written for every entry (placement) that uses it; legacy product files (a plain list of entries) are deduplicated on load.
+    Transcript chunks are encoded across transcripts in length-sorted batches of encode_batch_size.
+    With embedding_cache_path, chunk embeddings are read from and written to an on-disk cache, so re-runs
+    (e.g. with another threshold) skip the encoder for transcripts already seen.
+    The embedding model comes from the shared model registry unless embedding_model is given, and is not loaded
+    when every chunk is found in the cache. Preloaded embeddings_data and search_index can be passed in to share them across calls;
+    progress_callback(n) is called with the number of entries finished since the last call.
+    With metadata_prefilter, each entry is only searched against the flashcards the store's metadata index
+    selects for its product, categoryTitle and subcategoryTitle; with prefilter_fallback, an entry whose
+    candidates are empty or give no match at all is searched against the full deck instead.
     """
     try:
-        # Load the embedding model with device selection
-        embedding_model = SentenceTransformer(model_name, device=device)
+        # The shared embedding model is only loaded once a chunk actually needs encoding
+        def get_model():
+            return embedding_model if embedding_model is not None else get_embedding_model(model_name)
+        
+        def encode(texts):
+            encode_start = time.perf_counter()
+            embeddings = get_model().encode(texts, batch_size=encode_batch_size)
+            record_encoder_batch(len(texts), time.perf_counter() - encode_start, model_name)
+            return embeddings
         
-        # Load the embeddings and flashcards
-        with open(embeddings_pkl_path, 'rb') as f:
-            embeddings_data = pickle.load(f)
-            flashcard_ids = embeddings_data['flashcard_ids']
-            flashcards = embeddings_data['flashcards']
-            flashcard_embeddings_np = embeddings_data['flashcard_embeddings']
+        # Load the embeddings and flashcards (memory-mapped for stores)
+        if embeddings_data is None:
+            with span("step2.load_store"):
+                embeddings_data = load_flashcard_embeddings(embeddings_pkl_path, expected_model_name=model_name)
+        flashcard_ids = embeddings_data['flashcard_ids']
+        flashcards = embeddings_data['flashcards']
+        flashcard_embeddings_np = embeddings_data['flashcard_embeddings']
         
         # Ensure data alignment
         assert len(flashcard_ids) == len(flashcards) == len(flashcard_embeddings_np), "Mismatch in data lengths"
         
-        # Load JSON file
-        with open(json_file_path, 'r', encoding='utf-8') as file:
-            data = json.load(file)
+        # Build the flashcard search index once for all entries
+        if search_index is None:
+            with span("step2.build_index"):
+                search_index = build_store_search_index(embeddings_data, backend=search_backend, **(search_options or {}))
+        
+        # Candidate flashcards per entry from the store's metadata index
+        candidate_selector = None
+        if metadata_prefilter:
+            if embeddings_data.get('metadata_index'):
+                candidate_selector = CandidateSelector(embeddings_data['metadata_index'])
+            else:
+                print("The embedding store has no metadata index; searching the full deck")
+        prefilter_counter = REGISTRY.counter("step2_prefilter_entries_total", "Entries searched against a metadata candidate subset, by outcome")
+        candidate_fraction = REGISTRY.histogram("step2_prefilter_candidate_fraction", "Share of the deck selected as candidates per entry", (0.01, 0.02, 0.05, 0.1, 0.25, 0.5, 1.0))
+        
+        # Load the step 1 product file: each distinct transcript once, with the entries (placements) that use it
+        product_data = load_product_file(json_file_path)
+        placements = product_data["placements"]
+        transcript_groups = group_placements(product_data)
+        print(f"{len(placements)} entries share {len(transcript_groups)} distinct transcripts")
+        
+        # Matches are streamed to disk in row groups as entries finish
+        result_writer = Step2ResultWriter(output_excel_path, flashcards, flashcard_ids, infer_metadata_types(placements), row_group_rows)
+        
+        # Chunk lengths are counted in words, or in tokenizer tokens with chunk_tokens
+        if chunk_tokens:
+            max_chunk_length, token_counter = chunk_tokens, tokenizer_token_counter(get_model().tokenizer)
+        else:
+            max_chunk_length, token_counter = max_paragraph_length, word_token_counter
+        
+        embedding_cache = None
+        if embedding_cache_path:
+            embedding_cache = ChunkEmbeddingCache(embedding_cache_path, model_name, max_chunk_length, embedding_cache_max_bytes)
+        
+        # Chunk every distinct transcript once, then encode the chunks in corpus-wide batches.
+        # Chunk IDs derive from the transcript hash, so the same transcript and settings give the same IDs in every run
+        def chunked_transcripts():
+            for text, group_entries in transcript_groups:
+                transcript_key = transcript_hash(text) if isinstance(text, str) else None
+                id_chunks = chunk_text_with_ids(text, max_chunk_length, chunk_overlap_sentences, token_counter, transcript_key)
+                yield (group_entries, [chunk_id for chunk_id, _ in id_chunks]), [chunk for _, chunk in id_chunks]
+        
+        encoded_transcripts = iter_encoded_entries(
+            chunked_transcripts(),
+            encode,
+            batch_size=encode_batch_size,
+            cache=embedding_cache,
+        )
         
-        all_results = []
+        progress = tqdm(total=len(placements), desc="Processing entries", disable=progress_callback is not None)
+        for (group_entries, chunk_ids), transcript_chunks, transcript_embeddings_np in encoded_transcripts:
+            # Find the top flashcards above threshold for each chunk; placements of the same transcript
+            # share the search, or with the prefilter the search of the same candidate subset
+            full_matches = None
+            subset_matches = {}
+            for entry in group_entries:
+                with span("step2.search"):
+                    if candidate_selector is None:
+                        if full_matches is None:
+                            full_matches = search_index.search(transcript_embeddings_np, top_k=top_k, threshold=threshold)
+                        chunk_matches = full_matches
+                    else:
+                        candidate_ids = candidate_selector.candidates(entry)
+                        candidate_fraction.observe(len(candidate_ids) / max(len(flashcards), 1))
+                        # The selector returns the same array for the same candidates
+                        if id(candidate_ids) not in subset_matches:
+                            subset_matches[id(candidate_ids)] = search_index.search(transcript_embeddings_np, top_k=top_k, threshold=threshold, candidate_ids=candidate_ids)
+                        chunk_matches = subset_matches[id(candidate_ids)]
+                        if prefilter_fallback and not any(chunk_matches):
+                            if full_matches is None:
+                                full_matches = search_index.search(transcript_embeddings_np, top_k=top_k, threshold=threshold)
+                            chunk_matches = full_matches
+                            prefilter_counter.inc(outcome="fallback")
+                        else:
+                            prefilter_counter.inc(outcome="restricted")
+                result_writer.add_entry(entry_metadata(entry), transcript_chunks, chunk_matches, chunk_ids)
+                progress.update(1)
+                if progress_callback is not None:
+                    progress_callback(1)
+        progress.close()
         
-        for entry in tqdm(data, desc="Processing entries"):
-            category_title = entry.get("categoryTitle", "")
-            subcategory_title = entry.get("subcategoryTitle", "")
-            video_id = entry.get("videoID", "")
-            cadmore_alternate_id = entry.get("Id", "")
-            video_title = entry.get("videoTitle", "Unnamed")
-            product = entry.get("product", "")
-            updated_status = entry.get("updatedStatus", "")
-            video_url = entry.get("videoUrl", "")
-            transcript_text = entry.get("Transcript", "")
-            
-            # Split transcript into chunks
-            transcript_chunks = split_text_into_paragraphs(transcript_text, max_paragraph_length=150)
-            
-            # Embed all transcript chunks at once for speed
-            transcript_embeddings_np = embedding_model.encode(transcript_chunks)
-            
-            # Compute similarity
-            similarity_matrix = cosine_similarity(transcript_embeddings_np, flashcard_embeddings_np)
-            
-            for i, transcript_chunk in enumerate(transcript_chunks):
-                scores = similarity_matrix[i]
-                indices = np.where(scores >= threshold)[0]
-                
-                flash_card_matches = [{
-                    "Flashcard": flashcards[j],
-                    "Flashcard ID": flashcard_ids[j],
-                    "Score": round(scores[j], 4),
-                } for j in indices]
-                
-                flash_card_matches = sorted(flash_card_matches, key=lambda x: x["Score"], reverse=True)[:20]
-                
-                for fc in flash_card_matches:
-                    all_results.append({
-                        "categoryTitle": category_title,
-                        "subcategoryTitle": subcategory_title,
-                        "videoID": video_id,
-                        "cadmoreAlternateID": cadmore_alternate_id,
-                        "videoTitle": video_title,
-                        "product": product,
-                        "videoUrl": video_url,
-                        "Update status": updated_status,
-                        "Transcript Chunk": transcript_chunk,
-                        "Flashcard": fc["Flashcard"],
-                        "Flashcard ID": fc["Flashcard ID"],
-                        "Score": fc["Score"],
-                    })
+        if embedding_cache is not None:
+            print(f"Chunk embedding cache: {embedding_cache.hits} hits, {embedding_cache.misses} misses")
+            REGISTRY.counter("embedding_cache_lookups_total", "Chunk embedding cache lookups").inc(embedding_cache.hits, result="hit")
+            REGISTRY.counter("embedding_cache_lookups_total", "Chunk embedding cache lookups").inc(embedding_cache.misses, result="miss")
+            embedding_cache.close()
         
-        df_all = pd.DataFrame(all_results)
-        df_all.to_excel(output_excel_path, index=False)
+        rows_written = result_writer.close()
+        print(f"Wrote {rows_written} flashcard matches to {output_excel_path}")
         
-        return {"status": "success", "message": "Step 2 processing completed", "output_file": output_excel_path}
+        return {"status": "success", "message": "Step 2 processing completed", "output_file": output_excel_path, "rows": rows_written}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import shutil
+import pandas as pd
+import pyarrow.parquet as pq
+from table_io import read_table, table_format, write_table
+from product_files import load_entries, pack_entries, save_product_file
+
+MANIFEST_FORMAT_VERSION = 2
+
+# Step 1 entry fields that together identify one placement of a video; step 2 and step 4 results carry them as columns
+PLACEMENT_FIELDS = ("product", "videoID", "categoryTitle", "subcategoryTitle")
+
+def _key_part(value) -> str:
+    # Missing values read back from a result table are NaN; 12 and 12.0 are the same ID
+    if value is None or (isinstance(value, float) and value != value):
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+def video_key(product, video_id, category_title="", subcategory_title="") -> str:
+    """
+    Identifies one video placement across runs: a video listed under two products, categories
+    or subcategories is two placements.
+    """
+    return "\0".join(_key_part(value) for value in (product, video_id, category_title, subcategory_title))
+
+def entry_key(entry: dict) -> str:
+    return video_key(*(entry.get(field, "") for field in PLACEMENT_FIELDS))
+
+def video_content_hash(entry: dict) -> str:
+    """
+    Hash of everything step 2 and step 4 read from a step 1 entry: the transcript text and all metadata.
+    """
+    return hashlib.sha256(json.dumps(entry, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+def placement_hashes(entries) -> dict:
+    """
+    {video key: content hash} of step 1 entries. Entries that share a key (e.g. a video listed twice
+    under the same subcategory) are hashed together, so a change to any of them changes the key.
+    """
+    grouped = {}
+    for entry in entries:
+        grouped.setdefault(entry_key(entry), []).append(video_content_hash(entry))
+    return {
+        key: hashes[0] if len(hashes) == 1 else hashlib.sha256("\0".join(sorted(hashes)).encode("utf-8")).hexdigest()
+        for key, hashes in grouped.items()
+    }
+
+def load_video_manifest(manifest_path: str) -> dict:
+    """
+    {video key: content hash} of the last completed run, empty when there was none.
+    A manifest of an older key format is ignored, so the next run processes every video again.
+    """
+    if not manifest_path or not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != MANIFEST_FORMAT_VERSION:
+        print(f"Ignoring video manifest {manifest_path} of format version {manifest.get('format_version')}")
+        return {}
+    return manifest.get("videos", {})
+
+def _write_json(path: str, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=4, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def detect_video_changes(json_file_paths, manifest_path: str, delta_json_path: str, changes_path: str, stale_output_dirs=()):
+    """
+    Compares the step 1 entries with the manifest of the last completed run.
+    Added and changed entries are written to delta_json_path, the only input step 2 needs to see;
+    the added / changed / removed / unchanged video keys are written to changes_path for carry_forward_results.
+    When the change set differs from the one already in changes_path, stale_output_dirs (per-video outputs
+    of an earlier delta, e.g. the step 4 classification directory) are cleared; re-running the same delta keeps them for resuming.
+    """
+    try:
+        entries = load_entries(json_file_paths)
+        previous_hashes = load_video_manifest(manifest_path)
+
+        current_hashes = placement_hashes(entries)
+
+        changes = {"added": [], "changed": [], "unchanged": [], "removed": []}
+        for key, content_hash in current_hashes.items():
+            previous_hash = previous_hashes.get(key)
+            if previous_hash == content_hash:
+                changes["unchanged"].append(key)
+            else:
+                changes["added" if previous_hash is None else "changed"].append(key)
+        changes["removed"] = sorted(set(previous_hashes) - set(current_hashes))
+        unchanged = set(changes["unchanged"])
+        delta_entries = [entry for entry in entries if entry_key(entry) not in unchanged]
+
+        previous_changes = None
+        if os.path.exists(changes_path):
+            with open(changes_path, "r", encoding="utf-8") as f:
+                previous_changes = json.load(f)
+        if previous_changes != changes:
+            for path in stale_output_dirs:
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+
+        save_product_file(delta_json_path, pack_entries(delta_entries))
+        _write_json(changes_path, changes)
+        counts = {name: len(keys) for name, keys in changes.items()}
+        print(f"Video changes since the last run: {counts}")
+        return {"status": "success", "message": "Video changes detected", "output_files": [delta_json_path, changes_path], **counts}
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+def _row_keys(df: pd.DataFrame) -> list:
+    columns = [df[field].tolist() if field in df.columns else [""] * len(df) for field in PLACEMENT_FIELDS]
+    return [video_key(*values) for values in zip(*columns)]
+
+def carry_forward_results(previous_results_path: str, delta_results_path: str, output_path: str, changes_path: str):
+    """
+    Builds a full step 2 or step 4 result table from the previous run's rows of unchanged videos
+    plus the rows computed for the delta. Rows of changed and removed videos are dropped.
+    output_path may be previous_results_path; it is replaced only once the new table is complete.
+    Parquet part directories are filtered part by part, without loading the whole previous table.
+    """
+    try:
+        with open(changes_path, "r", encoding="utf-8") as f:
+            unchanged = set(json.load(f)["unchanged"])
+
+        tmp_path = f"{os.path.splitext(output_path)[0]}.carry{os.path.splitext(output_path)[1]}"
+        if os.path.isdir(tmp_path):
+            shutil.rmtree(tmp_path)
+        carried_rows = 0
+
+        if table_format(output_path) == "parquet" and (not os.path.exists(previous_results_path) or os.path.isdir(previous_results_path)) and os.path.isdir(delta_results_path):
+            os.makedirs(tmp_path)
+            part_number = 0
+            if os.path.isdir(previous_results_path):
+                for part_name in sorted(name for name in os.listdir(previous_results_path) if name.startswith("part-")):
+                    table = pq.read_table(os.path.join(previous_results_path, part_name))
+                    keys = _row_keys(table.select([field for field in PLACEMENT_FIELDS if field in table.column_names]).to_pandas())
+                    table = table.filter([key in unchanged for key in keys])
+                    if table.num_rows:
+                        pq.write_table(table, os.path.join(tmp_path, f"part-{part_number:06d}.parquet"), compression="zstd")
+                        part_number += 1
+                        carried_rows += table.num_rows
+            for part_name in sorted(name for name in os.listdir(delta_results_path) if name.startswith("part-")):
+                shutil.copyfile(os.path.join(delta_results_path, part_name), os.path.join(tmp_path, f"part-{part_number:06d}.parquet"))
+                part_number += 1
+        else:
+            frames = []
+            if os.path.exists(previous_results_path):
+                previous = read_table(previous_results_path)
+                previous = previous[[key in unchanged for key in _row_keys(previous)]]
+                carried_rows = len(previous)
+                frames.append(previous)
+            frames.append(read_table(delta_results_path))
+            write_table(pd.concat(frames, ignore_index=True), tmp_path)
+
+        if os.path.isdir(output_path):
+            shutil.rmtree(output_path)
+        os.replace(tmp_path, output_path)
+        print(f"Carried {carried_rows} result rows forward from {previous_results_path}")
+        return {"status": "success", "message": "Results carried forward", "output_file": output_path, "carried_rows": carried_rows}
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+def commit_video_manifest(json_file_paths, manifest_path: str):
+    """
+    Records the content hashes of the current step 1 entries; call once every downstream step has succeeded,
+    so an interrupted run is detected as a delta again.
+    """
+    try:
+        videos = placement_hashes(load_entries(json_file_paths))
+        _write_json(manifest_path, {"format_version": MANIFEST_FORMAT_VERSION, "videos": videos})
+        return {"status": "success", "message": "Video manifest updated", "output_file": manifest_path, "videos": len(videos)}
+    except Exception as e:
+        return {"status": "error", "message": str(e)}